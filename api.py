@@ -6,10 +6,26 @@ from dotenv import load_dotenv
 import pandas as pd
 import requests
 from typing import Optional, List
+from functools import lru_cache
+import h3
 
 
 load_dotenv()
 
+# point this at a local stand-in (see benchmarks/e2e.py) to run the pipeline offline
+GITHUB_API_URL = os.getenv("GITHUB_API_URL") or "https://api.github.com"
+
+
+# bounded: the dashboard's processes are long-lived
+@lru_cache(maxsize=1 << 16)
+def location_to_coordinates(location) -> (Optional[float], Optional[float]):
+    """
+    Centroid (lat, lon) of an H3 location, or (None, None) for hotspots without one.
+    """
+    if not isinstance(location, str) or not location:
+        return None, None
+    return h3.h3_to_geo(location)
+
 
 def parse_body(p: parser.Parser, body: str):
 
@@ -45,45 +61,50 @@ def parse_body(p: parser.Parser, body: str):
         return None
 
 
+def _github_headers() -> dict:
+    return {"accept": "application/vnd.github+json", "Authorization": f"token {os.getenv('GITHUB_ACCESS_TOKEN')}"}
+
+
+def _issue_record(r: dict) -> dict:
+    # submission type: {addition, removal, other}
+    labels = [l["name"] for l in r["labels"]]
+    if "addition" in labels:
+        issue_type = "addition"
+    elif "removal" in labels:
+        issue_type = "removal"
+    else:
+        issue_type = "other"
+    return {
+        "number": r["number"],
+        "title": r["title"],
+        "user": r["user"]["login"],
+        "labels": labels,
+        "issue_type": issue_type,
+        "state": r["state"],
+        "created_at": r["created_at"],
+        "updated_at": r["updated_at"],
+        "closed_at": r["closed_at"],
+        "comments": r["comments"],
+        "body": r["body"],
+        "reactions": r["reactions"],
+        # "reports_generated": False
+    }
+
+
 def get_issues(since: Optional[str] = None):
     issues = []
     page = 1
     while True:
         if since:
-            url = f"https://api.github.com/repos/helium/denylist/issues?state=all&page={page}&per_page=100&since={since}"
+            url = f"{GITHUB_API_URL}/repos/helium/denylist/issues?state=all&page={page}&per_page=100&since={since}"
         else:
-            url = f"https://api.github.com/repos/helium/denylist/issues?state=all&page={page}&per_page=100"
+            url = f"{GITHUB_API_URL}/repos/helium/denylist/issues?state=all&page={page}&per_page=100"
 
         payload = {}
-        headers = {"accept": "application/vnd.github+json",
-                   "Authorization": f"token {os.getenv('GITHUB_ACCESS_TOKEN')}"}
-
-        response = requests.request("GET", url, headers=headers, data=payload).json()
+        response = requests.request("GET", url, headers=_github_headers(), data=payload).json()
         if len(response) > 0:
             for r in response:
-                # submission type: {addition, removal, other}
-                labels = [l["name"] for l in r["labels"]]
-                if "addition" in labels:
-                    issue_type = "addition"
-                elif "removal" in labels:
-                    issue_type = "removal"
-                else:
-                    issue_type = "other"
-                issues.append({
-                    "number": r["number"],
-                    "title": r["title"],
-                    "user": r["user"]["login"],
-                    "labels": labels,
-                    "issue_type": issue_type,
-                    "state": r["state"],
-                    "created_at": r["created_at"],
-                    "updated_at": r["updated_at"],
-                    "closed_at": r["closed_at"],
-                    "comments": r["comments"],
-                    "body": r["body"],
-                    "reactions": r["reactions"],
-                    # "reports_generated": False
-                })
+                issues.append(_issue_record(r))
 
         else:
             break
@@ -91,6 +112,33 @@ def get_issues(since: Optional[str] = None):
     return issues
 
 
+def get_issue(number: int) -> dict:
+    """
+    Get a single issue, for targeted re-runs that don't need the full scan.
+    """
+    response = requests.get(f"{GITHUB_API_URL}/repos/helium/denylist/issues/{number}", headers=_github_headers())
+    response.raise_for_status()
+    return _issue_record(response.json())
+
+
+def get_entry_keys(issues: list) -> (List[str], List[str]):
+    """
+    The addresses and (normalized) hotspot names listed in `issues`, so only those gateway_inventory rows need to be
+    loaded for a handful of issues.
+    """
+    p = parser.Parser()
+    addresses, names = set(), set()
+    for issue in issues:
+        parsed = parse_body(p, issue["body"]) if issue["body"] else None
+        if not parsed:
+            continue
+        if "hotspot_b58_addresses" in parsed:
+            addresses.update(parsed["hotspot_b58_addresses"])
+        elif "hotspot_name" in parsed:
+            names.update(a.lower().replace(" ", "-") for a in parsed["hotspot_name"])
+    return sorted(addresses), sorted(names)
+
+
 def get_entries(issues: list, gateway_inventory: pd.DataFrame):
     p = parser.Parser()
     entries = []
@@ -115,7 +163,9 @@ def get_entries(issues: list, gateway_inventory: pd.DataFrame):
                                 "long_country": row["long_country"],
                                 "long_state": row["long_state"],
                                 "long_city": row["long_city"],
-                                "first_block": int(row["first_block"])
+                                "first_block": int(row["first_block"]),
+                                "lat": location_to_coordinates(row["location"])[0],
+                                "lon": location_to_coordinates(row["location"])[1]
                             })
                 elif "hotspot_name" in parsed:
                     for a in parsed["hotspot_name"]:
@@ -136,7 +186,9 @@ def get_entries(issues: list, gateway_inventory: pd.DataFrame):
                                 "long_country": row["long_country"],
                                 "long_state": row["long_state"],
                                 "long_city": row["long_city"],
-                                "first_block": int(row["first_block"])
+                                "first_block": int(row["first_block"]),
+                                "lat": location_to_coordinates(row["location"])[0],
+                                "lon": location_to_coordinates(row["location"])[1]
                             })
                         except IndexError:
                             continue
@@ -151,13 +203,10 @@ def get_pulls() -> (List[dict], List[dict]):
     pulls = []
     page = 1
     while True:
-        url = f"https://api.github.com/repos/helium/denylist/pulls?state=all&page={page}&per_page=100"
+        url = f"{GITHUB_API_URL}/repos/helium/denylist/pulls?state=all&page={page}&per_page=100"
 
         payload = {}
-        headers = {"accept": "application/vnd.github+json",
-                   "Authorization": f"token {os.getenv('GITHUB_ACCESS_TOKEN')}"}
-
-        response = requests.request("GET", url, headers=headers, data=payload).json()
+        response = requests.request("GET", url, headers=_github_headers(), data=payload).json()
         if len(response) > 0:
             for r in response:
 
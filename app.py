@@ -1,220 +1,338 @@
-import numpy as np
-import requests
-from dash import Dash, html, dcc, dash_table, Input, Output
+from dash import Dash, html, dcc, dash_table, Input, Output, State, callback, callback_context, no_update
+from dash.exceptions import PreventUpdate
 import plotly.express as px
-import pandas as pd
 
 import queries
-from queries import get_issues_summary, get_entries_table, get_issue_details
-import boto3
+from queries import get_issue_details
+import paging
+import math
 from dotenv import load_dotenv
-from sqlalchemy.engine import Engine, create_engine
+import connection
 import os
 import dash_bootstrap_components as dbc
 import dash_cytoscape as cyto
-import aws
-import h3
+from store import get_store
+from cache import get_cache
+from loader import ReportLoader
+from figures import entry_figures
+from graph import build_witness_graph, cytoscape_elements
+import maps
+import denylist
+import lookup
+import review
+import callback_metrics
+import functools
 import json
+import threading
+import uuid
 
 
 load_dotenv()
 px.set_mapbox_access_token(os.getenv("MAPBOX_TOKEN"))
 
-denylist_engine = create_engine(os.getenv("DENYLIST_DB_CONNECTION_STRING"))
+PAGE_SIZE = 10
+DEFAULT_MAP_RESOLUTION = 4
+# how long counts and issue details are shared between workers
+SUMMARY_TTL = int(os.getenv("SUMMARY_TTL_SECONDS", 30))
 
-s3 = boto3.resource("s3")
+# engines, pools and threads don't survive a fork, so each worker process (e.g. under gunicorn --preload) creates its
+# own on first use
+_resources = {}
+_resources_lock = threading.Lock()
 
-app = Dash("Helium Denylist Reports", external_stylesheets=[dbc.themes.BOOTSTRAP])
-server = app.server
 
-PAGE_SIZE = 10
+def _per_process(name: str, factory):
+    with _resources_lock:
+        if _resources.get("pid") != os.getpid():
+            _resources.clear()
+            _resources["pid"] = os.getpid()
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
 
 
-issues = get_issues_summary(denylist_engine, limit=None)
-entries = [
-    {
-        "address": None,
-        "issue_number": None,
-        "reports_generated": None,
-        "review_status": None,
-        "name": None,
-        "location": None,
-        "owner": None,
-        "payer": None,
-        "maker": None,
-        "long_country": None,
-        "long_state": None,
-        "long_city": None,
-        "first_block": None,
-        "other_mentioned_issues": None,
-        "closed_pulls": None,
-        "open_pulls": None
-    }
-]
-accepted_entries = [
-    {
-        "address": None,
-        "issue": None,
-        "issue_type": None
-    }
-]
-
-app.layout = html.Div(children=[
-    html.H1(children="Helium Denylist Reports"),
-
-    html.Div([
-        html.H4("Issues"),
-        dash_table.DataTable(
-            id="issues-table",
-            data=issues,
-            columns=[{"id": i, "name": i} for i in issues[0].keys()],
-            page_size=PAGE_SIZE,
-            page_current=0,
-            # filter_action="native",
-            # sort_action="native",
-            style_table={'overflowX': 'auto'},
-        ),
-        html.H4(id="issue-title", children="Select an issue to view details"),
-        dbc.Badge(id="issue-type"),
-        dbc.Accordion(
-            [
-                dbc.AccordionItem(
-                    dcc.Markdown(id="issue-body", children=""), title="Issue Body"
-                )
-            ],
-            start_collapsed=True
-        ),
-        dcc.Graph(id="entry-locations"),
-        dash_table.DataTable(
-            id="entries-table",
-            data=entries,
-            columns=[{"id": i, "name": i} for i in entries[0].keys()],
-            row_selectable="multi",
-            page_size=PAGE_SIZE,
-            page_current=0,
-            # filter_action="native",
-            # sort_action="native",
-            hidden_columns=["issue_number", "reports_generated", "review_status", "location", "payer"],
-            style_table={'overflowX': 'auto'},
-            include_headers_on_copy_paste=True
-        ),
-        html.Div([
-            dbc.Button(children="Select All", id="select-all-button", n_clicks=0, color="primary"),
-            dbc.Button("Add Selected to PR", id="add-selected-button", n_clicks=0, color="danger")
-        ],
-        className="d-grid gap-2 d-md-flex justify-content-md-end"),
+def get_engine():
+    return _per_process("engine", connection.connect_denylist)
+
+
+def get_shared_cache():
+    return _per_process("cache", get_cache)
+
+
+def get_loader() -> ReportLoader:
+    return _per_process("loader", lambda: ReportLoader(get_store(), shared=get_shared_cache()))
+
+
+def _shared(name: str, fn, *args):
+    with callback_metrics.step("query"):
+        return get_shared_cache().cached(f"{name}:{paging.signature(*args)}", SUMMARY_TTL, fn, get_engine(), *args)
+
+
+def _page_addresses(issue_number: int, page_size: int, page: int, sort_column: str, descending: bool, filters: list,
+                    after) -> list:
+    entries, _ = queries.get_entries_page(get_engine(), issue_number, page_size, page, sort_column, descending, filters,
+                                          after=after)
+    return [e["address"] for e in entries]
+
+
+ISSUE_COLUMNS = ["number", "title", "user", "created_at", "issue_type", "state", "n_entries", "open_pulls", "closed_pulls"]
+ENTRY_COLUMNS = ["address", "issue_number", "reports_generated", "review_status", "name", "location", "owner", "payer",
+                 "maker", "long_country", "long_state", "long_city", "first_block", "other_mentioned_issues",
+                 "closed_pulls", "open_pulls", "already_denied"]
+CLUSTER_COLUMNS = ["label", "n_hotspots", "n_pending", "n_issues", "n_owners", "n_payers", "n_locations", "makers",
+                   "countries", "top_maker_share", "hotspots_per_location", "first_block_span", "location_spread_km",
+                   "witness_edges", "issues"]
+CLUSTER_ENTRY_COLUMNS = ["issue_number", "address", "name", "owner", "payer", "maker", "long_city", "long_country",
+                         "first_block", "review_status"]
+# as returned by queries.get_accepted_entries
+ACCEPTED_COLUMNS = ["address", "issue", "issue_type"]
+
+def _layout():
+    return html.Div(children=[
+        html.H1(children="Helium Denylist Reports"),
 
         html.Div([
-            html.H4(id="hotspot-name", children=""),
-            html.P(id="hotspot-details", children=""),
-            html.Div(id="explorer-links", children=[]),
-            html.Div(
+            html.H4("Issues"),
+            dash_table.DataTable(
+                id="issues-table",
+                data=[],
+                columns=[{"id": i, "name": i} for i in ISSUE_COLUMNS],
+                page_action="custom",
+                page_size=PAGE_SIZE,
+                page_current=0,
+                filter_action="custom",
+                filter_query="",
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                style_table={'overflowX': 'auto'},
+            ),
+            dcc.Store(id="issues-cursors", data={}),
+            html.H4(id="issue-title", children="Select an issue to view details"),
+            dbc.Badge(id="issue-type"),
+            dbc.Accordion(
                 [
-                    dcc.Graph(id="distance-vs-rssi", style={"display": "inline-block"}),
-                    dcc.Graph(id="witnessed-makers", style={"display": "inline-block"}),
-                    dcc.Graph(id="rssi-vs-snr", style={"display": "inline-block"})
-                ]
+                    dbc.AccordionItem(
+                        dcc.Markdown(id="issue-body", children=""), title="Issue Body"
+                    )
+                ],
+                start_collapsed=True
             ),
-            cyto.Cytoscape(
-                id="witness-graph",
-                elements=[],
-                layout={"name": "random"},
-                stylesheet=[
-                            # Class selectors
-                            {
-                                'selector': '.red',
-                                'style': {
-                                    'background-color': 'red',
-                                    'line-color': 'red'
-                                }
-                            },
-                            {
-                                'selector': '.green',
-                                'style': {
-                                    'background-color': 'green',
-                                    'line-color': 'green'
+            dcc.RadioItems(
+                id="map-mode",
+                options=[
+                    {"label": "Entries on this page", "value": "points"},
+                    {"label": "This issue (H3 cells)", "value": "issue_cells"},
+                    {"label": "All pending entries (H3 cells)", "value": "pending_cells"}
+                ],
+                value="points",
+                inline=True
+            ),
+            dcc.Graph(id="entry-locations"),
+            dcc.Store(id="map-resolution", data=None),
+            dash_table.DataTable(
+                id="entries-table",
+                data=[],
+                columns=[{"id": i, "name": i} for i in ENTRY_COLUMNS],
+                row_selectable="multi",
+                page_action="custom",
+                page_size=PAGE_SIZE,
+                page_current=0,
+                filter_action="custom",
+                filter_query="",
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                hidden_columns=["issue_number", "reports_generated", "location", "payer"],
+                style_table={'overflowX': 'auto'},
+                include_headers_on_copy_paste=True
+            ),
+            dcc.Store(id="selected-issue", data=None),
+            dcc.Store(id="entries-cursors", data={}),
+            # identifies this page load, so the report loader only cancels this reviewer's own prefetches
+            dcc.Store(id="client-id", data=uuid.uuid4().hex),
+            dcc.Store(id="review-version", data=0),
+            html.Div([
+                dbc.Button(children="Select All", id="select-all-button", n_clicks=0, color="primary"),
+                dbc.Button("Mark Selected Valid", id="mark-valid-button", n_clicks=0, color="success", outline=True),
+                dbc.Button("Mark Selected Invalid", id="mark-invalid-button", n_clicks=0, color="secondary", outline=True),
+                dbc.Button("Add Selected to PR", id="add-selected-button", n_clicks=0, color="danger")
+            ],
+            className="d-grid gap-2 d-md-flex justify-content-md-end"),
+
+            html.Div([
+                html.H4(id="hotspot-name", children=""),
+                html.P(id="hotspot-details", children=""),
+                html.Div(id="explorer-links", children=[]),
+                html.Div(
+                    [
+                        dcc.Graph(id="distance-vs-rssi", style={"display": "inline-block"}),
+                        dcc.Graph(id="witnessed-makers", style={"display": "inline-block"}),
+                        dcc.Graph(id="rssi-vs-snr", style={"display": "inline-block"})
+                    ]
+                ),
+                cyto.Cytoscape(
+                    id="witness-graph",
+                    elements=[],
+                    layout={"name": "preset"},
+                    stylesheet=[
+                                # Class selectors
+                                {
+                                    'selector': '.red',
+                                    'style': {
+                                        'background-color': 'red',
+                                        'line-color': 'red'
+                                    }
+                                },
+                                {
+                                    'selector': '.green',
+                                    'style': {
+                                        'background-color': 'green',
+                                        'line-color': 'green'
+                                    }
                                 }
-                            }
-                        ]
+                            ]
+                ),
+            ], style={"padding_top": "4%"}),
+            html.H4("Fleets"),
+            html.P("Pending entries of all open issues, grouped by operator (recomputed by the clusters stage of run.py)."),
+            dcc.RadioItems(
+                id="cluster-method",
+                options=[
+                    {"label": "Owner", "value": "owner"},
+                    {"label": "Payer", "value": "payer"},
+                    {"label": "Owner + witness links", "value": "connected"}
+                ],
+                value=os.getenv("CLUSTER_BY", "owner"),
+                inline=True
             ),
-        ], style={"padding_top": "4%"}),
-        html.H4("Accepted Entries"),
-        dash_table.DataTable(
-            id="accepted-entries",
-            data=[],
-            columns=[{"id": i, "name": i} for i in accepted_entries[0].keys()],
-            row_deletable=True,
-            page_size=PAGE_SIZE,
-            page_current=0,
-            hidden_columns=[],
-            style_table={'overflowX': 'auto'}
-        ),
-        html.Div([
-            dbc.Button("Download Denylist with Updates", color="info", id="download-btn", className="d-grid gap-2 d-md-flex justify-content-md-end"),
-            dbc.Button("Download Additions Only", color="success", id="download-additions-btn"),
-            dbc.Button("Download Removals Only", color="danger", id="download-removals-btn"),
-            dcc.Download(id="download-denylist"),
-            dcc.Download(id="download-additions"),
-            dcc.Download(id="download-additions-pr"),
-            dcc.Download(id="download-removals"),
-            dcc.Download(id="download-removals-pr"),
-        ],
-        className="d-grid gap-2 d-md-flex justify-content-md-start"),
-
-        dcc.Textarea(id="pr-message"),
-        dcc.Clipboard(target_id="pr-message", title="copy")
-    ],
-    style={"padding-left": "5%", "padding-right": "5%"}),
-])
-
+            dash_table.DataTable(
+                id="clusters-table",
+                data=[],
+                columns=[{"id": i, "name": i} for i in CLUSTER_COLUMNS],
+                page_action="custom",
+                page_size=PAGE_SIZE,
+                page_current=0,
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                style_table={'overflowX': 'auto'},
+                style_cell={'maxWidth': 300, 'overflow': 'hidden', 'textOverflow': 'ellipsis'}
+            ),
+            dcc.Store(id="selected-cluster", data=None),
+            html.H5(id="cluster-title", children="Select a fleet to view its entries"),
+            dash_table.DataTable(
+                id="cluster-entries",
+                data=[],
+                columns=[{"id": i, "name": i} for i in CLUSTER_ENTRY_COLUMNS],
+                page_size=PAGE_SIZE,
+                page_current=0,
+                style_table={'overflowX': 'auto'},
+                include_headers_on_copy_paste=True
+            ),
+            html.Div([
+                dbc.Button("Mark Fleet Valid", id="mark-fleet-valid-button", n_clicks=0, color="success", outline=True),
+                dbc.Button("Mark Fleet Invalid", id="mark-fleet-invalid-button", n_clicks=0, color="secondary", outline=True),
+                dbc.Button("Add Fleet to PR", id="add-fleet-button", n_clicks=0, color="danger")
+            ],
+            className="d-grid gap-2 d-md-flex justify-content-md-end"),
+            html.H4("Accepted Entries"),
+            dash_table.DataTable(
+                id="accepted-entries",
+                data=[],
+                columns=[{"id": i, "name": i} for i in ACCEPTED_COLUMNS],
+                row_deletable=True,
+                page_size=PAGE_SIZE,
+                page_current=0,
+                hidden_columns=[],
+                style_table={'overflowX': 'auto'}
+            ),
+            html.Div([
+                dbc.Button("Download Denylist with Updates", color="info", id="download-btn", className="d-grid gap-2 d-md-flex justify-content-md-end"),
+                dbc.Button("Download Additions Only", color="success", id="download-additions-btn"),
+                dbc.Button("Download Removals Only", color="danger", id="download-removals-btn"),
+                dcc.Download(id="download-denylist"),
+                dcc.Download(id="download-additions"),
+                dcc.Download(id="download-additions-pr"),
+                dcc.Download(id="download-removals"),
+                dcc.Download(id="download-removals-pr"),
+            ],
+            className="d-grid gap-2 d-md-flex justify-content-md-start"),
 
-def r_squared(x, y):
-    return round(np.corrcoef(x, y)[0,1]**2, 3)
+            dcc.Textarea(id="pr-message"),
+            dcc.Clipboard(target_id="pr-message", title="copy")
+        ],
+        style={"padding-left": "5%", "padding-right": "5%"}),
+    ])
 
 
-def draw_witness_graph(witness_edges):
-    unique_nodes = []
-    for i, e in enumerate(witness_edges["transmitter_address"]):
-        if e not in unique_nodes:
-            unique_nodes.append({"address": e, "hop": witness_edges["hop"][i]})
-    for i, e in enumerate(witness_edges["witness_address"]):
-        if e not in unique_nodes:
-            unique_nodes.append({"address": e, "hop": witness_edges["hop"][i]})
+def create_app() -> Dash:
+    """
+    Build the dashboard. Database connections and caches are created lazily in each worker process.
+    """
+    app = Dash("Helium Denylist Reports", external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.layout = _layout
+    lookup.register(app.server, get_engine)
+    review.register(app.server, get_engine)
+    callback_metrics.register(app.server)
+    return app
 
-    elements = [
-        {"data":
-             {"id": a["address"]},
-        "classes": "red" if a["hop"] == 1 else "green"
-        } for a in unique_nodes
-    ]
-    edges = [
-        {"data":
-             {
-                 "source": witness_edges["transmitter_address"][i],
-                 "target": witness_edges["witness_address"][i]
-             }
-        } for i in range(len(witness_edges))
-    ]
-    return elements + edges
 
+def create_server():
+    """
+    WSGI entry point, e.g. gunicorn "app:create_server()".
+    """
+    return create_app().server
 
 
-@app.callback(
-    Output(component_id="entries-table", component_property="data"),
+@callback(
+    Output(component_id="issues-table", component_property="data"),
+    Output(component_id="issues-table", component_property="page_count"),
+    Output(component_id="issues-cursors", component_property="data"),
+    Input(component_id="issues-table", component_property="page_current"),
+    Input(component_id="issues-table", component_property="page_size"),
+    Input(component_id="issues-table", component_property="sort_by"),
+    Input(component_id="issues-table", component_property="filter_query"),
+    State(component_id="issues-cursors", component_property="data"),
+)
+@callback_metrics.timed
+def update_issues_table(page_current, page_size, sort_by, filter_query, cursors):
+    sort_column = sort_by[0]["column_id"] if sort_by else "number"
+    descending = sort_by[0]["direction"] == "desc" if sort_by else True
+    filters = paging.parse_filter_query(filter_query)
+
+    # keyset cursors are only valid for the sort/filter they were produced with
+    signature = paging.signature(page_size, sort_column, descending, filters)
+    if not cursors or cursors.get("signature") != signature:
+        cursors = {"signature": signature, "pages": {}}
+
+    with callback_metrics.step("query"):
+        rows, next_cursor = queries.get_issues_page(get_engine(), page_size, page_current, sort_column, descending,
+                                                    filters, after=cursors["pages"].get(str(page_current)))
+    if next_cursor:
+        cursors["pages"][str(page_current + 1)] = next_cursor
+    n_issues = _shared("count_issues", queries.count_issues, filters)
+    return rows, max(1, math.ceil(n_issues / page_size)), cursors
+
+
+@callback(
+    Output(component_id="selected-issue", component_property="data"),
+    Output(component_id="entries-table", component_property="page_current"),
     Output(component_id="issue-title", component_property="children"),
     Output(component_id="issue-body", component_property="children"),
     Output(component_id="issue-type", component_property="children"),
     Output(component_id="issue-type", component_property="color"),
     Output(component_id="add-selected-button", component_property="children"),
     Output(component_id="add-selected-button", component_property="color"),
-    Output(component_id="entry-locations", component_property="figure"),
     Input(component_id="issues-table", component_property="active_cell"),
-    Input(component_id="issues-table", component_property="page_current"),
 )
-def update_output_div(selected_cell, page_current):
-    issue_number = issues[selected_cell["row"] + page_current * PAGE_SIZE]["number"]
-    issue_details = get_issue_details(denylist_engine, issue_number, with_body=True)
-    entries_table = get_entries_table(denylist_engine, issue_number)
+@callback_metrics.timed
+def update_output_div(selected_cell):
+    if not selected_cell:
+        raise PreventUpdate
+    # rows carry the issue number as their id, and the table only holds the current page
+    issue_number = selected_cell["row_id"]
+    issue_details = _shared("issue_details", get_issue_details, issue_number, True)
     if issue_details["issue_type"] == "addition":
         color = "primary"
         label = "Add Selected to PR"
@@ -225,23 +343,103 @@ def update_output_div(selected_cell, page_current):
         color = "light"
         label = "Add Selected to PR"
 
-    entry_df = pd.DataFrame(entries_table)
-    entry_df["coords"] = entry_df["location"].apply(lambda x: h3.h3_to_geo(x))
-    entry_df["lat"] = entry_df["coords"].apply(lambda x: x[0])
-    entry_df["lon"] = entry_df["coords"].apply(lambda x: x[1])
+    return issue_number, 0, issue_details["title"], issue_details["body"], issue_details["issue_type"].capitalize(), color, label, color
 
-    map_fig = px.scatter_mapbox(entry_df, lat="lat", lon="lon", color="owner", hover_name="name")
-    map_fig.update_layout(transition_duration=500, showlegend=False)
 
-    return entries_table, issue_details["title"], issue_details["body"], issue_details["issue_type"].capitalize(), color, label, color, map_fig
+@callback(
+    Output(component_id="entries-table", component_property="data"),
+    Output(component_id="entries-table", component_property="page_count"),
+    Output(component_id="entries-cursors", component_property="data"),
+    Input(component_id="selected-issue", component_property="data"),
+    Input(component_id="entries-table", component_property="page_current"),
+    Input(component_id="entries-table", component_property="page_size"),
+    Input(component_id="entries-table", component_property="sort_by"),
+    Input(component_id="entries-table", component_property="filter_query"),
+    Input(component_id="review-version", component_property="data"),
+    State(component_id="entries-cursors", component_property="data"),
+    State(component_id="client-id", component_property="data"),
+)
+@callback_metrics.timed
+def update_entries_table(issue_number, page_current, page_size, sort_by, filter_query, review_version, cursors,
+                         client_id):
+    if issue_number is None:
+        raise PreventUpdate
+    sort_column = sort_by[0]["column_id"] if sort_by else "address"
+    descending = sort_by[0]["direction"] == "desc" if sort_by else False
+    filters = paging.parse_filter_query(filter_query)
+
+    signature = paging.signature(issue_number, page_size, sort_column, descending, filters)
+    if not cursors or cursors.get("signature") != signature:
+        cursors = {"signature": signature, "pages": {}}
+
+    with callback_metrics.step("query"):
+        entries_table, next_cursor = queries.get_entries_page(get_engine(), issue_number, page_size, page_current,
+                                                              sort_column, descending, filters,
+                                                              after=cursors["pages"].get(str(page_current)))
+    n_entries = _shared("count_entries", queries.count_entries, issue_number, filters)
+
+    # never wait on GitHub here: flag the entries with the version we have, or as unknown until one has loaded
+    state = denylist.get_state()
+    state.refresh_in_background()
+    for e in entries_table:
+        e["already_denied"] = ("yes" if e["address"] in state else "no") if state.loaded else "unknown"
+
+    # reviewers usually step through the entries in order, so warm the report cache for this page and the next (whose
+    # addresses are looked up by the prefetch, off the request path)
+    next_page = None
+    if next_cursor:
+        cursors["pages"][str(page_current + 1)] = next_cursor
+        next_page = functools.partial(_page_addresses, issue_number, page_size, page_current + 1, sort_column,
+                                      descending, filters, next_cursor)
+    get_loader().prefetch(issue_number, [e["address"] for e in entries_table], client=client_id or "", then=next_page)
+
+    return entries_table, max(1, math.ceil(n_entries / page_size)), cursors
+
+
+@callback(
+    Output(component_id="entry-locations", component_property="figure"),
+    Output(component_id="map-resolution", component_property="data"),
+    Input(component_id="map-mode", component_property="value"),
+    Input(component_id="selected-issue", component_property="data"),
+    Input(component_id="entries-table", component_property="data"),
+    Input(component_id="entry-locations", component_property="relayoutData"),
+    State(component_id="map-resolution", component_property="data"),
+)
+@callback_metrics.timed
+def update_entry_map(mode, issue_number, entries_table, relayout, current_resolution):
+    triggered = [t["prop_id"] for t in callback_context.triggered]
+    zoom = (relayout or {}).get("mapbox.zoom")
+
+    if mode == "points":
+        if triggered == ["entry-locations.relayoutData"]:
+            raise PreventUpdate
+        # the points only cover the entries on the current page
+        with callback_metrics.step("figure"):
+            return maps.points_figure(entries_table or []), current_resolution
+
+    resolution = maps.resolution_for_zoom(zoom) if zoom is not None else (current_resolution or DEFAULT_MAP_RESOLUTION)
+    if triggered == ["entry-locations.relayoutData"] and resolution == current_resolution:
+        # panning, or zooming within the same resolution
+        raise PreventUpdate
+    if mode == "issue_cells":
+        if issue_number is None:
+            raise PreventUpdate
+        with callback_metrics.step("query"):
+            locations = queries.get_entry_locations(get_engine(), issue_number=issue_number)
+    else:
+        with callback_metrics.step("query"):
+            locations = queries.get_entry_locations(get_engine(), pending_only=True)
+    with callback_metrics.step("figure"):
+        return maps.cells_figure(maps.aggregate_cells(locations, resolution)), resolution
 
 
-@app.callback(
+@callback(
     Output(component_id="entries-table", component_property="selected_rows"),
     Output(component_id="select-all-button", component_property="children"),
     Input(component_id="select-all-button", component_property="n_clicks"),
     Input(component_id="entries-table", component_property="data"),
 )
+@callback_metrics.timed
 def select_all_entries(n_clicks, entries):
     if n_clicks % 2 == 1:
         return [i for i in range(len(entries))], "Deselect All"
@@ -249,7 +447,7 @@ def select_all_entries(n_clicks, entries):
         return [], "Select All"
 
 
-@app.callback(
+@callback(
     Output(component_id="distance-vs-rssi", component_property="figure"),
     Output(component_id="witnessed-makers", component_property="figure"),
     Output(component_id="rssi-vs-snr", component_property="figure"),
@@ -259,35 +457,29 @@ def select_all_entries(n_clicks, entries):
     Output(component_id="hotspot-details", component_property="children"),
     Input(component_id="entries-table", component_property="data"),
     Input(component_id="entries-table", component_property="active_cell"),
-    Input(component_id="entries-table", component_property="page_current")
-
 )
-def select_entry(entries, selected_cell, page_current):
-    # if selected_cell:
-    entry_idx = selected_cell["row"] + page_current * PAGE_SIZE
+@callback_metrics.timed
+def select_entry(entries, selected_cell):
+    if not selected_cell or selected_cell["row"] >= len(entries):
+        raise PreventUpdate
+    # the table only holds the current page
+    entry_idx = selected_cell["row"]
     issue_number = entries[entry_idx]["issue_number"]
     address = entries[entry_idx]["address"]
     owner = entries[entry_idx]["owner"]
     hotspot_name = entries[entry_idx]["name"]
     maker = entries[entry_idx]["maker"]
-    #
-    distance_vs_rssi = aws.get_object(s3, os.getenv("S3_BUCKET"), key=f"issues/{issue_number}/entries/{address}/distance_vs_rssi")
-    witnessed_makers = aws.get_object(s3, os.getenv("S3_BUCKET"), key=f"issues/{issue_number}/entries/{address}/witnessed_makers")
-    hotspot_details = json.dumps(aws.get_object(s3, os.getenv("S3_BUCKET"), key=f"issues/{issue_number}/entries/{address}/hotspot_details"))
-    witness_graph = pd.DataFrame(aws.get_object(s3, os.getenv("S3_BUCKET"), key=f"issues/{issue_number}/entries/{address}/witness_graph"))
-    try:
-        rssi_vs_snr = aws.get_object(s3, os.getenv("S3_BUCKET"), key=f"issues/{issue_number}/entries/{address}/rssi_vs_snr")
-    except:
-        rssi_vs_snr = {"rssi": [], "snr": []}
-
-    dvr_fig = px.scatter(pd.DataFrame(distance_vs_rssi), x="distance_m", y="rssi", trendline="ols", trendline_color_override="black",
-                         title="Distance vs. RSSI")
-    wm_fig = px.pie(pd.DataFrame(witnessed_makers), names="maker", values="n_witnessed", title="Witnessed Makers")
-    rvs_fig = px.scatter(pd.DataFrame(rssi_vs_snr), x="rssi", y="snr", title="RSSI vs. SNR")
-
-    dvr_fig.update_layout(transition_duration=50)
-    wm_fig.update_layout(transition_duration=50)
-    rvs_fig.update_layout(transition_duration=50)
+    # the loader records its own fetch/decode steps
+    report = get_loader().get_entry(issue_number, address)
+    hotspot_details = json.dumps(report["hotspot_details"])
+    with callback_metrics.step("figure"):
+        # older bundles don't have the precomputed graph section
+        witness_graph = report.get("graph")
+        if witness_graph is None:
+            witness_graph = build_witness_graph(report.get("witness_graph", {}))
+
+        dvr_fig, wm_fig, rvs_fig = entry_figures(report)
+        elements = cytoscape_elements(witness_graph)
 
     hotspot_link = f"https://explorer.helium.com/hotspots/{address}"
     owner_link = f"https://explorer.helium.com/accounts/{owner}"
@@ -297,91 +489,199 @@ def select_entry(entries, selected_cell, page_current):
         html.Br(),
         html.A("View Owner on Explorer", href=owner_link)
     ]
-    elements = draw_witness_graph(witness_graph)
     return dvr_fig, wm_fig, rvs_fig, f"{hotspot_name} ({maker})", explorer_links, elements, hotspot_details
 
 
-@app.callback(
+@callback(
+    Output(component_id="clusters-table", component_property="data"),
+    Output(component_id="clusters-table", component_property="page_count"),
+    Input(component_id="cluster-method", component_property="value"),
+    Input(component_id="clusters-table", component_property="page_current"),
+    Input(component_id="clusters-table", component_property="page_size"),
+    Input(component_id="clusters-table", component_property="sort_by"),
+    Input(component_id="review-version", component_property="data"),
+)
+@callback_metrics.timed
+def update_clusters_table(method, page_current, page_size, sort_by, review_version):
+    sort_column = sort_by[0]["column_id"] if sort_by else "n_hotspots"
+    descending = sort_by[0]["direction"] == "desc" if sort_by else True
+    with callback_metrics.step("query"):
+        rows = queries.get_clusters_page(get_engine(), method, page_size, page_current, sort_column, descending)
+    for r in rows:
+        for k in ("top_maker_share", "hotspots_per_location", "location_spread_km"):
+            r[k] = round(r[k], 2) if r[k] is not None else None
+    n_clusters = _shared("count_clusters", queries.count_clusters, method)
+    return rows, max(1, math.ceil(n_clusters / page_size))
+
+
+@callback(
+    Output(component_id="selected-cluster", component_property="data"),
+    Output(component_id="cluster-title", component_property="children"),
+    Input(component_id="clusters-table", component_property="active_cell"),
+    State(component_id="clusters-table", component_property="data"),
+)
+@callback_metrics.timed
+def select_cluster(selected_cell, clusters):
+    if not selected_cell:
+        raise PreventUpdate
+    # rows carry the cluster id as their id
+    cluster = next((c for c in clusters if c["id"] == selected_cell["row_id"]), None)
+    if cluster is None:
+        raise PreventUpdate
+    return cluster["id"], f"{cluster['label']}: {cluster['n_hotspots']} hotspots in {cluster['n_issues']} issues"
+
+
+@callback(
+    Output(component_id="cluster-entries", component_property="data"),
+    Output(component_id="cluster-entries", component_property="page_current"),
+    Input(component_id="selected-cluster", component_property="data"),
+    Input(component_id="review-version", component_property="data"),
+)
+@callback_metrics.timed
+def update_cluster_entries(cluster_id, review_version):
+    if cluster_id is None:
+        raise PreventUpdate
+    with callback_metrics.step("query"):
+        rows = queries.get_cluster_entries(get_engine(), cluster_id)
+    # stay on the same page when the fleet is only refreshed after a review
+    triggered = [t["prop_id"] for t in callback_context.triggered]
+    return rows, 0 if "selected-cluster.data" in triggered else no_update
+
+
+@callback(
+    Output(component_id="review-version", component_property="data"),
+    Input(component_id="mark-valid-button", component_property="n_clicks"),
+    Input(component_id="mark-invalid-button", component_property="n_clicks"),
+    Input(component_id="mark-fleet-valid-button", component_property="n_clicks"),
+    Input(component_id="mark-fleet-invalid-button", component_property="n_clicks"),
+    State(component_id="entries-table", component_property="selected_rows"),
+    State(component_id="entries-table", component_property="data"),
+    State(component_id="selected-cluster", component_property="data"),
+    State(component_id="review-version", component_property="data"),
+    prevent_initial_call=True
+)
+@callback_metrics.timed
+def mark_selected(valid_clicks, invalid_clicks, fleet_valid_clicks, fleet_invalid_clicks, selected_rows, entries,
+                  cluster_id, review_version):
+    triggered = callback_context.triggered[0]["prop_id"]
+    status = "valid" if triggered.startswith(("mark-valid-button", "mark-fleet-valid-button")) else "invalid"
+    if triggered.startswith("mark-fleet"):
+        if not cluster_id:
+            raise PreventUpdate
+        # the whole fleet in one go, leaving entries that were already reviewed individually alone
+        with callback_metrics.step("query"):
+            keys = queries.get_cluster_keys(get_engine(), cluster_id, ["not_reviewed"])
+    elif selected_rows:
+        keys = [(entries[r]["issue_number"], entries[r]["address"]) for r in selected_rows if r < len(entries)]
+    else:
+        raise PreventUpdate
+    with callback_metrics.step("query"):
+        queries.set_review_status(get_engine(), keys, status)
+    return (review_version or 0) + 1
+
+
+@callback(
     Output(component_id="accepted-entries", component_property="data"),
     Output(component_id="add-selected-button", component_property="n_clicks"),
-    Input(component_id="accepted-entries", component_property="data"),
-    Input(component_id="entries-table", component_property="selected_rows"),
+    Output(component_id="add-fleet-button", component_property="n_clicks"),
     Input(component_id="add-selected-button", component_property="n_clicks"),
-    Input(component_id="issue-type", component_property="children"),
-    Input(component_id="entries-table", component_property="data")
+    Input(component_id="add-fleet-button", component_property="n_clicks"),
+    Input(component_id="accepted-entries", component_property="data_timestamp"),
+    State(component_id="accepted-entries", component_property="data"),
+    State(component_id="accepted-entries", component_property="data_previous"),
+    State(component_id="entries-table", component_property="selected_rows"),
+    State(component_id="entries-table", component_property="data"),
+    State(component_id="selected-cluster", component_property="data")
 )
-def accept_selected(current_list, selected_rows, n_clicks, type, entries):
-    if n_clicks > 0:
-        additions = [{"address": entries[r]["address"], "issue": entries[r]["issue_number"], "issue_type": type} for r in selected_rows]
-        return current_list + additions, 0
-
-
-@app.callback(
+@callback_metrics.timed
+def update_accepted_entries(n_clicks, fleet_clicks, data_timestamp, current_list, previous_list, selected_rows, entries,
+                            cluster_id):
+    # the accepted set lives in the database, so it survives reloads and is shared between reviewers
+    triggered = [t["prop_id"] for t in callback_context.triggered]
+    if fleet_clicks and cluster_id:
+        # everything in the fleet except the entries marked invalid
+        keys = queries.get_cluster_keys(get_engine(), cluster_id, ["not_reviewed", "valid", "unknown"])
+        queries.accept_entries(get_engine(), keys)
+    elif n_clicks and selected_rows:
+        keys = [(entries[r]["issue_number"], entries[r]["address"]) for r in selected_rows if r < len(entries)]
+        queries.accept_entries(get_engine(), keys)
+    elif "accepted-entries.data_timestamp" in triggered and previous_list:
+        remaining = {(e["issue"], e["address"]) for e in current_list or []}
+        removed = [(e["issue"], e["address"]) for e in previous_list if (e["issue"], e["address"]) not in remaining]
+        if removed:
+            queries.remove_accepted_entries(get_engine(), removed)
+    return queries.get_accepted_entries(get_engine()), 0, 0
+
+
+@callback(
     Output(component_id="download-denylist", component_property="data"),
     Output(component_id="pr-message", component_property="value"),
     Input(component_id="accepted-entries", component_property="data"),
     Input(component_id="download-btn", component_property="n_clicks"),
     prevent_initial_call=True
 )
+@callback_metrics.timed
 def generate_pr(accepted_entries, n_clicks):
     if n_clicks > 0:
-        current_denylist = requests.get("https://raw.githubusercontent.com/helium/denylist/main/denylist.csv").text.split(",\n")[:-1]
-        for e in accepted_entries:
-            if e["issue_type"] == "Addition":
-                current_denylist.append(e["address"])
-            elif e["issue_type"] == "Removal":
-                current_denylist.remove(e["address"])
+        state = denylist.get_state()
+        with callback_metrics.step("denylist"):
+            state.refresh(force=True)
+        additions = [e["address"] for e in accepted_entries if e["issue_type"] == "Addition"]
+        removals = [e["address"] for e in accepted_entries if e["issue_type"] == "Removal"]
+        while True:
+            diff = state.diff(additions=additions, removals=removals)
+            try:
+                denylist_csv = denylist.format_denylist(state.apply(diff))
+                break
+            except denylist.StaleDiff:
+                # a background refresh landed in between
+                continue
+
+        pr_message = _closes(accepted_entries)
+        if diff.already_denied:
+            pr_message += f"\nAlready on the denylist (skipped): {', '.join(diff.already_denied)}\n"
+        if diff.not_denied:
+            pr_message += f"\nNot on the denylist (skipped): {', '.join(diff.not_denied)}\n"
 
-        new_denylist = pd.DataFrame(set(current_denylist), index=None)
-        closed_issues = set([a["issue"] for a in accepted_entries])
-        pr_message = ""
-        for issue in closed_issues:
-            pr_message += f"Closes #{issue}\n"
+        return dcc.send_string(denylist_csv, "denylist.csv"), pr_message
 
-        return dcc.send_data_frame(new_denylist.to_csv(index=False, header=False), "denylist.csv"), pr_message
 
+def _closes(accepted_entries: list, issue_type: str = None) -> str:
+    closed_issues = dict.fromkeys(e["issue"] for e in accepted_entries if issue_type is None or e["issue_type"] == issue_type)
+    return "".join(f"Closes #{issue}\n" for issue in closed_issues)
 
-@app.callback(
+
+@callback(
     Output(component_id="download-additions", component_property="data"),
     Output(component_id="download-additions-pr", component_property="data"),
     Input(component_id="accepted-entries", component_property="data"),
     Input(component_id="download-additions-btn", component_property="n_clicks"),
     prevent_initial_call=True
 )
+@callback_metrics.timed
 def download_additions(accepted_entries, n_clicks):
     if n_clicks > 0:
-        additions = [e["address"] for e in accepted_entries if e["issue_type"] == "Addition"]
-        closed_issues = set([e["issue"] for e in accepted_entries if e["issue_type"] == "Addition"])
-        pr_message = ""
-        for issue in closed_issues:
-            pr_message += f"Closes #{issue}\n"
-        additions_str = ""
-        for i, addition in enumerate(additions):
-            additions_str += addition + ",\n" if i != len(additions) - 1 else addition
-        return dcc.send_string(additions_str, "additions.csv"), dcc.send_string(pr_message, "pr-message.txt")
+        additions = dict.fromkeys(e["address"] for e in accepted_entries if e["issue_type"] == "Addition")
+        return (dcc.send_string(",\n".join(additions), "additions.csv"),
+                dcc.send_string(_closes(accepted_entries, "Addition"), "pr-message.txt"))
 
 
-@app.callback(
+@callback(
     Output(component_id="download-removals", component_property="data"),
     Output(component_id="download-removals-pr", component_property="data"),
     Input(component_id="accepted-entries", component_property="data"),
     Input(component_id="download-removals-btn", component_property="n_clicks"),
     prevent_initial_call=True
 )
-def download_additions(accepted_entries, n_clicks):
+@callback_metrics.timed
+def download_removals(accepted_entries, n_clicks):
     if n_clicks > 0:
-        removals = [e["address"] for e in accepted_entries if e["issue_type"] == "Removal"]
-        closed_issues = set([e["issue"] for e in accepted_entries if e["issue_type"] == "Removal"])
-        pr_message = ""
-        for issue in closed_issues:
-            pr_message += f"Closes #{issue}\n"
-        removals_str = ""
-        for i, removal in enumerate(removals):
-            removals_str += removal + ",\n" if i != len(removals) - 1 else removal
-        return dcc.send_string(removals_str, "removals.csv"), dcc.send_string(pr_message, "pr-message.txt")
+        removals = dict.fromkeys(e["address"] for e in accepted_entries if e["issue_type"] == "Removal")
+        return (dcc.send_string(",\n".join(removals), "removals.csv"),
+                dcc.send_string(_closes(accepted_entries, "Removal"), "pr-message.txt"))
 
 
 if __name__ == "__main__":
-    app.run_server(debug=os.getenv("DEBUG") or True,
-                   host='0.0.0.0',
-                   port=os.getenv("PORT") or 8050)
+    create_app().run_server(debug=os.getenv("DEBUG", "").lower() in ("1", "true", "yes"),
+                            host='0.0.0.0',
+                            port=os.getenv("PORT") or 8050)
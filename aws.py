@@ -1,17 +1,53 @@
-import json
+from botocore.exceptions import ClientError
+from store import ReportStore, StoredObject, ObjectNotFound
+from typing import Optional
+import boto3
 
 
-def upload_dict(bucket, data_dict: dict, key: str):
-    response = bucket.put_object(
-        Key=key,
-        Body=json.dumps(data_dict).encode("utf-8")
-    )
-    return response
+def _is_missing(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") in ("NoSuchKey", "NotFound", "404")
 
 
-def get_object(s3, bucket_name: str, key: str):
-    obj = s3.Object(
-        bucket_name=bucket_name,
-        key=key
-    )
-    return json.loads(obj.get()['Body'].read().decode("utf-8"))
+class S3ReportStore(ReportStore):
+    def __init__(self, bucket_name: str, profile_name: Optional[str] = None):
+        self.bucket_name = bucket_name
+        session = boto3.Session(profile_name=profile_name)
+        self.s3 = session.resource("s3")
+        self.bucket = self.s3.Bucket(bucket_name)
+
+    def put(self, key, body, content_type=None, content_encoding=None):
+        kwargs = {}
+        if content_type:
+            kwargs["ContentType"] = content_type
+        if content_encoding:
+            kwargs["ContentEncoding"] = content_encoding
+        response = self.bucket.put_object(Key=key, Body=body, **kwargs)
+        return response.e_tag.strip('"')
+
+    def get(self, key, byte_range=None):
+        obj = self.s3.Object(bucket_name=self.bucket_name, key=key)
+        try:
+            if byte_range is None:
+                response = obj.get()
+            else:
+                response = obj.get(Range=f"bytes={byte_range[0]}-{byte_range[1] - 1}")
+        except ClientError as e:
+            if _is_missing(e):
+                raise ObjectNotFound(key)
+            raise
+        return StoredObject(response['Body'].read(), response['ETag'].strip('"'))
+
+    def head(self, key):
+        try:
+            response = self.s3.meta.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if _is_missing(e):
+                return None
+            raise
+        return response['ETag'].strip('"')
+
+    def delete(self, key):
+        self.s3.Object(bucket_name=self.bucket_name, key=key).delete()
+
+    def keys(self, prefix=""):
+        return (o.key for o in self.bucket.objects.filter(Prefix=prefix))
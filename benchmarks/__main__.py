@@ -0,0 +1,48 @@
+"""
+Offline micro-benchmarks for the Python hot paths, on synthetic data.
+
+    python -m benchmarks [--scale small|full] [--filter parse_body] [--save-baseline] [--compare]
+"""
+from benchmarks.harness import measure, format_results, save_baseline, compare
+from benchmarks.suite import SCALES, benchmarks
+import argparse
+import logging
+import sys
+import os
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline-{scale}.json")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the micro-benchmarks.")
+    arg_parser.add_argument("--scale", choices=list(SCALES), default="small",
+                            help="small runs in about a minute, full uses a million-row gateway inventory")
+    arg_parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--baseline", default=None, help=f"baseline file (default {DEFAULT_BASELINE})")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    arg_parser.add_argument("--compare", action="store_true", help="compare to the baseline, exit 1 on a regression")
+    arg_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="relative slowdown or memory growth that counts as a regression")
+    parsed = arg_parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = parsed.baseline or DEFAULT_BASELINE.format(scale=parsed.scale)
+    results = []
+    for benchmark in benchmarks(parsed.scale):
+        if parsed.filter and parsed.filter not in benchmark.name:
+            continue
+        print(f"running {benchmark.name}...", file=sys.stderr)
+        results.append(measure(benchmark, parsed.repeat))
+
+    print(format_results(results))
+    if parsed.compare:
+        table, regressions = compare(baseline, results, parsed.scale, parsed.threshold)
+        print()
+        print(table)
+        if regressions:
+            sys.exit(1)
+    if parsed.save_baseline:
+        save_baseline(baseline, results, parsed.scale)
+        print(f"Saved baseline to {baseline}")
@@ -0,0 +1,193 @@
+"""
+End-to-end benchmark of the run.py pipeline, fully offline.
+
+Creates two scratch databases on a local Postgres (with PostGIS): a seeded, scaled-down ETL database and an empty
+denylist database. GitHub is replaced by a local server replaying synthetic (or recorded) issues and PR's, and S3 by
+the local report store. Then it times a full run of run.py, followed by incremental runs with some new GitHub
+activity in between, using the per-stage timings run.py writes to METRICS_DIR.
+
+    python -m benchmarks.e2e --postgres postgresql://postgres@localhost/postgres [--scale tiny|small|full]
+        [--incremental 1] [--recorded <directory>] [--output results.json] [--compare previous.json] [--keep]
+"""
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from typing import Optional
+from benchmarks import etl_seed, github_stub
+import subprocess
+import tempfile
+import argparse
+import logging
+import shutil
+import json
+import time
+import sys
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# issues and PR's served by the stub up front, and added before each incremental run
+ACTIVITY = {
+    "tiny": {"issues": 30, "max_items": 200, "pulls": 10, "new_issues": 5, "new_pulls": 2},
+    "small": {"issues": 150, "max_items": 1000, "pulls": 50, "new_issues": 20, "new_pulls": 5},
+    "full": {"issues": 600, "max_items": 5000, "pulls": 200, "new_issues": 50, "new_pulls": 10},
+}
+
+
+def _create_database(admin_url: str, name: str) -> str:
+    engine = create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        conn.execute(text(f'drop database if exists "{name}"'))
+        conn.execute(text(f'create database "{name}"'))
+    engine.dispose()
+    return str(make_url(admin_url).set(database=name))
+
+
+def _drop_database(admin_url: str, name: str):
+    engine = create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        conn.execute(text(f'drop database if exists "{name}"'))
+    engine.dispose()
+
+
+def _run(name: str, args: list, env: dict, workdir: str) -> dict:
+    """
+    Run a pipeline step in a fresh interpreter, like cron would, and collect its wall time and stage metrics.
+    """
+    metrics_dir = os.path.join(workdir, "metrics", name)
+    env = {**env, "METRICS_DIR": metrics_dir}
+    logging.info(f"Running {name}: {' '.join(args)}")
+    start = time.perf_counter()
+    with open(os.path.join(workdir, f"{name}.log"), "w") as log:
+        returncode = subprocess.run([sys.executable] + args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    elapsed = time.perf_counter() - start
+    if returncode != 0:
+        raise RuntimeError(f"{name} failed with exit code {returncode}, see {log.name}")
+    summary = {}
+    if os.path.exists(os.path.join(metrics_dir, "latest.json")):
+        with open(os.path.join(metrics_dir, "latest.json")) as f:
+            summary = json.load(f)
+    return {"name": name, "seconds": round(elapsed, 3), "stages": summary.get("stages", {}),
+            "queries": summary.get("queries", {})}
+
+
+def format_runs(runs: list, previous: Optional[dict] = None) -> str:
+    previous_runs = {r["name"]: r for r in previous["runs"]} if previous else {}
+    lines = []
+    for run in runs:
+        base = previous_runs.get(run["name"])
+        vs = f"  ({run['seconds'] / base['seconds']:.2f}x)" if base and base["seconds"] else ""
+        lines.append(f"{run['name']}: {run['seconds']:.1f}s{vs}")
+        for stage, stats in sorted(run["stages"].items(), key=lambda s: s[1]["seconds"], reverse=True):
+            base_stage = base["stages"].get(stage) if base else None
+            vs = f"  ({stats['seconds'] / base_stage['seconds']:.2f}x)" if base_stage and base_stage["seconds"] else ""
+            lines.append(f"    {stage:<20} {stats['seconds']:>9.2f}s  db {stats['db_seconds']:>8.2f}s  "
+                         f"{stats['rows']:>9} rows  {stats['errors']:>4} errors{vs}")
+    return "\n".join(lines)
+
+
+def main(parsed: argparse.Namespace):
+    workdir = parsed.workdir or tempfile.mkdtemp(prefix="denylist-e2e-")
+    os.makedirs(workdir, exist_ok=True)
+    activity = ACTIVITY[parsed.scale]
+    etl_name, denylist_name = f"{parsed.prefix}_etl", f"{parsed.prefix}_denylist"
+
+    logging.info(f"Creating databases {etl_name} and {denylist_name}")
+    etl_url = _create_database(parsed.postgres, etl_name)
+    denylist_url = _create_database(parsed.postgres, denylist_name)
+    stub = None
+    try:
+        start = time.perf_counter()
+        etl_engine = create_engine(etl_url)
+        try:
+            active = etl_seed.seed_etl(etl_engine, parsed.scale, seed=parsed.seed)
+        finally:
+            # pooled connections would keep the database from being dropped
+            etl_engine.dispose()
+        seed_seconds = time.perf_counter() - start
+
+        addresses, names = list(active.index), list(active["name"])
+        if parsed.recorded:
+            stub = github_stub.GithubStub.from_recording(parsed.recorded)
+        else:
+            issues = github_stub.synthetic_issues(activity["issues"], addresses, names, max_items=activity["max_items"],
+                                                  seed=parsed.seed)
+            stub = github_stub.GithubStub(issues, github_stub.synthetic_pulls(issues, activity["pulls"], seed=parsed.seed))
+        stub.start()
+
+        env = {
+            **os.environ,
+            "ETL_CONNECTION_STRING": etl_url,
+            "ETL_REPLICA_CONNECTION_STRING": "",
+            # as in production, so the streamed (named cursor) queries run on connections with a timeout set
+            "ETL_STATEMENT_TIMEOUT_MS": os.getenv("ETL_STATEMENT_TIMEOUT_MS") or "600000",
+            "DENYLIST_DB_CONNECTION_STRING": denylist_url,
+            "DENYLIST_DB_SCHEMA": "",
+            "GITHUB_API_URL": stub.url,
+            "GITHUB_ACCESS_TOKEN": "e2e",
+            "REPORT_STORE": "local",
+            "REPORT_STORE_PATH": os.path.join(workdir, "reports"),
+            "REPORT_CACHE_DIR": "",
+        }
+        shutil.rmtree(env["REPORT_STORE_PATH"], ignore_errors=True)
+
+        runs = [_run("migrate", ["-c", "from models.migrations import migrate; migrate()"], env, workdir),
+                _run("full", ["run.py"], env, workdir),
+                # the other ETL query that streams through a named cursor
+                _run("clusters-connected", ["run.py", "clusters", "--cluster-by", "connected"], env, workdir)]
+        for i in range(parsed.incremental):
+            if not parsed.recorded:
+                first_number = max(issue["number"] for issue in stub.issues) + 1
+                new_issues = github_stub.synthetic_issues(activity["new_issues"], addresses, names, first_number=first_number,
+                                                          days=1, max_items=activity["max_items"], seed=parsed.seed + i + 1)
+                first_pull = max(pull["number"] for pull in stub.pulls) + 1 if stub.pulls else 100000
+                new_pulls = github_stub.synthetic_pulls(new_issues, activity["new_pulls"], first_number=first_pull,
+                                                        seed=parsed.seed + i + 1)
+                stub.add_activity(new_issues, new_pulls)
+            runs.append(_run(f"incremental-{i + 1}", ["run.py"], env, workdir))
+
+        results = {
+            "scale": parsed.scale,
+            "recorded": parsed.recorded,
+            "seed_seconds": round(seed_seconds, 3),
+            "github_requests": stub.requests,
+            "runs": runs
+        }
+    finally:
+        if stub is not None:
+            stub.stop()
+        if not parsed.keep:
+            _drop_database(parsed.postgres, etl_name)
+            _drop_database(parsed.postgres, denylist_name)
+
+    previous = None
+    if parsed.compare:
+        with open(parsed.compare) as f:
+            previous = json.load(f)
+    print(f"Seeded the ETL database in {results['seed_seconds']:.1f}s, GitHub stub served {results['github_requests']} pages")
+    print(format_runs(runs, previous))
+    output = parsed.output or os.path.join(workdir, "e2e-results.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}, logs in {workdir}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Time full and incremental pipeline runs against local stand-ins.")
+    arg_parser.add_argument("--postgres", default=os.getenv("E2E_POSTGRES_URL"),
+                            help="admin connection string of a local Postgres with PostGIS (default E2E_POSTGRES_URL)")
+    arg_parser.add_argument("--scale", choices=list(etl_seed.SCALES), default="tiny")
+    arg_parser.add_argument("--incremental", type=int, default=1, help="number of incremental runs after the full run")
+    arg_parser.add_argument("--recorded", default=None,
+                            help="replay issues.json/pulls.json recorded with `python -m benchmarks.github_stub record`")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--prefix", default="denylist_e2e", help="prefix of the scratch database names")
+    arg_parser.add_argument("--workdir", default=None, help="directory for logs, metrics and reports (default a temp dir)")
+    arg_parser.add_argument("--output", default=None, help="where to save the results JSON")
+    arg_parser.add_argument("--compare", default=None, help="results JSON of a previous run to compare to")
+    arg_parser.add_argument("--keep", action="store_true", help="keep the scratch databases")
+    parsed_args = arg_parser.parse_args()
+    if not parsed_args.postgres:
+        arg_parser.error("--postgres or E2E_POSTGRES_URL is required")
+    logging.basicConfig(level=logging.INFO)
+    main(parsed_args)
@@ -0,0 +1,183 @@
+"""
+A scaled-down blockchain-etl database for the end-to-end benchmarks: the tables and columns the pipeline's queries
+read (blocks, transactions, transaction_actors, challenge_receipts_parsed, gateway_inventory, makers, locations),
+with the ETL's indexes, filled with synthetic hotspots and PoC receipts. Needs PostGIS for the distance queries.
+"""
+from sqlalchemy.engine import Engine
+from typing import List
+from benchmarks import generators
+import pandas as pd
+import numpy as np
+import datetime
+import logging
+import json
+import h3
+import io
+
+
+ETL_SCHEMA = """
+create extension if not exists postgis;
+
+create table blocks (
+    height bigint primary key,
+    timestamp timestamptz not null
+);
+create index blocks_timestamp_idx on blocks (timestamp);
+
+create table transactions (
+    hash text primary key,
+    type text not null,
+    block bigint not null,
+    fields jsonb not null
+);
+
+create table transaction_actors (
+    actor text not null,
+    actor_role text not null,
+    transaction_hash text not null,
+    block bigint not null,
+    primary key (actor, actor_role, transaction_hash)
+);
+create index transaction_actors_actor_block_idx on transaction_actors (actor, block);
+
+create table challenge_receipts_parsed (
+    block bigint not null,
+    hash text not null,
+    transmitter_address text not null,
+    witness_address text not null,
+    witness_signal integer,
+    witness_snr double precision
+);
+create index challenge_receipts_parsed_transmitter_idx on challenge_receipts_parsed (transmitter_address, block);
+
+create table gateway_inventory (
+    address text primary key,
+    name text,
+    owner text,
+    location text,
+    payer text,
+    first_block bigint,
+    last_block bigint,
+    reward_scale double precision,
+    elevation integer,
+    gain integer,
+    nonce integer
+);
+create index gateway_inventory_payer_idx on gateway_inventory (payer);
+
+create table makers (
+    address text primary key,
+    name text
+);
+
+create table locations (
+    location text primary key,
+    long_country text,
+    long_state text,
+    long_city text,
+    geometry geometry
+);
+"""
+
+# hotspots, hotspots with activity (the ones issues are about), blocks (1 per minute), PoC receipts, max witnesses
+SCALES = {
+    "tiny": {"hotspots": 5_000, "active": 1_000, "blocks": 60_000, "receipts": 20_000, "witnesses": 6},
+    "small": {"hotspots": 50_000, "active": 5_000, "blocks": 100_000, "receipts": 200_000, "witnesses": 8},
+    "full": {"hotspots": 500_000, "active": 25_000, "blocks": 150_000, "receipts": 2_000_000, "witnesses": 12},
+}
+
+
+def _copy(engine: Engine, table: str, columns: List[str], rows):
+    """
+    Bulk load rows with COPY, in batches.
+    """
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= 100_000:
+                    _copy_batch(cursor, table, columns, batch)
+                    batch = []
+            if batch:
+                _copy_batch(cursor, table, columns, batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _copy_batch(cursor, table: str, columns: List[str], batch: list):
+    buf = io.StringIO()
+    for row in batch:
+        buf.write("\t".join("\\N" if v is None else str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+                            for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cursor.copy_expert(f"copy {table} ({', '.join(columns)}) from stdin", buf)
+
+
+def seed_etl(engine: Engine, scale: str = "tiny", seed: int = 0) -> pd.DataFrame:
+    """
+    Create the ETL schema on an empty database and fill it.
+    :return: The active hotspots (gateway_inventory rows with receipts, all with a location), to build issues from.
+    """
+    s = SCALES[scale]
+    rng = np.random.default_rng(seed)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ETL_SCHEMA)
+
+    logging.info(f"Seeding {s['hotspots']} hotspots")
+    inventory = generators.gateway_inventory(s["hotspots"], seed=seed, n_locations=max(s["hotspots"] // 20, 10),
+                                             n_owners=max(s["hotspots"] // 5, 10))
+    _copy(engine, "gateway_inventory", ["address", "name", "owner", "location", "payer", "first_block", "last_block",
+                                        "reward_scale", "elevation", "gain", "nonce"],
+          ((a, r.name, r.owner, r.location, r.payer, r.first_block, s["blocks"], 1.0, 10, 12, 1)
+           for a, r in zip(inventory.index, inventory.itertuples(index=False))))
+    makers = inventory[["payer", "maker"]].drop_duplicates("payer")
+    _copy(engine, "makers", ["address", "name"], makers.itertuples(index=False))
+    places = inventory.dropna(subset=["location"]).drop_duplicates("location")
+    _copy(engine, "locations", ["location", "long_country", "long_state", "long_city", "geometry"],
+          ((r.location, r.long_country, r.long_state, r.long_city,
+            "SRID=4326;POINT({1} {0})".format(*h3.h3_to_geo(r.location))) for r in places.itertuples(index=False)))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    _copy(engine, "blocks", ["height", "timestamp"],
+          ((h, (now - datetime.timedelta(minutes=s["blocks"] - h)).isoformat()) for h in range(1, s["blocks"] + 1)))
+
+    active = inventory.dropna(subset=["location"]).iloc[:s["active"]]
+    logging.info(f"Seeding {s['receipts']} receipts between {len(active)} active hotspots")
+    _seed_receipts(engine, active, s, rng)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("analyze;")
+    return active
+
+
+def _seed_receipts(engine: Engine, active: pd.DataFrame, s: dict, rng: np.random.Generator):
+    addresses = active.index.to_numpy()
+    locations = active["location"].to_numpy()
+    transactions, actors, parsed = [], [], []
+    transmitters = rng.integers(0, len(addresses), s["receipts"])
+    blocks = rng.integers(1, s["blocks"] + 1, s["receipts"])
+    n_witnesses = rng.integers(1, s["witnesses"] + 1, s["receipts"])
+    for i, (t, block, k) in enumerate(zip(transmitters, blocks, n_witnesses)):
+        tx_hash = f"{i:012x}"
+        witnesses = [w for w in dict.fromkeys(rng.integers(0, len(addresses), k).tolist()) if w != t]
+        signals = rng.integers(-130, -60, len(witnesses))
+        snrs = rng.normal(0, 6, len(witnesses)).round(1)
+        fields = {"path": [{
+            "challengee": addresses[t],
+            "challengee_location": locations[t],
+            "witnesses": [{"gateway": addresses[w], "signal": int(sig), "snr": float(snr), "location": locations[w]}
+                          for w, sig, snr in zip(witnesses, signals, snrs)]
+        }]}
+        transactions.append((tx_hash, "poc_receipts_v2", block, json.dumps(fields)))
+        actors.append((addresses[t], "challengee", tx_hash, block))
+        for w, sig, snr in zip(witnesses, signals, snrs):
+            actors.append((addresses[w], "witness", tx_hash, block))
+            parsed.append((block, tx_hash, addresses[t], addresses[w], int(sig), float(snr)))
+
+    _copy(engine, "transactions", ["hash", "type", "block", "fields"], transactions)
+    _copy(engine, "transaction_actors", ["actor", "actor_role", "transaction_hash", "block"], actors)
+    _copy(engine, "challenge_receipts_parsed", ["block", "hash", "transmitter_address", "witness_address",
+                                                "witness_signal", "witness_snr"], parsed)
@@ -0,0 +1,160 @@
+"""
+Synthetic, seeded data for the benchmarks: helium-style addresses and names, denylist issue bodies, a gateway
+inventory and witness graphs. Nothing here touches the network or a database.
+"""
+from typing import List
+import numpy as np
+import pandas as pd
+import hashlib
+import h3
+
+
+_B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+ADJECTIVES = ["angry", "brave", "calm", "dizzy", "eager", "fancy", "gentle", "happy", "icy", "jolly", "kind", "lively",
+              "mean", "nice", "odd", "proud", "quick", "rare", "shy", "tall", "upbeat", "vast", "wild", "young", "zany"]
+COLORS = ["amber", "black", "blue", "brown", "cyan", "gold", "gray", "green", "indigo", "lemon", "lilac", "mauve",
+          "navy", "olive", "orange", "pink", "plum", "purple", "red", "rust", "silver", "tan", "teal", "white"]
+ANIMALS = ["ant", "bear", "cat", "dog", "eagle", "fox", "goat", "hawk", "ibis", "jay", "koala", "lion", "mole", "newt",
+           "owl", "panda", "quail", "rat", "seal", "tiger", "urchin", "viper", "wolf", "yak", "zebra", "mule", "lynx"]
+MAKERS = ["Bobcat", "Nebra", "RAK", "SenseCAP", "Milesight", "Heltec", "FreedomFi", "Linxdot", "Cal-Chip", "Helium Inc"]
+COUNTRIES = [("United States", "California", "Los Angeles"), ("Germany", "Berlin", "Berlin"),
+             ("China", "Guangdong", "Shenzhen"), ("United Kingdom", "England", "London"), ("Spain", "Madrid", "Madrid")]
+
+
+def b58encode(data: bytes) -> str:
+    n = int.from_bytes(data, "big")
+    out = []
+    while n:
+        n, r = divmod(n, 58)
+        out.append(_B58_ALPHABET[r])
+    pad = len(data) - len(data.lstrip(b"\0"))
+    return "1" * pad + "".join(reversed(out))
+
+
+def addresses(n: int, seed: int = 0) -> List[str]:
+    """
+    Valid b58check helium addresses (version 0, ed25519 key type).
+    """
+    keys = np.random.default_rng(seed).integers(0, 256, size=(n, 32), dtype=np.uint8)
+    result = []
+    for key in keys:
+        payload = b"\x00\x01" + key.tobytes()
+        checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+        result.append(b58encode(payload + checksum))
+    return result
+
+
+def names(n: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    return [f"{ADJECTIVES[a]}-{COLORS[c]}-{ANIMALS[z]}" for a, c, z in
+            zip(rng.integers(0, len(ADJECTIVES), n), rng.integers(0, len(COLORS), n), rng.integers(0, len(ANIMALS), n))]
+
+
+def locations(n: int, seed: int = 0, resolution: int = 12) -> List[str]:
+    rng = np.random.default_rng(seed)
+    lats, lons = rng.uniform(-60, 70, n), rng.uniform(-180, 180, n)
+    return [h3.geo_to_h3(lat, lon, resolution) for lat, lon in zip(lats, lons)]
+
+
+def gateway_inventory(n: int = 1_000_000, seed: int = 0, n_locations: int = 50_000, n_owners: int = 100_000) -> pd.DataFrame:
+    """
+    A gateway_inventory frame shaped like queries.get_gateway_inventory's, indexed by address.
+    """
+    rng = np.random.default_rng(seed)
+    location_pool = np.array(locations(min(n, n_locations), seed), dtype=object)
+    owner_pool = np.array(addresses(min(n, n_owners), seed + 1), dtype=object)
+    payer_pool = np.array(addresses(len(MAKERS), seed + 2), dtype=object)
+    maker_idx = rng.integers(0, len(MAKERS), n)
+    place_idx = rng.integers(0, len(COUNTRIES), n)
+    df = pd.DataFrame({
+        "address": addresses(n, seed + 3),
+        "name": names(n, seed),
+        "location": location_pool[rng.integers(0, len(location_pool), n)],
+        "owner": owner_pool[rng.integers(0, len(owner_pool), n)],
+        "payer": payer_pool[maker_idx],
+        "maker": np.array(MAKERS, dtype=object)[maker_idx],
+        "long_country": [COUNTRIES[i][0] for i in place_idx],
+        "long_state": [COUNTRIES[i][1] for i in place_idx],
+        "long_city": [COUNTRIES[i][2] for i in place_idx],
+        "first_block": rng.integers(1, 1_500_000, n)
+    })
+    # ~5% of hotspots never asserted a location
+    df.loc[rng.random(n) < 0.05, "location"] = None
+    return df.set_index("address")
+
+
+def issue_body(kind: str, items: List[str], rng: np.random.Generator) -> str:
+    """
+    A denylist issue body listing `items`.
+    :param kind: "template" (the issue template, one address per line), "messy" (mixed separators, bullets, stray
+    whitespace and commentary) or "names" (the template's hotspot name section).
+    """
+    header = "### Hotspot b58 Addresses" if kind != "names" else "### Hotspot Name"
+    lines = ["### Submission Type", "", "Addition", ""]
+    if kind == "messy":
+        lines += ["### Hotspot b58 Address", ""]
+        i = 0
+        while i < len(items):
+            style = rng.integers(0, 4)
+            chunk = items[i:i + int(rng.integers(1, 20))]
+            i += len(chunk)
+            if style == 0:
+                lines += [f"- {a}" for a in chunk]
+            elif style == 1:
+                lines.append(", ".join(chunk))
+            elif style == 2:
+                lines += [f"  {a}  " for a in chunk] + [""]
+            else:
+                lines += chunk
+        lines += [""]
+    else:
+        lines += [header, ""] + items + [""]
+    lines += ["### Evidence", "", "These hotspots are all asserted in the same spot and only witness each other. " * 5,
+              "", "### Discord Handle", "", "someone#1234"]
+    return "\n".join(lines)
+
+
+def issues(n: int, gateway_inventory: pd.DataFrame, seed: int = 0, max_items: int = 5000) -> List[dict]:
+    """
+    Issues (as returned by api.get_issues) with 1..max_items entries each, log-uniformly distributed, drawn from the
+    gateway inventory (plus a few unknown addresses).
+    """
+    rng = np.random.default_rng(seed)
+    inventory_addresses = gateway_inventory.index.to_numpy()
+    inventory_names = gateway_inventory["name"].to_numpy()
+    result = []
+    for number in range(1, n + 1):
+        k = int(np.exp(rng.uniform(0, np.log(max_items))))
+        kind = ["template", "messy", "names"][rng.choice(3, p=[0.6, 0.25, 0.15])]
+        idx = rng.integers(0, len(inventory_addresses), k)
+        if kind == "names":
+            items = [n.replace("-", " ").title() for n in inventory_names[idx]]
+        else:
+            items = list(inventory_addresses[idx])
+            items[:max(1, k // 50)] = addresses(max(1, k // 50), seed + number)
+        result.append({"number": number, "title": f"Denylist addition {number}", "issue_type": "addition",
+                       "body": issue_body(kind, items, rng)})
+    return result
+
+
+def witness_graph(n_first: int, n_second: int, seed: int = 0) -> dict:
+    """
+    A witness_graph dataset (see queries.get_witness_graph): the target hotspot, `n_first` first-hop witnesses and
+    `n_second` second-hop witnesses of those.
+    """
+    rng = np.random.default_rng(seed)
+    pool = addresses(1 + n_first + n_second, seed)
+    target, first, second = pool[0], pool[1:1 + n_first], pool[1 + n_first:]
+    first_parents = rng.integers(0, max(n_first, 1), n_second)
+    transmitters = [target] * n_first + [first[i] for i in first_parents]
+    witnesses = first + second
+    hops = [1] * n_first + [2] * n_second
+    n = len(witnesses)
+    return {
+        "transmitter_address": np.array(transmitters, dtype=object),
+        "witness_address": np.array(witnesses, dtype=object),
+        "hop": np.array(hops, dtype=np.int64),
+        "maker": np.array(MAKERS, dtype=object)[rng.integers(0, len(MAKERS), n)],
+        "owner": np.array(addresses(max(1, n // 20), seed + 1), dtype=object)[rng.integers(0, max(1, n // 20), n)]
+    }
@@ -0,0 +1,217 @@
+"""
+A local stand-in for the parts of the GitHub REST API that api.py uses (issue and pull listings of helium/denylist),
+serving either synthetic issues/pulls or pages recorded from the real API.
+
+Record the real thing (needs GITHUB_ACCESS_TOKEN) with
+
+    python -m benchmarks.github_stub record <directory>
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from typing import List, Optional
+from dotenv import load_dotenv
+from benchmarks import generators
+import numpy as np
+import threading
+import datetime
+import requests
+import argparse
+import json
+import os
+
+
+load_dotenv()
+
+REPO_PATH = "/repos/helium/denylist"
+
+
+def _timestamp(dt: datetime.datetime) -> str:
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
+
+
+def synthetic_issue(number: int, kind: str, items: List[str], created_at: datetime.datetime,
+                    rng: np.random.Generator) -> dict:
+    issue_type = "removal" if rng.random() < 0.1 else "addition"
+    return {
+        "number": number,
+        "title": f"Denylist {issue_type} {number}",
+        "user": {"login": f"reporter{int(rng.integers(0, 200))}"},
+        "labels": [{"name": issue_type}],
+        "state": "open",
+        "created_at": _timestamp(created_at),
+        "updated_at": _timestamp(created_at),
+        "closed_at": None,
+        "comments": int(rng.integers(0, 10)),
+        "body": generators.issue_body(kind, items, rng),
+        "reactions": {"total_count": 0}
+    }
+
+
+def synthetic_issues(n: int, addresses: List[str], names: List[str], first_number: int = 1, days: int = 30,
+                     max_items: int = 1000, seed: int = 0, now: Optional[datetime.datetime] = None) -> List[dict]:
+    """
+    Issues in GitHub's format, created over the last `days` days, listing 1..max_items of `addresses` (or `names`).
+    """
+    rng = np.random.default_rng(seed)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    issues = []
+    for number in range(first_number, first_number + n):
+        k = int(np.exp(rng.uniform(0, np.log(max_items))))
+        kind = ["template", "messy", "names"][rng.choice(3, p=[0.6, 0.25, 0.15])]
+        pool = names if kind == "names" else addresses
+        items = [pool[i] for i in rng.integers(0, len(pool), k)]
+        if kind == "names":
+            items = [name.replace("-", " ").title() for name in items]
+        created_at = now - datetime.timedelta(seconds=float(rng.uniform(0, days * 86400)))
+        issues.append(synthetic_issue(number, kind, items, created_at, rng))
+    return issues
+
+
+def synthetic_pulls(issues: List[dict], n: int, first_number: int = 100000, seed: int = 0) -> List[dict]:
+    """
+    PR's closing a few issues each, in GitHub's format. Closed PR's also close their issues.
+    """
+    rng = np.random.default_rng(seed)
+    pulls = []
+    for number in range(first_number, first_number + n):
+        closes = [issues[i] for i in rng.choice(len(issues), size=min(len(issues), int(rng.integers(1, 6))), replace=False)]
+        created_at = max(_parse_timestamp(i["created_at"]) for i in closes) + datetime.timedelta(hours=1)
+        closed = rng.random() < 0.8
+        pulls.append({
+            "number": number,
+            "title": f"Update denylist ({len(closes)} issues)",
+            "user": {"login": "maintainer"},
+            "state": "closed" if closed else "open",
+            "created_at": _timestamp(created_at),
+            "updated_at": _timestamp(created_at),
+            "closed_at": _timestamp(created_at) if closed else None,
+            "body": "".join(f"Closes #{i['number']}\n" for i in closes)
+        })
+        if closed:
+            for i in closes:
+                i.update(state="closed", closed_at=_timestamp(created_at), updated_at=_timestamp(created_at))
+    return pulls
+
+
+class GithubStub:
+    """
+    Serves `issues` and `pulls` (lists of GitHub API objects) on a local port, paged and filtered like the real API.
+    The lists can be changed between runs to simulate new activity.
+    """
+    def __init__(self, issues: List[dict], pulls: List[dict], host: str = "127.0.0.1", port: int = 0):
+        self.issues = issues
+        self.pulls = pulls
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.startswith(f"{REPO_PATH}/issues/"):
+                    number = url.path.rsplit("/", 1)[1]
+                    matches = [i for i in stub.issues if str(i["number"]) == number]
+                    if matches:
+                        self._send_json(matches[0])
+                    else:
+                        self.send_error(404)
+                    return
+                if url.path == f"{REPO_PATH}/issues":
+                    items = stub.issues
+                elif url.path == f"{REPO_PATH}/pulls":
+                    items = stub.pulls
+                else:
+                    self.send_error(404)
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    items = list(items)
+                if query.get("state", "open") != "all":
+                    items = [i for i in items if i["state"] == query.get("state", "open")]
+                if "since" in query:
+                    since = _parse_timestamp(query["since"])
+                    items = [i for i in items if _parse_timestamp(i["updated_at"]) >= since]
+                items = sorted(items, key=lambda i: i["number"], reverse=True)
+                per_page = min(int(query.get("per_page", 30)), 100)
+                page = int(query.get("page", 1))
+                self._send_json(items[(page - 1) * per_page:page * per_page])
+
+            def _send_json(self, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "GithubStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_activity(self, issues: List[dict], pulls: List[dict]):
+        with self._lock:
+            self.issues = self.issues + issues
+            self.pulls = self.pulls + pulls
+
+    @classmethod
+    def from_recording(cls, directory: str) -> "GithubStub":
+        with open(os.path.join(directory, "issues.json")) as f:
+            issues = json.load(f)
+        with open(os.path.join(directory, "pulls.json")) as f:
+            pulls = json.load(f)
+        return cls(issues, pulls)
+
+
+def record(directory: str):
+    """
+    Save every issue and PR of helium/denylist, as returned by the API, to issues.json and pulls.json in `directory`.
+    """
+    headers = {"accept": "application/vnd.github+json", "Authorization": f"token {os.getenv('GITHUB_ACCESS_TOKEN')}"}
+    os.makedirs(directory, exist_ok=True)
+    for name in ("issues", "pulls"):
+        items, page = [], 1
+        while True:
+            response = requests.get(f"https://api.github.com{REPO_PATH}/{name}?state=all&page={page}&per_page=100",
+                                    headers=headers)
+            response.raise_for_status()
+            if not response.json():
+                break
+            items.extend(response.json())
+            page += 1
+        with open(os.path.join(directory, f"{name}.json"), "w") as f:
+            json.dump(items, f)
+        print(f"Saved {len(items)} {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record the GitHub API responses the pipeline replays.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("directory")
+    parsed = parser.parse_args()
+    record(parsed.directory)
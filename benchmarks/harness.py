@@ -0,0 +1,130 @@
+"""
+Timing, peak memory and baseline comparison for the benchmarks.
+"""
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional, List
+import platform
+import tracemalloc
+import datetime
+import json
+import time
+import gc
+import os
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # returns the arguments for `fn`, not timed
+    setup: Callable[[], tuple]
+    fn: Callable
+    # units of work per call (addresses, rows, edges, ...) for the throughput
+    items: Callable[[tuple], int]
+    unit: str = "items"
+    repeat: Optional[int] = None
+
+
+@dataclass
+class Result:
+    name: str
+    items: int
+    unit: str
+    runs: int
+    min_seconds: float
+    median_seconds: float
+    peak_bytes: int
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.median_seconds if self.median_seconds else float("inf")
+
+
+def measure(benchmark: Benchmark, repeat: int = 5, warmup: int = 1) -> Result:
+    """
+    Time `repeat` calls (after `warmup` untimed ones), then measure the peak memory allocated by one more call with
+    tracemalloc (which slows it down, so it's kept out of the timings).
+    """
+    args = benchmark.setup()
+    repeat = benchmark.repeat or repeat
+    for _ in range(warmup):
+        benchmark.fn(*args)
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        benchmark.fn(*args)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark.fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times.sort()
+    return Result(
+        name=benchmark.name,
+        items=benchmark.items(args),
+        unit=benchmark.unit,
+        runs=repeat,
+        min_seconds=times[0],
+        median_seconds=times[len(times) // 2],
+        peak_bytes=peak
+    )
+
+
+def _size(n: float) -> str:
+    for suffix in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or suffix == "GB":
+            return f"{n:.0f}{suffix}" if suffix == "B" else f"{n:.1f}{suffix}"
+        n /= 1024
+
+
+def format_results(results: List[Result]) -> str:
+    lines = [f"{'benchmark':<40} {'items':>9} {'median':>10} {'min':>10} {'throughput':>20} {'peak mem':>10}"]
+    for r in results:
+        lines.append(f"{r.name:<40} {r.items:>9} {r.median_seconds * 1000:>8.1f}ms {r.min_seconds * 1000:>8.1f}ms "
+                     f"{r.throughput:>12.0f} {r.unit + '/s':<7} {_size(r.peak_bytes):>10}")
+    return "\n".join(lines)
+
+
+def save_baseline(path: str, results: List[Result], scale: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    baseline = {
+        "saved_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "scale": scale,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {r.name: {**asdict(r), "throughput": r.throughput} for r in results}
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def compare(path: str, results: List[Result], scale: str, threshold: float = 0.1) -> (str, int):
+    """
+    Compare results to a saved baseline. A benchmark regressed if its median time or peak memory grew by more than
+    `threshold` (relative).
+    :return: The comparison table and the number of regressions.
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    lines = []
+    if baseline.get("scale") != scale:
+        lines.append(f"Warning: baseline was saved at scale {baseline.get('scale')}, this run is {scale}")
+    lines.append(f"{'benchmark':<40} {'time':>10} {'vs base':>9} {'peak mem':>10} {'vs base':>9}")
+    regressions = 0
+    for r in results:
+        base = baseline["results"].get(r.name)
+        if base is None:
+            lines.append(f"{r.name:<40} {r.median_seconds * 1000:>8.1f}ms {'new':>9} {_size(r.peak_bytes):>10} {'new':>9}")
+            continue
+        time_ratio = r.median_seconds / base["median_seconds"] if base["median_seconds"] else 1.0
+        mem_ratio = r.peak_bytes / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        regressed = time_ratio > 1 + threshold or mem_ratio > 1 + threshold
+        regressions += regressed
+        lines.append(f"{r.name:<40} {r.median_seconds * 1000:>8.1f}ms {time_ratio:>8.2f}x {_size(r.peak_bytes):>10} "
+                     f"{mem_ratio:>8.2f}x{'  REGRESSION' if regressed else ''}")
+    return "\n".join(lines), regressions
@@ -0,0 +1,159 @@
+"""
+The benchmarks: issue body parsing, entry extraction against the gateway inventory, witness graph building, figure
+payloads, report encoding, the query row loops and the denylist diff/CSV building for PRs.
+"""
+from functools import lru_cache
+from marko import parser
+from sqlalchemy import create_engine, text
+from typing import List
+from benchmarks import generators
+from benchmarks.harness import Benchmark
+import numpy as np
+import api
+import graph
+import figures
+import reports
+import queries
+import denylist
+import xorf
+
+
+# inventory rows, issues, max entries per issue, witness graph sizes (first hop, second hop), query rows
+SCALES = {
+    "small": {"inventory": 50_000, "issues": 20, "max_items": 1000, "graphs": [(20, 100), (100, 2_000)], "rows": 20_000},
+    "full": {"inventory": 1_000_000, "issues": 40, "max_items": 5000,
+             "graphs": [(20, 100), (200, 5_000), (1_000, 50_000)], "rows": 200_000},
+}
+
+
+@lru_cache(maxsize=None)
+def _inventory(n: int):
+    return generators.gateway_inventory(n)
+
+
+@lru_cache(maxsize=None)
+def _issues(n: int, inventory: int, max_items: int) -> List[dict]:
+    return generators.issues(n, _inventory(inventory), max_items=max_items)
+
+
+def _parse_all(issues: List[dict]):
+    p = parser.Parser()
+    return [api.parse_body(p, issue["body"]) for issue in issues]
+
+
+def _count_lines(issues: List[dict]) -> int:
+    return sum(issue["body"].count("\n") for issue in issues)
+
+
+def _sqlite_rows(n: int):
+    """
+    An in-memory SQLite engine with `n` rows shaped like the entries table, to exercise the Python side of
+    queries.fetch_columns and the row -> dict loops without a Postgres server.
+    """
+    rng = np.random.default_rng(0)
+    engine = create_engine("sqlite://")
+    addresses = generators.addresses(min(n, 20_000))
+    with engine.begin() as conn:
+        conn.execute(text("create table entries (address text, issue_number integer, name text, maker text, "
+                          "first_block integer, lat real, lon real)"))
+        conn.execute(text("insert into entries values (:address, :issue_number, :name, :maker, :first_block, :lat, :lon)"), [
+            {"address": addresses[i % len(addresses)], "issue_number": int(i % 500), "name": f"name-{i}",
+             "maker": generators.MAKERS[i % len(generators.MAKERS)], "first_block": int(rng.integers(1, 1_500_000)),
+             "lat": float(rng.uniform(-60, 70)), "lon": float(rng.uniform(-180, 180))} for i in range(n)
+        ])
+    return engine
+
+
+_ROWS_SQL = "select address, issue_number, name, maker, first_block, lat, lon from entries"
+
+
+def _fetch_columns(engine):
+    return queries.fetch_columns(engine, _ROWS_SQL, {"address": object, "issue_number": np.int64, "name": object,
+                                                     "maker": object, "first_block": np.int64, "lat": np.float64,
+                                                     "lon": np.float64})
+
+
+def _rows_to_dicts(engine):
+    # the pattern used by get_entries_table / get_entries_page: fetchall, then one dict per row
+    with engine.connect() as conn:
+        res = conn.execute(text(_ROWS_SQL)).fetchall()
+    return [
+        {
+            "address": r[0],
+            "issue_number": r[1],
+            "name": r[2],
+            "maker": r[3],
+            "first_block": r[4],
+            "lat": r[5],
+            "lon": r[6]
+        } for r in res
+    ]
+
+
+def _denylist(n: int, n_changes: int):
+    state = denylist.DenylistState(url="")
+    state.order = tuple(generators.addresses(n, seed=10))
+    state.addresses = frozenset(state.order)
+    # half of the additions are already denied, half of the removals aren't
+    additions = list(state.order[:n_changes // 2]) + generators.addresses(n_changes // 2, seed=11)
+    removals = list(state.order[-n_changes // 2:]) + generators.addresses(n_changes // 2, seed=12)
+    return state, additions, removals
+
+
+def _generate_pr(state, additions, removals):
+    diff = state.diff(additions, removals)
+    return denylist.format_denylist(state.apply(diff)), ",\n".join(diff.additions), ",\n".join(diff.removals)
+
+
+def _receipts(n: int) -> (dict, dict):
+    rng = np.random.default_rng(0)
+    distance = rng.exponential(5000, n)
+    rssi = -40 - 2e-3 * distance + rng.normal(0, 8, n)
+    return {"distance_m": distance, "rssi": rssi}, {"rssi": rssi, "snr": rng.normal(0, 5, n)}
+
+
+def _xor_filter_checks(n: int):
+    # a denylist of half the candidates, and the candidates decoded up front as a caller checking many filters would
+    candidates = generators.addresses(n, seed=17)
+    return xorf.from_addresses(candidates[::2]), xorf.load_addresses(candidates)
+
+
+def benchmarks(scale: str = "small") -> List[Benchmark]:
+    s = SCALES[scale]
+    inventory, n_issues, max_items = s["inventory"], s["issues"], s["max_items"]
+    result = [
+        Benchmark("api.parse_body", lambda: (_issues(n_issues, inventory, max_items),), _parse_all,
+                  lambda args: _count_lines(args[0]), unit="lines"),
+        Benchmark(f"api.get_entries (inventory {inventory})",
+                  lambda: (_issues(n_issues, inventory, max_items), _inventory(inventory)), api.get_entries,
+                  lambda args: _count_lines(args[0]), unit="lines", repeat=3),
+    ]
+    for first, second in s["graphs"]:
+        result += [
+            Benchmark(f"graph.build_witness_graph ({first + second} edges)",
+                      lambda first=first, second=second: (generators.witness_graph(first, second),),
+                      graph.build_witness_graph, lambda args: len(args[0]["hop"]), unit="edges"),
+            Benchmark(f"graph.cytoscape_elements ({first + second} edges)",
+                      lambda first=first, second=second: (graph.build_witness_graph(generators.witness_graph(first, second)),),
+                      graph.cytoscape_elements, lambda args: len(args[0]["node_id"]) + len(args[0]["edge_source"]),
+                      unit="elements"),
+        ]
+    rows = s["rows"]
+    result += [
+        Benchmark("figures.build_figure_payloads", lambda: _receipts(rows), figures.build_figure_payloads,
+                  lambda args: len(args[0]["rssi"]), unit="receipts"),
+        Benchmark("reports.encode_bundle", lambda: ({"graph": graph.build_witness_graph(generators.witness_graph(200, 5_000)),
+                                                     "figures": figures.build_figure_payloads(*_receipts(rows))},),
+                  reports.encode_bundle, lambda args: 1, unit="bundles"),
+        Benchmark("queries.fetch_columns (sqlite)", lambda: (_sqlite_rows(rows),), _fetch_columns,
+                  lambda args: rows, unit="rows"),
+        Benchmark("queries row -> dict loop (sqlite)", lambda: (_sqlite_rows(rows),), _rows_to_dicts,
+                  lambda args: rows, unit="rows"),
+        Benchmark("denylist diff + PR csv", lambda: _denylist(rows * 2, rows // 10), _generate_pr,
+                  lambda args: len(args[0]) + len(args[1]) + len(args[2]), unit="addresses"),
+        Benchmark("xorf.from_addresses", lambda: (generators.addresses(rows, seed=13),), xorf.from_addresses,
+                  lambda args: len(args[0]), unit="addresses"),
+        Benchmark("xorf.contains_addresses (loaded)", lambda: _xor_filter_checks(rows), xorf.contains_addresses,
+                  lambda args: len(args[1].addresses), unit="addresses"),
+    ]
+    return result
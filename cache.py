@@ -0,0 +1,179 @@
+"""
+Cache shared by all of the dashboard's worker processes, so counts, issue details and report objects fetched by one
+worker are reused by the others.
+
+Backends: a directory on local disk (default), a Redis-compatible server, or nothing.
+"""
+from abc import ABC, abstractmethod
+from typing import Optional, Callable
+import tempfile
+import hashlib
+import logging
+import pickle
+import struct
+import time
+import os
+
+
+class SharedCache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    def get_object(self, key: str):
+        value = self.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set_object(self, key: str, obj, ttl: float):
+        self.set(key, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    def cached(self, key: str, ttl: float, fn: Callable, *args, **kwargs):
+        """
+        Return the cached result for `key`, or call fn(*args, **kwargs) and cache its result for `ttl` seconds.
+        Cache errors never fail the call.
+        """
+        try:
+            result = self.get_object(key)
+        except Exception as e:
+            logging.warning(f"Shared cache read of {key} failed: {e}")
+            result = None
+        if result is not None:
+            return result
+        result = fn(*args, **kwargs)
+        try:
+            self.set_object(key, result, ttl)
+        except Exception as e:
+            logging.warning(f"Shared cache write of {key} failed: {e}")
+        return result
+
+
+class NullCache(SharedCache):
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+
+class DiskCache(SharedCache):
+    """
+    One file per key, written atomically, prefixed with its expiry time. Every `prune_every` writes, expired entries
+    are removed and, if the directory is over `max_bytes`, the least recently written ones too.
+
+    Entries are unpickled, so the directory must only be writable by us: it is created with mode 0o700, and an existing
+    one owned by another user or writable by group/others is refused.
+    """
+    _HEADER = struct.Struct("<d")
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 ** 2, prune_every: int = 256):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._writes = 0
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        check_private_dir(root)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        (expires,) = self._HEADER.unpack_from(data)
+        if expires < time.time():
+            return None
+        return data[self._HEADER.size:]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._HEADER.pack(time.time() + ttl))
+            f.write(value)
+        os.replace(tmp, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.root):
+            try:
+                if entry.name.startswith(".tmp-"):
+                    # left behind by a worker that died mid-write
+                    if entry.stat().st_mtime < now - 3600:
+                        os.remove(entry.path)
+                    continue
+                with open(entry.path, "rb") as f:
+                    (expires,) = self._HEADER.unpack(f.read(self._HEADER.size))
+                if expires < now:
+                    os.remove(entry.path)
+                else:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except (FileNotFoundError, struct.error):
+                continue
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def check_private_dir(path: str):
+    if not hasattr(os, "getuid"):
+        # no POSIX ownership/modes (Windows)
+        return
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+        raise PermissionError(f"Directory {path} must be owned by uid {os.getuid()} and not writable by "
+                              f"group/others (it is uid {stat.st_uid}, mode {oct(stat.st_mode & 0o777)})")
+
+
+def default_cache_dir() -> str:
+    """
+    A per-user directory under the system temp dir, e.g. /tmp/denylist-cache-1000.
+    """
+    suffix = f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+    return os.path.join(tempfile.gettempdir(), f"denylist-cache{suffix}")
+
+
+class RedisCache(SharedCache):
+    def __init__(self, url: str, prefix: str = "denylist:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+
+def get_cache() -> SharedCache:
+    """
+    The shared cache configured by CACHE_BACKEND ("disk", "redis" or "none").
+    """
+    backend = os.getenv("CACHE_BACKEND", "disk").lower()
+    if backend == "none":
+        return NullCache()
+    if backend == "redis":
+        return RedisCache(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "disk":
+        return DiskCache(os.getenv("CACHE_DIR") or default_cache_dir(),
+                         max_bytes=int(os.getenv("CACHE_MAX_BYTES", 512 * 1024 ** 2)))
+    raise ValueError(f"Unknown CACHE_BACKEND {backend}")
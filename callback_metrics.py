@@ -0,0 +1,270 @@
+"""
+Latency histograms for the dashboard's callbacks, served at /metrics in Prometheus text format.
+
+Decorate a callback with `timed` to record its latency (by outcome: ok, prevented or error) and, for a sample of calls,
+the size of its response. Inside a timed callback, `step("query")`, `step("fetch")`, ... record the time spent in each
+sub-step. Callbacks slower than DASH_SLOW_CALLBACK_MS are logged with their step breakdown and inputs.
+
+Every gunicorn worker keeps its own histograms and periodically writes them to DASH_METRICS_DIR; /metrics merges the
+files of all live workers, so it doesn't matter which worker serves the scrape. A worker's file is removed when it exits
+(gunicorn's child_exit hook, see gunicorn.conf.py), and files of processes that are no longer running are skipped and
+removed, so counters restart with the workers, like any Prometheus counter.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dash.exceptions import PreventUpdate
+from flask import Flask, Response
+from functools import wraps
+from plotly.utils import PlotlyJSONEncoder
+from typing import Optional
+from cache import check_private_dir
+import tempfile
+import threading
+import logging
+import reprlib
+import random
+import json
+import glob
+import uuid
+import time
+import os
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7)
+
+_current: ContextVar[Optional[dict]] = ContextVar("callback_metrics_current", default=None)
+
+# slow callback inputs are logged in short: their tables can be large
+_ARGS_REPR = reprlib.Repr()
+_ARGS_REPR.maxstring = 100
+_ARGS_REPR.maxother = 100
+
+
+def default_metrics_dir() -> str:
+    """
+    A per-user directory under the system temp dir, e.g. /tmp/denylist-dash-metrics-1000.
+    """
+    suffix = f"-{os.getuid()}" if hasattr(os, "getuid") else ""
+    return os.path.join(tempfile.gettempdir(), f"denylist-dash-metrics{suffix}")
+
+
+class CallbackMetrics:
+    def __init__(self, directory: Optional[str] = None, slow_ms: Optional[float] = None, payload_sample: float = 0.1,
+                 flush_every: float = 5):
+        self.directory = directory
+        self.slow_ms = slow_ms
+        self.payload_sample = payload_sample
+        self.flush_every = flush_every
+        # (metric, sorted label items) -> [bucket counts..., sum, count]
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._checked = False
+        self._pid = os.getpid()
+        # tells our file apart from one left by an earlier process with the same PID
+        self._token = uuid.uuid4().hex[:8]
+
+    @classmethod
+    def from_env(cls) -> "CallbackMetrics":
+        slow_ms = os.getenv("DASH_SLOW_CALLBACK_MS")
+        return cls(
+            directory=os.getenv("DASH_METRICS_DIR") or default_metrics_dir(),
+            slow_ms=float(slow_ms) if slow_ms else None,
+            payload_sample=float(os.getenv("DASH_PAYLOAD_SAMPLE", 0.1))
+        )
+
+    def observe(self, metric: str, labels: dict, value: float):
+        buckets = BYTES_BUCKETS if metric.endswith("_bytes") else SECONDS_BUCKETS
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked: don't report the parent's observations as ours
+                self._histograms, self._pid, self._token = {}, os.getpid(), uuid.uuid4().hex[:8]
+            h = self._histograms.setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def step(self, name: str):
+        """
+        Time a sub-step of the current callback. Does nothing outside of a timed callback.
+        """
+        current = _current.get()
+        if current is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current["steps"][name] = current["steps"].get(name, 0) + elapsed
+            self.observe("dash_callback_step_seconds", {"callback": current["callback"], "step": name}, elapsed)
+
+    def timed(self, fn):
+        name = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = {"callback": name, "steps": {}}
+            token = _current.set(current)
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                result = fn(*args, **kwargs)
+                if self.payload_sample and random.random() < self.payload_sample:
+                    size = len(json.dumps(result, cls=PlotlyJSONEncoder))
+                    self.observe("dash_callback_payload_bytes", {"callback": name}, size)
+                return result
+            except PreventUpdate:
+                status = "prevented"
+                raise
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _current.reset(token)
+                self.observe("dash_callback_seconds", {"callback": name, "status": status}, elapsed)
+                if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms and status != "prevented":
+                    steps = ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in current["steps"].items())
+                    logging.warning(f"Slow callback {name} took {elapsed * 1000:.0f}ms ({steps or 'no steps'}), "
+                                    f"inputs: {_ARGS_REPR.repr(args)[:500]}")
+        return wrapper
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return {json.dumps([metric, labels]): list(h) for (metric, labels), h in self._histograms.items()}
+
+    def _directory_ok(self) -> bool:
+        """
+        Whether the metrics directory can be used: any file in it is merged into /metrics, so it must be private to
+        our user. Otherwise (checked once) metrics are kept per worker.
+        """
+        if self.directory and not self._checked:
+            try:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                check_private_dir(self.directory)
+            except OSError as e:
+                logging.error(f"Not sharing callback metrics between workers: {e}")
+                self.directory = None
+            self._checked = True
+        return bool(self.directory)
+
+    def _maybe_flush(self, force: bool = False):
+        if not self._directory_ok() or (not force and time.monotonic() - self._flushed_at < self.flush_every):
+            return
+        self._flushed_at = time.monotonic()
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp, os.path.join(self.directory, f"worker-{os.getpid()}-{self._token}.json"))
+
+    def _merged(self) -> dict:
+        self._maybe_flush(force=True)
+        if not self._directory_ok():
+            return self._snapshot()
+        own = f"worker-{os.getpid()}-{self._token}.json"
+        merged = {}
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith("worker-"):
+                continue
+            pid = _file_pid(entry.name)
+            if entry.name != own and (pid is None or pid == os.getpid() or not _pid_alive(pid)):
+                # left by a worker that is gone (or by an earlier process that had our PID)
+                _remove(entry.path)
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshot = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            for key, h in snapshot.items():
+                total = merged.setdefault(key, [0] * len(h))
+                for i, v in enumerate(h):
+                    total[i] += v
+        return merged
+
+    def render(self) -> str:
+        """
+        All workers' histograms in Prometheus text format.
+        """
+        lines, typed = [], set()
+        for key, h in sorted(self._merged().items()):
+            metric, labels = json.loads(key)
+            buckets = BYTES_BUCKETS if metric.endswith("_bytes") else SECONDS_BUCKETS
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+            for bound, count in zip(buckets, h):
+                lines.append(f'{metric}_bucket{{{label_str},le="{bound:g}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label_str},le="+Inf"}} {h[-1]}')
+            lines.append(f"{metric}_sum{{{label_str}}} {h[-2]}")
+            lines.append(f"{metric}_count{{{label_str}}} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _file_pid(name: str) -> Optional[int]:
+    try:
+        return int(name.split("-")[1].split(".")[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None):
+    """
+    Remove the histograms of worker `pid`, e.g. from gunicorn's child_exit hook.
+    """
+    directory = directory or get_metrics().directory
+    if directory:
+        for path in glob.glob(os.path.join(glob.escape(directory), f"worker-{pid}-*.json")):
+            _remove(path)
+
+
+_metrics: Optional[CallbackMetrics] = None
+
+
+def get_metrics() -> CallbackMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = CallbackMetrics.from_env()
+    return _metrics
+
+
+def timed(fn):
+    return get_metrics().timed(fn)
+
+
+def step(name: str):
+    return get_metrics().step(name)
+
+
+def register(server: Flask):
+    @server.route("/metrics")
+    def callback_metrics():
+        return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
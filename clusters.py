@@ -0,0 +1,224 @@
+"""
+Fleet clustering of the entries pending review, so a reviewer can judge an operator's hotspots in one pass instead of
+one issue at a time.
+
+cluster_entries groups the pending entries of all open issues by owner, by payer, or ("connected") into the connected
+components of a graph linking each hotspot to its owner and to the hotspots it witnessed or was witnessed by, so fleets
+spread over several wallets end up together. Everything is integer coded (pd.factorize) and aggregated with bincount /
+reduceat, so it stays a few vectorized passes over the entries however many clusters there are.
+"""
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from typing import Optional, List
+import numpy as np
+import pandas as pd
+
+
+METHODS = ["owner", "payer", "connected"]
+
+# number of makers/countries kept in a cluster's summary
+TOP_VALUES = 5
+
+KM_PER_DEGREE = 111.2
+
+
+def _distinct_pairs(codes: np.ndarray, values: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Unique (cluster code, value code) pairs, ignoring missing values (-1).
+    :return: The cluster and value code of each pair, sorted by cluster then value, and how often the pair occurs.
+    """
+    mask = values >= 0
+    m = int(values.max()) + 1 if mask.any() else 1
+    pairs, counts = np.unique(codes[mask].astype(np.int64) * m + values[mask], return_counts=True)
+    return pairs // m, pairs % m, counts
+
+
+def _distinct_counts(codes: np.ndarray, values: np.ndarray, k: int) -> np.ndarray:
+    return np.bincount(_distinct_pairs(codes, values)[0], minlength=k)
+
+
+def _top_values(codes: np.ndarray, values: np.ndarray, uniques: np.ndarray, k: int, keep: np.ndarray) -> (List[dict], np.ndarray):
+    """
+    The most common values of each kept cluster, with their counts.
+    :return: A {value: count} dict per kept cluster (most common first), and the count of the most common value of
+    every cluster.
+    """
+    pair_codes, pair_values, counts = _distinct_pairs(codes, values)
+    top = np.zeros(k, dtype=np.int64)
+    np.maximum.at(top, pair_codes, counts)
+    order = np.lexsort((-counts, pair_codes))
+    pair_codes, pair_values, counts = pair_codes[order], pair_values[order], counts[order]
+    bounds = np.searchsorted(pair_codes, np.arange(k + 1))
+    dicts = [
+        {str(uniques[v]): int(n) for v, n in zip(pair_values[bounds[c]:bounds[c + 1]][:TOP_VALUES],
+                                                 counts[bounds[c]:bounds[c + 1]][:TOP_VALUES])}
+        for c in keep
+    ]
+    return dicts, top
+
+
+def _group_reduce(ufunc: np.ufunc, codes: np.ndarray, values: np.ndarray, k: int) -> np.ndarray:
+    """
+    `ufunc`.reduceat of `values` per cluster code. Clusters without values get NaN.
+    """
+    order = np.argsort(codes, kind="stable")
+    codes, values = codes[order], values[order]
+    starts = np.searchsorted(codes, np.arange(k))
+    present = np.bincount(codes, minlength=k) > 0
+    out = np.full(k, np.nan)
+    if present.any():
+        out[present] = ufunc.reduceat(values, starts[present])
+    return out
+
+
+def _connected_labels(addresses: np.ndarray, owners: np.ndarray, edges: Optional[dict]) -> np.ndarray:
+    """
+    Connected component of each entry in the graph of hotspot -> owner links plus witness edges.
+    """
+    address_codes, unique_addresses = pd.factorize(addresses)
+    owner_codes, unique_owners = pd.factorize(owners)
+    n_addresses = len(unique_addresses)
+    n = n_addresses + len(unique_owners)
+
+    has_owner = owner_codes >= 0
+    sources = [address_codes[has_owner]]
+    targets = [n_addresses + owner_codes[has_owner]]
+    if edges is not None and len(edges["transmitter_address"]):
+        index = pd.Index(unique_addresses)
+        s = index.get_indexer(edges["transmitter_address"])
+        t = index.get_indexer(edges["witness_address"])
+        both = (s >= 0) & (t >= 0)
+        sources.append(s[both])
+        targets.append(t[both])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n, n))
+    _, components = connected_components(graph, directed=False)
+    return components[address_codes]
+
+
+def cluster_entries(entries: dict, method: str = "owner", edges: Optional[dict] = None,
+                    min_size: int = 2) -> (List[dict], dict):
+    """
+    Group pending entries into fleets and summarize each one.
+    :param entries: Columns of queries.get_pending_entries.
+    :param method: "owner", "payer" or "connected".
+    :param edges: Witness edges between the entries' hotspots (queries.get_witness_edges). Used by "connected" to join
+    fleets, and by every method to count the witness edges within each cluster.
+    :param min_size: Min number of distinct hotspots in a cluster.
+    :return: The rows of the clusters table, and the columns (cluster_id, address, issue_number) of their members.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown clustering method {method}")
+    addresses = np.asarray(entries["address"], dtype=object)
+
+    if method == "connected":
+        codes, _ = pd.factorize(_connected_labels(addresses, np.asarray(entries["owner"], dtype=object), edges))
+    else:
+        codes, _ = pd.factorize(np.asarray(entries[method], dtype=object))
+    # entries without an owner/payer aren't in any cluster
+    clustered = codes >= 0
+    codes = codes[clustered]
+    columns = {k: np.asarray(v)[clustered] for k, v in entries.items()}
+    addresses = addresses[clustered]
+    k = int(codes.max()) + 1 if len(codes) else 0
+
+    address_codes, unique_addresses = pd.factorize(addresses)
+    issue_codes, unique_issues = pd.factorize(columns["issue_number"])
+    owner_codes, unique_owners = pd.factorize(columns["owner"])
+    payer_codes, _ = pd.factorize(columns["payer"])
+    location_codes, _ = pd.factorize(columns["location"])
+
+    n_entries = np.bincount(codes, minlength=k)
+    n_hotspots = _distinct_counts(codes, address_codes, k)
+    keep = np.flatnonzero(n_hotspots >= min_size)
+    if not len(keep):
+        return [], {"cluster_id": np.array([], dtype=object), "address": np.array([], dtype=object),
+                    "issue_number": np.array([], dtype=np.int64)}
+    n_issues = _distinct_counts(codes, issue_codes, k)
+    n_owners = _distinct_counts(codes, owner_codes, k)
+    n_payers = _distinct_counts(codes, payer_codes, k)
+    n_locations = _distinct_counts(codes, location_codes, k)
+
+    # per-hotspot features: one row per (cluster, hotspot)
+    _, first = np.unique(codes.astype(np.int64) * len(unique_addresses) + address_codes, return_index=True)
+    h_codes = codes[first]
+    maker_codes, unique_makers = pd.factorize(columns["maker"][first])
+    country_codes, unique_countries = pd.factorize(columns["long_country"][first])
+    makers, top_maker = _top_values(h_codes, maker_codes, np.asarray(unique_makers), k, keep)
+    countries, _ = _top_values(h_codes, country_codes, np.asarray(unique_countries), k, keep)
+    owners, _ = _top_values(h_codes, owner_codes[first], np.asarray(unique_owners), k, keep)
+
+    first_block = columns["first_block"][first].astype(np.float64)
+    first_block_span = _group_reduce(np.fmax, h_codes, first_block, k) - _group_reduce(np.fmin, h_codes, first_block, k)
+
+    # RMS distance of the hotspots from the cluster's centroid (equirectangular, fine at fleet scale)
+    lat, lon = columns["lat"][first].astype(np.float64), columns["lon"][first].astype(np.float64)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    n_located = np.bincount(h_codes[located], minlength=k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_lat = np.bincount(h_codes[located], weights=lat[located], minlength=k) / n_located
+        mean_lon = np.bincount(h_codes[located], weights=lon[located], minlength=k) / n_located
+        dy = (lat[located] - mean_lat[h_codes[located]]) * KM_PER_DEGREE
+        dx = (lon[located] - mean_lon[h_codes[located]]) * KM_PER_DEGREE * np.cos(np.radians(lat[located]))
+        spread = np.sqrt(np.bincount(h_codes[located], weights=dx ** 2 + dy ** 2, minlength=k) / n_located)
+
+    witness_edges = None
+    if edges is not None:
+        # a hotspot listed under several owners is counted in the cluster of its first entry
+        hotspot_clusters = pd.Series(h_codes, index=addresses[first])
+        hotspot_clusters = hotspot_clusters[~hotspot_clusters.index.duplicated()]
+        cluster_of = np.append(hotspot_clusters.to_numpy(), -1)
+        s = cluster_of[hotspot_clusters.index.get_indexer(edges["transmitter_address"])]
+        t = cluster_of[hotspot_clusters.index.get_indexer(edges["witness_address"])]
+        internal = (s == t) & (s >= 0)
+        witness_edges = np.bincount(s[internal], minlength=k)
+
+    # cluster ids that survive recomputation as long as the fleet's owner/payer (or smallest address) does
+    if method == "connected":
+        order = np.lexsort((addresses, codes))
+        starts = np.searchsorted(codes[order], np.arange(k))
+        keys = addresses[order][np.minimum(starts, len(order) - 1)]
+    else:
+        keys = np.empty(k, dtype=object)
+        keys[codes] = columns[method]
+    cluster_ids = np.array([f"{method}:{key}" for key in keys], dtype=object)
+
+    issue_pairs, issue_values, _ = _distinct_pairs(codes, issue_codes)
+    issue_bounds = np.searchsorted(issue_pairs, np.arange(k + 1))
+
+    computed_at = pd.Timestamp.utcnow().tz_localize(None).to_pydatetime()
+    clusters = []
+    for i, c in enumerate(keep):
+        if method == "connected":
+            # named after its largest owner
+            label = next(iter(owners[i]), None)
+            label = f"{label} (+{n_owners[c] - 1} owners)" if label and n_owners[c] > 1 else label
+        else:
+            label = keys[c]
+        clusters.append({
+            "cluster_id": cluster_ids[c],
+            "method": method,
+            "label": label,
+            "n_entries": int(n_entries[c]),
+            "n_hotspots": int(n_hotspots[c]),
+            "n_issues": int(n_issues[c]),
+            "n_owners": int(n_owners[c]),
+            "n_payers": int(n_payers[c]),
+            "n_locations": int(n_locations[c]),
+            "issues": [int(unique_issues[v]) for v in issue_values[issue_bounds[c]:issue_bounds[c + 1]]],
+            "makers": makers[i],
+            "countries": countries[i],
+            "top_maker_share": float(top_maker[c] / n_hotspots[c]),
+            "hotspots_per_location": float(n_hotspots[c] / n_locations[c]) if n_locations[c] else None,
+            "first_block_span": None if np.isnan(first_block_span[c]) else int(first_block_span[c]),
+            "location_spread_km": None if np.isnan(spread[c]) else float(spread[c]),
+            "witness_edges": None if witness_edges is None else int(witness_edges[c]),
+            "computed_at": computed_at
+        })
+
+    members = np.isin(codes, keep)
+    return clusters, {
+        "cluster_id": cluster_ids[codes[members]],
+        "address": addresses[members],
+        "issue_number": columns["issue_number"][members].astype(np.int64)
+    }
@@ -0,0 +1,163 @@
+"""
+Local copy of the current helium/denylist denylist.csv, kept as a hashed set so membership checks and PR diffs are
+O(1) per address.
+"""
+from collections import namedtuple
+from typing import Iterable, Optional
+import threading
+import requests
+import logging
+import time
+
+
+DENYLIST_URL = "https://raw.githubusercontent.com/helium/denylist/main/denylist.csv"
+
+# additions: addresses that aren't on the list yet; already_denied: additions that already are
+# removals: addresses on the list that will be removed; not_denied: removals that aren't on the list
+DenylistDiff = namedtuple("DenylistDiff", ["additions", "already_denied", "removals", "not_denied", "version"])
+
+
+class StaleDiff(ValueError):
+    """
+    A diff applied to a different version of the denylist than it was computed from.
+    """
+
+
+def parse_denylist(text: str) -> list:
+    """
+    Parse denylist.csv (one address per line, each followed by a comma) into a list of addresses, in file order.
+    """
+    return [a for a in (line.strip().rstrip(",").strip() for line in text.splitlines()) if a]
+
+
+def format_denylist(addresses: Iterable[str]) -> str:
+    return "".join(f"{a},\n" for a in addresses)
+
+
+class DenylistState:
+    """
+    The current denylist, refreshed from GitHub with conditional requests (If-None-Match) at most every
+    `refresh_after` seconds. `version` is bumped whenever the contents change. After a failed download, the next
+    attempt is delayed by `retry_after` seconds, doubling with every failure up to `refresh_after`.
+    """
+    def __init__(self, url: str = DENYLIST_URL, refresh_after: float = 300, retry_after: float = 10):
+        self.url = url
+        self.refresh_after = refresh_after
+        self.retry_after = retry_after
+        self.addresses = frozenset()
+        self.order = ()
+        self.etag: Optional[str] = None
+        self.version = 0
+        self.failures = 0
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        # held while the contents are swapped, so diff/apply see one version (unlike _lock, never around a download)
+        self._swap = threading.Lock()
+        self._background: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether any version of the denylist has been downloaded yet. Until then, membership is unknown.
+        """
+        return self.version > 0
+
+    def _due(self) -> bool:
+        wait = self.refresh_after if not self.failures else min(self.refresh_after,
+                                                                 self.retry_after * 2 ** (self.failures - 1))
+        return time.monotonic() - self._checked_at >= wait
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-download denylist.csv if it changed.
+        :param force: Check now, even if the last check was less than `refresh_after` seconds ago (or we're backing
+        off after a failure).
+        :return: Whether the contents changed.
+        """
+        with self._lock:
+            if not force and not self._due():
+                return False
+            headers = {"If-None-Match": self.etag} if self.etag else {}
+            try:
+                response = requests.get(self.url, headers=headers, timeout=30)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self._checked_at = time.monotonic()
+                self.failures += 1
+                if not self.version:
+                    raise
+                logging.warning(f"Could not refresh denylist, using version {self.version}: {e}")
+                return False
+            self._checked_at = time.monotonic()
+            self.failures = 0
+            if response.status_code == 304:
+                return False
+
+            order = tuple(parse_denylist(response.text))
+            addresses = frozenset(order)
+            with self._swap:
+                self.order = order
+                self.addresses = addresses
+                self.etag = response.headers.get("ETag")
+                self.version += 1
+            return True
+
+    def refresh_in_background(self):
+        """
+        Start a refresh in a background thread if one is due and none is running, without waiting for it. For request
+        handlers, which should serve the version they have (or check `loaded`) rather than wait on GitHub.
+        """
+        if not self._due() or (self._background is not None and self._background.is_alive()):
+            return
+        self._background = threading.Thread(target=self._refresh_quietly, daemon=True)
+        self._background.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except requests.RequestException as e:
+            logging.warning(f"Could not download the denylist (attempt {self.failures}): {e}")
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.addresses
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def diff(self, additions: Iterable[str], removals: Iterable[str]) -> DenylistDiff:
+        """
+        Work out what a PR adding `additions` and removing `removals` would actually change.
+        """
+        with self._swap:
+            addresses, version = self.addresses, self.version
+        additions, removals = dict.fromkeys(additions), dict.fromkeys(removals)
+        return DenylistDiff(
+            additions=[a for a in additions if a not in addresses and a not in removals],
+            already_denied=[a for a in additions if a in addresses],
+            removals=[a for a in removals if a in addresses],
+            not_denied=[a for a in removals if a not in addresses],
+            version=version
+        )
+
+    def apply(self, diff: DenylistDiff) -> list:
+        """
+        The denylist after `diff`, keeping the upstream order (removals dropped, additions appended) so the PR diff
+        stays minimal.
+        :raises StaleDiff: If the denylist was refreshed since `diff` was computed; compute it again.
+        """
+        with self._swap:
+            if diff.version != self.version:
+                raise StaleDiff(f"Diff of denylist version {diff.version} applied to version {self.version}")
+            order = self.order
+        removals = set(diff.removals)
+        return [a for a in order if a not in removals] + diff.additions
+
+
+_state: Optional[DenylistState] = None
+
+
+def get_state() -> DenylistState:
+    global _state
+    if _state is None:
+        _state = DenylistState()
+    return _state
@@ -0,0 +1,378 @@
+"""
+Columnar export of the denylist database and the cached reports, for offline analysis in pandas or DuckDB.
+
+Writes hive-partitioned Parquet datasets under the output directory:
+
+    issues/issue_month=2022-10/issue_type=addition/part-*.parquet
+    entries/...                       entries with their review status, accepted flag and issue state
+    reports/<section>/...             the report datasets (distance_vs_rssi, witness_graph, ...) of every entry
+
+Exports are incremental: each issue's fingerprint (its GitHub updated_at and state, and the review status and report
+state of its entries) is kept in _export_state.json, and later runs only rewrite the issues whose fingerprint
+changed. Rows are streamed from the database and the store in batches, so memory use doesn't grow with the export.
+
+    python export.py [--output exports] [--reports] [--full] [--workers 8]
+
+and then e.g. pd.read_parquet("exports/entries") or
+duckdb "select * from read_parquet('exports/entries/*/*/*.parquet', hive_partitioning=1)".
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Iterable, Iterator, Optional, List
+from dotenv import load_dotenv
+from reports import get_entry_report
+from store import ReportStore, ObjectNotFound
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import numpy as np
+import connection
+import datetime
+import argparse
+import logging
+import shutil
+import json
+import os
+
+
+load_dotenv()
+
+STATE_FILE = "_export_state.json"
+
+# issues per batch: rows are fetched, and reports downloaded, one batch at a time
+BATCH_SIZE = 200
+# rows per fetch from the database / per Parquet row group
+CHUNK_ROWS = 50000
+
+ISSUES_SCHEMA = pa.schema([
+    ("issue_number", pa.int64()),
+    ("title", pa.string()),
+    ("user", pa.string()),
+    ("labels", pa.list_(pa.string())),
+    ("state", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+    ("closed_at", pa.timestamp("us")),
+    ("comments", pa.int64()),
+    ("reports_generated", pa.bool_()),
+    ("body", pa.string()),
+])
+
+ENTRIES_SCHEMA = pa.schema([
+    ("address", pa.string()),
+    ("issue_number", pa.int64()),
+    ("review_status", pa.string()),
+    ("reports_generated", pa.bool_()),
+    ("accepted", pa.bool_()),
+    ("name", pa.string()),
+    ("location", pa.string()),
+    ("owner", pa.string()),
+    ("payer", pa.string()),
+    ("maker", pa.string()),
+    ("long_country", pa.string()),
+    ("long_state", pa.string()),
+    ("long_city", pa.string()),
+    ("first_block", pa.int64()),
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("issue_state", pa.string()),
+    ("issue_created_at", pa.timestamp("us")),
+])
+
+# the columns of each report section (see the report queries in queries.py); scalars are repeated on every row
+REPORT_SCHEMAS = {
+    "distance_vs_rssi": pa.schema([("distance_m", pa.float64()), ("rssi", pa.float64())]),
+    "rssi_vs_snr": pa.schema([("rssi", pa.float64()), ("snr", pa.float64())]),
+    "witnessed_makers": pa.schema([("maker", pa.string()), ("n_witnessed", pa.int64()), ("as_of_block", pa.string())]),
+    "witness_graph": pa.schema([("transmitter_address", pa.string()), ("witness_address", pa.string()),
+                                ("hop", pa.int64()), ("maker", pa.string()), ("owner", pa.string()),
+                                ("location", pa.string()), ("first_block", pa.int64())]),
+    "hotspot_details": pa.schema([("name", pa.string()), ("owner", pa.string()), ("first_block", pa.int64()),
+                                  ("last_block", pa.int64()), ("reward_scale", pa.float64()),
+                                  ("elevation", pa.int64()), ("gain", pa.int64()), ("nonce", pa.int64()),
+                                  ("maker", pa.string()), ("country", pa.string()), ("state", pa.string()),
+                                  ("city", pa.string()), ("location", pa.string()), ("as_of_block", pa.int64())]),
+}
+
+KEY_SCHEMA = pa.schema([("issue_number", pa.int64()), ("address", pa.string())])
+
+
+def issue_fingerprints(denylist_engine: Engine) -> dict:
+    """
+    :return: Dict of issue number -> [fingerprint, issue month, issue type] for every issue.
+    """
+    sql = """select
+    i.number,
+    coalesce(to_char(i.created_at, 'YYYY-MM'), 'unknown'),
+    coalesce(i.issue_type::text, 'other'),
+    md5(concat_ws('|', i.updated_at::text, i.state::text, i.reports_generated::text, (
+        select string_agg(concat_ws(':', e.address, e.review_status::text, e.reports_generated::text, a.address is not null), ',' order by e.address)
+        from entries e left join accepted_entries a on a.issue_number = e.issue_number and a.address = e.address
+        where e.issue_number = i.number
+    )))
+    from issues i;"""
+    with denylist_engine.connect() as conn:
+        return {r[0]: [r[3], r[1], r[2]] for r in conn.execute(text(sql))}
+
+
+def _stream(denylist_engine: Engine, sql: str, params: dict, names: List[str]) -> Iterator[dict]:
+    with denylist_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_ROWS).execute(text(sql), params)
+        for chunk in result.partitions(CHUNK_ROWS):
+            yield dict(zip(names, map(list, zip(*chunk))))
+
+
+def _issue_rows(denylist_engine: Engine, issue_numbers: List[int]) -> Iterator[dict]:
+    sql = """select number as issue_number, title, "user", labels, state::text, created_at, updated_at, closed_at, comments,
+    reports_generated, body from issues where number = any(:issue_numbers) order by number;"""
+    yield from _stream(denylist_engine, sql, {"issue_numbers": issue_numbers}, ISSUES_SCHEMA.names)
+
+
+def _entry_rows(denylist_engine: Engine, issue_numbers: List[int]) -> Iterator[dict]:
+    sql = """select e.address, e.issue_number, e.review_status::text, e.reports_generated,
+    exists(select 1 from accepted_entries a where a.issue_number = e.issue_number and a.address = e.address),
+    e.name, e.location, e.owner, e.payer, e.maker, e.long_country, e.long_state, e.long_city, e.first_block, e.lat,
+    e.lon, i.state::text, i.created_at
+    from entries e join issues i on i.number = e.issue_number
+    where e.issue_number = any(:issue_numbers) order by e.issue_number, e.address;"""
+    yield from _stream(denylist_engine, sql, {"issue_numbers": issue_numbers}, ENTRIES_SCHEMA.names)
+
+
+def _report_columns(section: str, data: dict) -> dict:
+    """
+    Columns of a report section in the export schema: missing columns are nulls, scalars are repeated.
+    """
+    schema = REPORT_SCHEMAS[section]
+    lengths = [len(v) for v in data.values() if isinstance(v, (list, np.ndarray))]
+    n = max(lengths) if lengths else 1
+    columns = {}
+    for field in schema:
+        value = data.get(field.name)
+        if isinstance(value, (list, np.ndarray)):
+            columns[field.name] = value
+        else:
+            columns[field.name] = [None if value is None else str(value) if field.type == pa.string() else value] * n
+    return columns
+
+
+class PartitionWriter:
+    """
+    Writes rows to hive-style partition directories (<table>/issue_month=.../issue_type=.../), one new file per
+    partition and run, keeping a Parquet writer open per partition. Files are written under a temporary name and
+    only renamed into place by `close`, so readers never see a partial file.
+    """
+    def __init__(self, root: str, schema: pa.Schema, run_id: str):
+        self.root = root
+        self.schema = schema
+        self.run_id = run_id
+        self._writers = {}
+        self.rows = 0
+
+    def write(self, columns: dict, months: list, types: list):
+        # from_pandas: NaN -> null
+        table = pa.table({field.name: pa.array(columns[field.name], type=field.type, from_pandas=True)
+                          for field in self.schema}, schema=self.schema)
+        partitions = pa.table({"m": months, "t": types})
+        keys = set(zip(months, types))
+        for month, issue_type in keys:
+            mask = pc.and_(pc.equal(partitions["m"], month), pc.equal(partitions["t"], issue_type))
+            self._writer(month, issue_type).write_table(table.filter(mask), row_group_size=CHUNK_ROWS)
+        self.rows += len(table)
+
+    def _writer(self, month: str, issue_type: str) -> pq.ParquetWriter:
+        key = (month, issue_type)
+        if key not in self._writers:
+            directory = partition_dir(self.root, month, issue_type)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f".tmp-part-{self.run_id}.parquet")
+            self._writers[key] = (pq.ParquetWriter(path, self.schema, compression="zstd"), path)
+        return self._writers[key][0]
+
+    def close(self):
+        for writer, path in self._writers.values():
+            writer.close()
+            os.replace(path, os.path.join(os.path.dirname(path), os.path.basename(path)[len(".tmp-"):]))
+        self._writers = {}
+
+
+def partition_dir(root: str, month: str, issue_type: str) -> str:
+    return os.path.join(root, f"issue_month={month}", f"issue_type={issue_type}")
+
+
+def drop_issues(root: str, partitions: Iterable[tuple], issue_numbers: Iterable[int]) -> int:
+    """
+    Remove the rows of `issue_numbers` from the files of the given (month, type) partitions, streaming each file
+    batch by batch.
+    :return: The number of rows removed.
+    """
+    value_set = pa.array(sorted(set(issue_numbers)), type=pa.int64())
+    removed = 0
+    for month, issue_type in set(partitions):
+        directory = partition_dir(root, month, issue_type)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.startswith(".tmp-"):
+                # left over from an interrupted export
+                os.remove(path)
+                continue
+            parquet_file = pq.ParquetFile(path)
+            numbers = parquet_file.read(columns=["issue_number"]).column("issue_number")
+            n_drop = pc.sum(pc.is_in(numbers, value_set=value_set)).as_py() or 0
+            if not n_drop:
+                continue
+            removed += n_drop
+            if n_drop == parquet_file.metadata.num_rows:
+                os.remove(path)
+                continue
+            tmp = os.path.join(directory, f".tmp-{name}")
+            with pq.ParquetWriter(tmp, parquet_file.schema_arrow, compression="zstd") as writer:
+                for batch in parquet_file.iter_batches(batch_size=CHUNK_ROWS):
+                    keep = pc.invert(pc.is_in(batch.column("issue_number"), value_set=value_set))
+                    writer.write_table(pa.Table.from_batches([batch]).filter(keep))
+            os.replace(tmp, path)
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    return removed
+
+
+def _load_state(output: str) -> dict:
+    try:
+        with open(os.path.join(output, STATE_FILE)) as f:
+            state = json.load(f)
+        state["issues"] = {int(k): v for k, v in state["issues"].items()}
+        return state
+    except FileNotFoundError:
+        return {"issues": {}, "reports": False}
+
+
+def _save_state(output: str, state: dict):
+    tmp = os.path.join(output, f".tmp-{STATE_FILE}")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(output, STATE_FILE))
+
+
+def _fetch_reports(store: ReportStore, keys: List[tuple], workers: int) -> Iterator[tuple]:
+    def fetch(key):
+        try:
+            return key, get_entry_report(store, *key)
+        except ObjectNotFound:
+            return key, {}
+
+    # a bounded window of in-flight fetches (pool.map would submit them all and hold every decoded report until it's
+    # consumed), yielded in order
+    keys = iter(keys)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(fetch, key) for key in islice(keys, 2 * workers))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for key in islice(keys, 1):
+                    pending.append(pool.submit(fetch, key))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def export(denylist_engine: Engine, output: str, store: Optional[ReportStore] = None, full: bool = False,
+           batch_size: int = BATCH_SIZE, workers: int = 8) -> dict:
+    """
+    Export the issues and entries (and, if a store is given, the entries' reports) that changed since the last export.
+    :param full: Re-export everything, ignoring the previous export's state.
+    :return: Counts of the issues and rows exported.
+    """
+    os.makedirs(output, exist_ok=True)
+    state = _load_state(output)
+    with_reports = store is not None
+    tables = ["issues", "entries"] + ([f"reports/{s}" for s in REPORT_SCHEMAS] if with_reports else [])
+    if full or state.get("reports", False) != with_reports:
+        for table in ("issues", "entries", "reports"):
+            shutil.rmtree(os.path.join(output, table), ignore_errors=True)
+        state = {"issues": {}, "reports": with_reports}
+    previous = state["issues"]
+    current = issue_fingerprints(denylist_engine)
+    changed = sorted(n for n, fp in current.items() if previous.get(n, [None])[0] != fp[0])
+    deleted = [n for n in previous if n not in current]
+    logging.info(f"{len(changed)} new or changed issues, {len(deleted)} deleted")
+
+    # drop the old rows of changed and deleted issues, from the partitions they were in before and the ones they are
+    # in now (which have rows of theirs if an earlier export was interrupted)
+    partitions = {tuple(previous[n][1:]) for n in changed + deleted if n in previous}
+    partitions.update(tuple(current[n][1:]) for n in changed)
+    if partitions:
+        for table in tables:
+            removed = drop_issues(os.path.join(output, table), partitions, changed + deleted)
+            logging.info(f"Removed {removed} stale rows from {table}")
+    for n in deleted:
+        del previous[n]
+    _save_state(output, state)
+
+    counts = {"issues": len(changed), "rows": {t: 0 for t in tables}}
+    run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    for i in range(0, len(changed), batch_size):
+        batch = changed[i:i + batch_size]
+        batch_id = f"{run_id}-{i // batch_size:05d}"
+        writers = {"issues": PartitionWriter(os.path.join(output, "issues"), ISSUES_SCHEMA, batch_id),
+                   "entries": PartitionWriter(os.path.join(output, "entries"), ENTRIES_SCHEMA, batch_id)}
+
+        for columns in _issue_rows(denylist_engine, batch):
+            numbers = columns["issue_number"]
+            writers["issues"].write(columns, [current[n][1] for n in numbers], [current[n][2] for n in numbers])
+
+        report_keys = []
+        for columns in _entry_rows(denylist_engine, batch):
+            numbers = columns["issue_number"]
+            writers["entries"].write(columns, [current[n][1] for n in numbers], [current[n][2] for n in numbers])
+            report_keys.extend((n, a) for n, a, generated in
+                               zip(numbers, columns["address"], columns["reports_generated"]) if generated)
+
+        if with_reports:
+            for section, schema in REPORT_SCHEMAS.items():
+                writers[f"reports/{section}"] = PartitionWriter(os.path.join(output, "reports", section),
+                                                                pa.unify_schemas([KEY_SCHEMA, schema]), batch_id)
+            for (issue_number, address), report in _fetch_reports(store, report_keys, workers):
+                month, issue_type = current[issue_number][1:]
+                for section in REPORT_SCHEMAS:
+                    if section not in report:
+                        continue
+                    columns = _report_columns(section, report[section])
+                    n = len(next(iter(columns.values())))
+                    if not n:
+                        continue
+                    columns.update(issue_number=[issue_number] * n, address=[address] * n)
+                    writers[f"reports/{section}"].write(columns, [month] * n, [issue_type] * n)
+
+        for table, writer in writers.items():
+            writer.close()
+            counts["rows"][table] += writer.rows
+        # checkpoint, so an interrupted export resumes after the last complete batch
+        previous.update({n: current[n] for n in batch})
+        _save_state(output, state)
+        logging.info(f"Exported {min(i + batch_size, len(changed))}/{len(changed)} issues")
+
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export entries, issues and reports to partitioned Parquet.")
+    parser.add_argument("--output", default=os.getenv("EXPORT_DIR", "exports"))
+    parser.add_argument("--reports", action="store_true", help="also export the report datasets from the report store")
+    parser.add_argument("--full", action="store_true", help="re-export everything instead of only what changed")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="issues per batch")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent report downloads")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = None
+    if args.reports:
+        from store import get_store
+        store = get_store()
+    summary = export(connection.connect_denylist(), args.output, store, full=args.full, batch_size=args.batch_size,
+                     workers=args.workers)
+    print(json.dumps(summary, indent=2))
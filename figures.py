@@ -0,0 +1,96 @@
+"""
+Figure payloads for the entry reports.
+
+The report job precomputes the trendline fits and caps the number of scatter points (see build_figure_payloads), so
+the dashboard only has to assemble lightweight Plotly figures, no matter how many receipts a hotspot has.
+"""
+import numpy as np
+import plotly.graph_objects as go
+from typing import Optional
+
+
+# max points per scatter plot, beyond this we plot a uniform random sample (the fit still uses every point)
+MAX_POINTS = 2000
+
+
+def ols_fit(x, y) -> dict:
+    """
+    Ordinary least squares fit of y = slope * x + intercept, ignoring NaNs.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    mask = np.isfinite(x) & np.isfinite(y)
+    x, y = x[mask], y[mask]
+    if len(x) < 2 or np.ptp(x) == 0:
+        return {"slope": None, "intercept": None, "r_squared": None}
+    slope, intercept = np.polyfit(x, y, 1)
+    residuals = y - (slope * x + intercept)
+    ss_tot = np.sum((y - y.mean()) ** 2)
+    r_squared = 1 - np.sum(residuals ** 2) / ss_tot if ss_tot > 0 else 1.0
+    return {"slope": float(slope), "intercept": float(intercept), "r_squared": round(float(r_squared), 3)}
+
+
+def sample_points(x, y, cap: int = MAX_POINTS, seed: int = 0) -> (np.ndarray, np.ndarray, int):
+    """
+    Drop NaNs and, if there are more than `cap` points left, keep a uniform random sample of them. Seeded so a
+    re-run of the report produces the same figure.
+    :return: The sampled x and y, and the number of points before sampling.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    mask = np.isfinite(x) & np.isfinite(y)
+    x, y = x[mask], y[mask]
+    n = len(x)
+    if n > cap:
+        idx = np.sort(np.random.default_rng(seed).choice(n, size=cap, replace=False))
+        x, y = x[idx], y[idx]
+    return x, y, n
+
+
+def _scatter_payload(prefix: str, x, y, cap: int, fit: bool) -> dict:
+    xs, ys, n = sample_points(x, y, cap)
+    payload = {f"{prefix}_x": xs, f"{prefix}_y": ys, f"{prefix}_n": n}
+    if fit:
+        payload.update({f"{prefix}_{k}": v for k, v in ols_fit(x, y).items()})
+    return payload
+
+
+def build_figure_payloads(distance_vs_rssi: dict, rssi_vs_snr: dict, cap: int = MAX_POINTS) -> dict:
+    """
+    Precompute everything the dashboard needs to draw the scatter plots for an entry.
+    :param distance_vs_rssi: The distance_vs_rssi dataset.
+    :param rssi_vs_snr: The rssi_vs_snr dataset.
+    :param cap: Max points per plot.
+    :return: A report dict, stored as the "figures" section of the entry's bundle.
+    """
+    payload = {}
+    payload.update(_scatter_payload("dvr", distance_vs_rssi.get("distance_m", []), distance_vs_rssi.get("rssi", []), cap, fit=True))
+    payload.update(_scatter_payload("rvs", rssi_vs_snr.get("rssi", []), rssi_vs_snr.get("snr", []), cap, fit=False))
+    return payload
+
+
+def _scatter(x, y, title: str, x_title: str, y_title: str, fit: Optional[dict] = None) -> go.Figure:
+    fig = go.Figure(go.Scattergl(x=x, y=y, mode="markers", name=y_title))
+    if fit and fit.get("slope") is not None and len(x) > 0:
+        x_line = np.array([np.min(x), np.max(x)])
+        fig.add_trace(go.Scatter(x=x_line, y=fit["slope"] * x_line + fit["intercept"], mode="lines",
+                                 line={"color": "black"}, name=f"OLS (R²={fit['r_squared']})"))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title, showlegend=False, transition_duration=50)
+    return fig
+
+
+def entry_figures(report: dict) -> (go.Figure, go.Figure, go.Figure):
+    """
+    Build the distance vs. RSSI, witnessed makers and RSSI vs. SNR figures for an entry. Uses the precomputed "figures"
+    section when the report has one, otherwise computes it from the raw datasets.
+    """
+    figures = report.get("figures")
+    if figures is None:
+        figures = build_figure_payloads(report.get("distance_vs_rssi", {}), report.get("rssi_vs_snr", {}))
+
+    dvr_fig = _scatter(figures["dvr_x"], figures["dvr_y"], "Distance vs. RSSI", "distance_m", "rssi",
+                       fit={k: figures.get(f"dvr_{k}") for k in ("slope", "intercept", "r_squared")})
+    rvs_fig = _scatter(figures["rvs_x"], figures["rvs_y"], "RSSI vs. SNR", "rssi", "snr")
+
+    witnessed_makers = report.get("witnessed_makers", {})
+    wm_fig = go.Figure(go.Pie(labels=witnessed_makers.get("maker", []), values=witnessed_makers.get("n_witnessed", [])))
+    wm_fig.update_layout(title="Witnessed Makers", transition_duration=50)
+    return dvr_fig, wm_fig, rvs_fig
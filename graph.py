@@ -0,0 +1,125 @@
+"""
+Witness graph construction for the dashboard's Cytoscape view.
+
+build_witness_graph turns the witness_graph dataset (one row per transmitter -> witness edge) into deduplicated nodes
+and edges with a radial layout: the hotspot in the middle, first-hop witnesses on an inner ring and second-hop
+witnesses on an outer ring next to the node they witnessed. When there are more second-hop nodes than we can draw,
+the least connected ones are collapsed into one node per maker (or owner).
+"""
+import numpy as np
+import pandas as pd
+
+
+# max individual second-hop nodes, the rest are aggregated
+MAX_SECOND_HOP = 300
+
+INNER_RADIUS = 300
+OUTER_RADIUS = 650
+# second-hop nodes alternate between this many rings so they don't all overlap
+OUTER_RINGS = 3
+RING_SPACING = 60
+
+
+def _radial_layout(nodes: pd.DataFrame, parents: pd.Series) -> (np.ndarray, np.ndarray):
+    x, y = np.zeros(len(nodes)), np.zeros(len(nodes))
+
+    first = (nodes["hop"] == 1).to_numpy()
+    k1 = int(first.sum())
+    angles = pd.Series(2 * np.pi * np.arange(k1) / max(k1, 1), index=nodes.index[first])
+    x[first], y[first] = INNER_RADIUS * np.cos(angles.to_numpy()), INNER_RADIUS * np.sin(angles.to_numpy())
+
+    second = (nodes["hop"] == 2).to_numpy()
+    if second.any():
+        children = pd.DataFrame({"parent": parents.reindex(nodes.index[second]).to_numpy()}, index=nodes.index[second])
+        # nodes without a first-hop parent share a single wedge
+        children["parent"] = children["parent"].fillna("")
+        rank = children.groupby("parent").cumcount().to_numpy()
+        count = children.groupby("parent")["parent"].transform("size").to_numpy()
+        wedge = 2 * np.pi / max(k1, 1)
+        base = angles.reindex(children["parent"].to_numpy()).fillna(0).to_numpy()
+        theta = base + ((rank + 0.5) / count - 0.5) * wedge
+        radius = OUTER_RADIUS + RING_SPACING * (rank % OUTER_RINGS)
+        x[second], y[second] = radius * np.cos(theta), radius * np.sin(theta)
+    return x, y
+
+
+def build_witness_graph(witness_graph: dict, max_second_hop: int = MAX_SECOND_HOP, aggregate_by: str = "maker",
+                        layout: bool = True) -> dict:
+    """
+    Build the nodes, edges and (optionally) layout for an entry's witness graph.
+    :param witness_graph: The witness_graph dataset.
+    :param max_second_hop: Max number of individual second-hop nodes.
+    :param aggregate_by: Column ("maker" or "owner") to aggregate the remaining second-hop nodes by.
+    :param layout: Whether to compute node positions.
+    :return: A columnar report dict (node_* and edge_* columns), stored as the "graph" section of the entry's bundle.
+    """
+    edges = pd.DataFrame({k: np.asarray(witness_graph.get(k, [])) for k in
+                          ("transmitter_address", "witness_address", "hop", aggregate_by)})
+    edges = edges.rename(columns={"transmitter_address": "source", "witness_address": "target", aggregate_by: "group"})
+    if edges.empty:
+        return {"node_id": [], "node_label": [], "node_hop": [], "node_weight": [], "edge_source": [], "edge_target": [],
+                "edge_weight": [], "node_x": [], "node_y": []}
+
+    # a node's hop is the smallest hop it appears at (the hotspot itself is a hop-1 transmitter)
+    hops = pd.concat([edges[["source", "hop"]].rename(columns={"source": "id"}),
+                      edges[["target", "hop"]].rename(columns={"target": "id"})]).groupby("id")["hop"].min()
+    nodes = pd.DataFrame({"hop": hops, "label": hops.index, "weight": 1})
+    target = edges.loc[edges["hop"] == 1, "source"]
+    if len(target):
+        nodes.loc[target.iloc[0], "hop"] = 0
+
+    second = nodes.index[nodes["hop"] == 2]
+    if len(second) > max_second_hop:
+        # keep the best connected second-hop nodes, collapse the rest into one node per group
+        degree = pd.concat([edges["source"], edges["target"]]).value_counts().reindex(second)
+        keep = degree.sort_values(ascending=False, kind="stable").index[:max_second_hop]
+        collapse = second.difference(keep)
+        groups = edges.drop_duplicates("target").set_index("target")["group"].reindex(collapse).fillna("unknown")
+        mapping = pd.Series(f"{aggregate_by}:" + groups.astype(str).to_numpy(), index=collapse)
+
+        edges["source"] = edges["source"].map(mapping).fillna(edges["source"])
+        edges["target"] = edges["target"].map(mapping).fillna(edges["target"])
+
+        sizes = mapping.value_counts()
+        aggregated = pd.DataFrame({"hop": 2, "label": [f"{k.split(':', 1)[1]} ({n})" for k, n in sizes.items()],
+                                   "weight": sizes.to_numpy()}, index=sizes.index)
+        nodes = pd.concat([nodes.drop(collapse), aggregated])
+
+    edges = edges.groupby(["source", "target"], sort=False).size().rename("weight").reset_index()
+
+    result = {
+        "node_id": nodes.index.to_numpy(dtype=object),
+        "node_label": nodes["label"].to_numpy(dtype=object),
+        "node_hop": nodes["hop"].to_numpy(dtype=np.int64),
+        "node_weight": nodes["weight"].to_numpy(dtype=np.int64),
+        "edge_source": edges["source"].to_numpy(dtype=object),
+        "edge_target": edges["target"].to_numpy(dtype=object),
+        "edge_weight": edges["weight"].to_numpy(dtype=np.int64)
+    }
+    if layout:
+        # place each second-hop node next to the first first-hop node it witnessed
+        from_first = edges[edges["source"].isin(nodes.index[nodes["hop"] == 1])]
+        parents = from_first.drop_duplicates("target").set_index("target")["source"]
+        result["node_x"], result["node_y"] = _radial_layout(nodes, parents)
+    return result
+
+
+def cytoscape_elements(graph: dict) -> list:
+    """
+    Convert the output of build_witness_graph to Cytoscape elements. Nodes get a "position" if a layout was computed.
+    """
+    has_layout = "node_x" in graph and len(graph["node_x"]) == len(graph["node_id"])
+    nodes = [
+        {
+            "data": {"id": node_id, "label": label, "weight": int(weight)},
+            "classes": "red" if hop <= 1 else "green"
+        } for node_id, label, hop, weight in zip(graph["node_id"], graph["node_label"], graph["node_hop"], graph["node_weight"])
+    ]
+    if has_layout:
+        for node, x, y in zip(nodes, graph["node_x"], graph["node_y"]):
+            node["position"] = {"x": float(x), "y": float(y)}
+    edges = [
+        {"data": {"source": s, "target": t, "weight": int(w)}}
+        for s, t, w in zip(graph["edge_source"], graph["edge_target"], graph["edge_weight"])
+    ]
+    return nodes + edges
@@ -0,0 +1,9 @@
+"""
+gunicorn settings, picked up from the working directory (see Procfile).
+"""
+import callback_metrics
+
+
+def child_exit(server, worker):
+    # an exited worker's callback histograms would otherwise keep being merged into /metrics
+    callback_metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from store import ReportStore, ObjectNotFound, StoredObject
+from cache import SharedCache, NullCache
+from typing import Callable, Optional, List
+import reports
+import callback_metrics
+import threading
+import logging
+import time
+
+
+class ReportLoader:
+    """
+    Read-through cache of decoded reports for the dashboard.
+
+    Decoded objects are kept in a bounded in-process LRU keyed by object key (and tagged with the ETag they were decoded
+    from). Within `validate_after` seconds of being loaded/validated a cached object is returned as-is, after that its
+    ETag is checked against the store before reuse. The sections of entries that predate bundles are fetched
+    concurrently.
+
+    Raw objects are also put in `shared` (see cache.py) for `validate_after` seconds, so other worker processes don't
+    fetch them from the store again.
+
+    Entries can also be prefetched in the background on a separate, smaller pool. Prefetches are tracked per client
+    (e.g. a browser tab), and starting a new one cancels whatever is left of that client's previous one only.
+    """
+    def __init__(self, store: ReportStore, max_items: int = 512, max_workers: int = 8, validate_after: float = 60,
+                 prefetch_workers: int = 4, shared: Optional[SharedCache] = None):
+        self.store = store
+        self.shared = shared or NullCache()
+        self.max_items = max_items
+        self.validate_after = validate_after
+        self.hits, self.misses = 0, 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-loader")
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="report-prefetch")
+        # client -> (generation, futures) of its latest prefetch
+        self._prefetches = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        # key -> (etag, decoded, last validated (monotonic)), least recently used first
+        self._cache = OrderedDict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "items": len(self._cache), "max_items": self.max_items}
+
+    def _cached(self, key: str):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            self._cache.move_to_end(key)
+        etag, decoded, validated = item
+        if time.monotonic() - validated < self.validate_after:
+            return decoded
+        if self.store.head(key) != etag:
+            return None
+        with self._lock:
+            if key in self._cache:
+                self._cache[key] = (etag, decoded, time.monotonic())
+        return decoded
+
+    def _remember(self, key: str, etag: str, decoded):
+        with self._lock:
+            self._cache[key] = (etag, decoded, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def load(self, key: str, decoder=reports.decode_report):
+        """
+        Get the decoded object at `key`, from the cache if possible.
+        :raises ObjectNotFound: If there is no object at `key`.
+        """
+        decoded = self._cached(key)
+        if decoded is not None:
+            with self._lock:
+                self.hits += 1
+            return decoded
+
+        with self._lock:
+            self.misses += 1
+        with callback_metrics.step("fetch"):
+            obj = self._fetch(key)
+        with callback_metrics.step("decode"):
+            decoded = decoder(obj.body)
+        self._remember(key, obj.etag, decoded)
+        return decoded
+
+    def _fetch(self, key: str) -> StoredObject:
+        shared_key = f"object:{key}"
+        try:
+            cached = self.shared.get_object(shared_key)
+        except Exception as e:
+            logging.warning(f"Shared cache read of {key} failed: {e}")
+            cached = None
+        if cached is not None:
+            return StoredObject(*cached)
+
+        obj = self.store.get(key)
+        try:
+            self.shared.set_object(shared_key, tuple(obj), self.validate_after)
+        except Exception as e:
+            logging.warning(f"Shared cache write of {key} failed: {e}")
+        return obj
+
+    def _load_legacy_section(self, issue_number: int, address: str, section: str) -> Optional[dict]:
+        key = f"issues/{issue_number}/entries/{address}/{section}"
+        for k in (key + reports.KEY_SUFFIX, key):
+            try:
+                return self.load(k)
+            except ObjectNotFound:
+                continue
+        return None
+
+    def get_entry(self, issue_number: int, address: str) -> dict:
+        """
+        Get all of the datasets for an entry (see reports.get_entry_report).
+        """
+        try:
+            return self.load(reports.entry_key(issue_number, address), decoder=reports.decode_bundle)
+        except ObjectNotFound:
+            pass
+
+        futures = {s: self._executor.submit(self._load_legacy_section, issue_number, address, s)
+                   for s in reports.ENTRY_SECTIONS}
+        result = {}
+        for section, future in futures.items():
+            try:
+                data = future.result()
+            except Exception:
+                logging.exception(f"Failed to load {section} for {address} in issue {issue_number}")
+                raise
+            if data is not None:
+                result[section] = data
+        return result
+
+    def prefetch(self, issue_number: int, addresses: List[str], client: str = "",
+                 then: Optional[Callable[[], List[str]]] = None):
+        """
+        Warm the cache for the given entries in the background, cancelling `client`'s prefetch still in progress.
+        :param client: Whose prefetch this is. Other clients' prefetches are left alone.
+        :param then: Looks up more addresses of the issue to prefetch after `addresses` (e.g. the next page's), on the
+        prefetch pool rather than the caller's thread.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._cancel(client)
+            # forget clients whose prefetches have finished
+            for c in [c for c, (_, futures) in self._prefetches.items() if all(f.done() for f in futures)]:
+                del self._prefetches[c]
+            # registered before submitting, or a fetch starting right away would take itself for a cancelled one
+            futures = []
+            self._prefetches[client] = (generation, futures)
+            futures.extend(self._prefetch_executor.submit(self._prefetch_one, client, generation, issue_number, a)
+                           for a in addresses)
+            if then is not None:
+                futures.append(self._prefetch_executor.submit(self._prefetch_then, client, generation, issue_number,
+                                                              then))
+
+    def cancel_prefetch(self, client: Optional[str] = None):
+        """
+        Cancel `client`'s prefetch, or everyone's.
+        """
+        with self._lock:
+            for c in list(self._prefetches) if client is None else [client]:
+                self._cancel(c)
+
+    def _cancel(self, client: str):
+        _, futures = self._prefetches.pop(client, (None, []))
+        for future in futures:
+            future.cancel()
+
+    def _prefetch_then(self, client: str, generation: int, issue_number: int, then: Callable[[], List[str]]):
+        if self._prefetches.get(client, (None,))[0] != generation:
+            return
+        try:
+            addresses = then()
+        except Exception as e:
+            logging.debug(f"Prefetch lookup in issue {issue_number} failed: {e}")
+            return
+        with self._lock:
+            # unless the client has moved on in the meantime
+            current = self._prefetches.get(client)
+            if current is None or current[0] != generation:
+                return
+            current[1].extend(self._prefetch_executor.submit(self._prefetch_one, client, generation, issue_number, a)
+                              for a in addresses)
+
+    def _prefetch_one(self, client: str, generation: int, issue_number: int, address: str):
+        # already-running prefetches can't be cancelled, but queued ones the client has moved on from bail out here
+        if self._prefetches.get(client, (None,))[0] != generation:
+            return
+        try:
+            self.get_entry(issue_number, address)
+        except Exception as e:
+            logging.debug(f"Prefetch of {address} in issue {issue_number} failed: {e}")
@@ -0,0 +1,96 @@
+"""
+POST /api/lookup: has a batch of hotspots been reported, reviewed, PR'd or denied already?
+
+The body is a JSON list of addresses/names (or {"addresses": [...]}), or plain text with one per line. Each query gets
+one record per matching address (or one with "found": false) with its issues, linked pulls, whether it is on the
+current denylist ("denied", null until the denylist has been downloaded) and an overall status. Up to LOOKUP_BATCH
+queries are answered as one JSON document; bigger batches, or requests that accept application/x-ndjson, are streamed
+as one JSON record per line, a batch at a time.
+"""
+from flask import Flask, request, jsonify, Response, stream_with_context
+from typing import Callable, Iterator, List
+import queries
+import denylist
+import json
+import os
+
+
+MAX_LOOKUP = int(os.getenv("MAX_LOOKUP", 100000))
+LOOKUP_BATCH = int(os.getenv("LOOKUP_BATCH", 5000))
+
+NDJSON = "application/x-ndjson"
+
+
+def _normalize(key: str) -> str:
+    key = key.strip().strip(",").strip()
+    # names are stored like angry-purple-tiger, addresses are base58 and never contain spaces or dashes
+    if " " in key or "-" in key:
+        return key.lower().replace(" ", "-")
+    return key
+
+
+def _status(denied: bool, issues: list, pulls: list) -> str:
+    if denied:
+        return "denied"
+    if any(p["state"] == "open" for p in pulls):
+        return "open_pull"
+    if pulls:
+        return "closed_pull"
+    if any(i["review_status"] not in (None, "not_reviewed") for i in issues):
+        return "reviewed"
+    if issues:
+        return "reported"
+    return "unknown"
+
+
+def lookup(engine, keys: List[str]) -> Iterator[dict]:
+    """
+    Look up hotspots, LOOKUP_BATCH queries per database round trip.
+    """
+    state = denylist.get_state()
+    state.refresh_in_background()
+    for start in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[start:start + LOOKUP_BATCH]
+        rows = queries.lookup_entries(engine, batch)
+
+        matched = set()
+        for row in rows:
+            ord_ = row.pop("ord")
+            matched.add(ord_)
+            denied = row["address"] in state if state.loaded else None
+            yield {**row, "found": True, "denied": denied, "status": _status(denied, row["issues"], row["pulls"])}
+        for i, key in enumerate(batch):
+            if i not in matched:
+                denied = key in state if state.loaded else None
+                yield {"query": key, "address": key if denied else None, "name": None, "issues": [], "pulls": [],
+                       "found": False, "denied": denied, "status": _status(denied, [], [])}
+
+
+def _read_keys() -> List[str]:
+    if request.is_json:
+        body = request.get_json()
+        keys = body.get("addresses", []) if isinstance(body, dict) else body
+    else:
+        keys = request.get_data(as_text=True).splitlines()
+    keys = [_normalize(k) for k in keys if isinstance(k, str)]
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+def register(server: Flask, get_engine: Callable):
+    """
+    Add the lookup endpoint to the dashboard's Flask server.
+    """
+    @server.route("/api/lookup", methods=["POST"])
+    def lookup_hotspots():
+        keys = _read_keys()
+        if len(keys) > MAX_LOOKUP:
+            return jsonify({"error": f"At most {MAX_LOOKUP} addresses per request, got {len(keys)}"}), 413
+
+        engine = get_engine()
+        if len(keys) <= LOOKUP_BATCH and NDJSON not in request.headers.get("Accept", ""):
+            return jsonify({"results": list(lookup(engine, keys))})
+
+        def generate():
+            for record in lookup(engine, keys):
+                yield json.dumps(record) + "\n"
+        return Response(stream_with_context(generate()), mimetype=NDJSON)
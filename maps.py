@@ -0,0 +1,82 @@
+"""
+Map figures for the entries: individual points, or entries aggregated into parent H3 cells at a resolution that
+suits the current zoom level.
+"""
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import h3
+
+
+# how many owners/makers to list per cell in the hover text
+TOP_N = 3
+
+
+def resolution_for_zoom(zoom: float) -> int:
+    """
+    H3 resolution for a mapbox zoom level, so cells stay roughly the same size on screen (~res 2 for a continent,
+    ~res 9 for a neighbourhood).
+    """
+    return int(np.clip(int(zoom * 0.7), 0, 9))
+
+
+@lru_cache(maxsize=1 << 18)
+def _parent(location: str, resolution: int) -> str:
+    if h3.h3_get_resolution(location) <= resolution:
+        return location
+    return h3.h3_to_parent(location, resolution)
+
+
+def _top(counts: pd.DataFrame, column: str) -> pd.Series:
+    grouped = counts.groupby(["cell", column], sort=False)["n"].sum().reset_index()
+    grouped = grouped.sort_values(["cell", "n"], ascending=[True, False])
+    top = grouped.groupby("cell").head(TOP_N)
+    return top.groupby("cell").apply(lambda g: ", ".join(f"{k} ({n})" for k, n in zip(g[column], g["n"])))
+
+
+def aggregate_cells(locations: dict, resolution: int) -> pd.DataFrame:
+    """
+    Aggregate entry counts into parent H3 cells.
+    :param locations: Columns location, owner, maker, n (see queries.get_entry_locations).
+    :param resolution: H3 resolution of the cells.
+    :return: One row per cell, with its centroid, the number of entries and owners, and the top owners/makers.
+    """
+    counts = pd.DataFrame({k: locations[k] for k in ("location", "owner", "maker", "n")})
+    if counts.empty:
+        return pd.DataFrame(columns=["cell", "lat", "lon", "n", "n_owners", "owners", "makers"])
+
+    # many entries share a location, so only resolve each distinct one
+    unique = pd.unique(counts["location"])
+    counts["cell"] = counts["location"].map(dict(zip(unique, (_parent(l, resolution) for l in unique))))
+    counts["owner"] = counts["owner"].fillna("unknown")
+    counts["maker"] = counts["maker"].fillna("unknown")
+
+    cells = counts.groupby("cell").agg(n=("n", "sum"), n_owners=("owner", "nunique"))
+    cells["owners"] = _top(counts, "owner")
+    cells["makers"] = _top(counts, "maker")
+    coords = np.array([h3.h3_to_geo(c) for c in cells.index]).reshape(-1, 2)
+    cells["lat"], cells["lon"] = coords[:, 0], coords[:, 1]
+    return cells.reset_index()
+
+
+def points_figure(entries: list):
+    df = pd.DataFrame(entries, columns=["name", "owner", "location", "lat", "lon"])
+    # entries ingested before lat/lon were stored
+    missing = df["lat"].isna() & df["location"].notna()
+    if missing.any():
+        coords = [h3.h3_to_geo(l) for l in df.loc[missing, "location"]]
+        df.loc[missing, "lat"] = [c[0] for c in coords]
+        df.loc[missing, "lon"] = [c[1] for c in coords]
+
+    fig = px.scatter_mapbox(df, lat="lat", lon="lon", color="owner", hover_name="name")
+    fig.update_layout(transition_duration=500, showlegend=False, uirevision="entry-locations")
+    return fig
+
+
+def cells_figure(cells: pd.DataFrame):
+    fig = px.scatter_mapbox(cells, lat="lat", lon="lon", size="n", color="n_owners", hover_name="cell",
+                            hover_data={"n": True, "n_owners": True, "owners": True, "makers": True, "lat": False, "lon": False},
+                            size_max=40)
+    fig.update_layout(showlegend=False, uirevision="entry-locations")
+    return fig
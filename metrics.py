@@ -0,0 +1,251 @@
+"""
+Timing and throughput metrics for the run.py pipeline.
+
+Stages (GitHub paging, parsing, upserts, report generation, ...) record wall time, rows, bytes and errors. Query
+functions wrapped with `timed` record calls, wall time, rows and errors, and `instrument` hooks an engine's cursor
+events so the time actually spent in the database is attributed to the query function (and stage) that issued it.
+At the end of a run, `write` saves a JSON summary and a Prometheus text-format file (for node_exporter's textfile
+collector) so runs can be compared.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Optional, Tuple
+from store import ReportStore, StoredObject
+import threading
+import datetime
+import logging
+import json
+import time
+import os
+
+
+_stage: ContextVar[Optional[str]] = ContextVar("metrics_stage", default=None)
+_query: ContextVar[Optional[str]] = ContextVar("metrics_query", default=None)
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    db_seconds: float = 0.0
+    runs: int = 0
+    rows: int = 0
+    bytes: int = 0
+    errors: int = 0
+
+
+@dataclass
+class QueryStats:
+    calls: int = 0
+    seconds: float = 0.0
+    db_seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    errors: int = 0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class _StageHandle:
+    name: str
+    rows: int = 0
+    bytes: int = 0
+
+
+def _count_rows(result) -> int:
+    if isinstance(result, dict):
+        lengths = [len(v) for v in result.values() if hasattr(v, "__len__") and not isinstance(v, str)]
+        return max(lengths) if lengths else 1
+    if isinstance(result, tuple):
+        return _count_rows(result[0]) if result else 0
+    if hasattr(result, "__len__") and not isinstance(result, str):
+        return len(result)
+    return 0 if result is None else 1
+
+
+class Metrics:
+    def __init__(self):
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def _stage_stats(self, name: str) -> StageStats:
+        return self.stages.setdefault(name, StageStats())
+
+    def _query_stats(self, name: str) -> QueryStats:
+        return self.queries.setdefault(name, QueryStats())
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a stage. Set `rows`/`bytes` on the yielded handle to record throughput. Exceptions are counted and
+        re-raised.
+        """
+        handle = _StageHandle(name)
+        token = _stage.set(name)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield handle
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _stage.reset(token)
+            with self._lock:
+                stats = self._stage_stats(name)
+                stats.seconds += elapsed
+                stats.runs += 1
+                stats.rows += handle.rows
+                stats.bytes += handle.bytes
+                stats.errors += failed
+            logging.info(f"Stage {name} took {elapsed:.2f}s ({handle.rows} rows, {handle.bytes} bytes)")
+
+    def count_error(self, stage: Optional[str] = None):
+        with self._lock:
+            self._stage_stats(stage or _stage.get() or "other").errors += 1
+
+    def add_bytes(self, n: int):
+        stage = _stage.get()
+        if stage:
+            with self._lock:
+                self._stage_stats(stage).bytes += n
+
+    def timed(self, fn, name: Optional[str] = None):
+        """
+        Wrap a query function so its calls, wall time and rows are recorded, and the statements it runs are attributed
+        to it.
+        """
+        name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _query.set(name)
+            start = time.perf_counter()
+            failed, result = False, None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _query.reset(token)
+                with self._lock:
+                    stats = self._query_stats(name)
+                    stats.calls += 1
+                    stats.seconds += elapsed
+                    stats.max_seconds = max(stats.max_seconds, elapsed)
+                    stats.errors += failed
+                    if not failed:
+                        stats.rows += _count_rows(result)
+        return wrapper
+
+    def instrument(self, engine: Engine):
+        """
+        Record the database time of every statement run on `engine`.
+        """
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get("metrics_start")
+            if not starts:
+                return
+            self._record_statement(time.perf_counter() - starts.pop())
+
+        @event.listens_for(engine, "handle_error")
+        def _error(context):
+            starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+            if starts:
+                starts.pop()
+            with self._lock:
+                self._query_stats(_query.get() or "other").errors += 1
+
+    def _record_statement(self, elapsed: float):
+        with self._lock:
+            stats = self._query_stats(_query.get() or "other")
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            stage = _stage.get()
+            if stage:
+                self._stage_stats(stage).db_seconds += elapsed
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "seconds": round(time.perf_counter() - self._start, 3),
+                "stages": {k: asdict(v) for k, v in self.stages.items()},
+                "queries": {k: asdict(v) for k, v in self.queries.items()}
+            }
+
+    def prometheus(self, prefix: str = "denylist_run") -> str:
+        summary = self.summary()
+        lines = [
+            f"# TYPE {prefix}_seconds gauge",
+            f"{prefix}_seconds {summary['seconds']}",
+            f"# TYPE {prefix}_last_timestamp_seconds gauge",
+            f"{prefix}_last_timestamp_seconds {self.started_at.timestamp()}",
+        ]
+        for group, label in (("stages", "stage"), ("queries", "query")):
+            metrics = {}
+            for name, stats in summary[group].items():
+                for k, v in stats.items():
+                    metrics.setdefault(k, []).append(f'{prefix}_{label}_{k}{{{label}="{name}"}} {v}')
+            for k, samples in metrics.items():
+                lines.append(f"# TYPE {prefix}_{label}_{k} gauge")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str):
+        """
+        Write run-<start time>.json, latest.json and metrics.prom to `directory`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        summary = json.dumps(self.summary(), indent=2)
+        stamp = self.started_at.strftime("%Y%m%dT%H%M%SZ")
+        for name in (f"run-{stamp}.json", "latest.json"):
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(summary)
+        # write then rename, so the textfile collector never reads a partial file
+        tmp = os.path.join(directory, "metrics.prom.tmp")
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, os.path.join(directory, "metrics.prom"))
+
+
+class CountingStore(ReportStore):
+    """
+    Wraps a store to add the bytes read and written to the current stage.
+    """
+    def __init__(self, store: ReportStore, metrics: Metrics):
+        self.store = store
+        self.metrics = metrics
+
+    def put(self, key: str, body: bytes, content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> str:
+        self.metrics.add_bytes(len(body))
+        return self.store.put(key, body, content_type=content_type, content_encoding=content_encoding)
+
+    def get(self, key: str, byte_range: Optional[Tuple[int, int]] = None) -> StoredObject:
+        obj = self.store.get(key, byte_range=byte_range)
+        self.metrics.add_bytes(len(obj.body))
+        return obj
+
+    def head(self, key: str) -> Optional[str]:
+        return self.store.head(key)
+
+    def delete(self, key: str):
+        return self.store.delete(key)
+
+    def keys(self, prefix: str = ""):
+        return self.store.keys(prefix)
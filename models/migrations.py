@@ -4,7 +4,9 @@ from models.views import *
 from sqlalchemy.engine import create_engine
 from dotenv import load_dotenv
 from typing import Optional
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, text
+from sqlalchemy.schema import CreateIndex
+from api import location_to_coordinates
 
 
 def migrate():
@@ -15,5 +17,40 @@ def migrate():
     # create tables
     Base.metadata.create_all(engine)
 
+    # replaced by expression indexes that the issues table's sort and keyset predicates can use
+    engine.execute("drop index if exists issues_created_at_idx;")
+    engine.execute("drop index if exists issues_user_idx;")
+    # replaced by entries_issue_number_address_idx
+    engine.execute("drop index if exists entries_issue_number_idx;")
+
+    # create_all skips tables that already exist, so make sure indexes added since then are there too (if not exists
+    # rather than checkfirst, which can't see expression indexes)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            engine.execute(CreateIndex(index, if_not_exists=True))
+
+    # columns added since the first release
+    engine.execute("alter table entries add column if not exists lat double precision;")
+    engine.execute("alter table entries add column if not exists lon double precision;")
+    engine.execute("alter table entries add column if not exists claimed_by text;")
+    engine.execute("alter table entries add column if not exists claimed_until timestamp;")
+    backfill_entry_coordinates(engine)
+
     # create views
     engine.execute(users_view_sql)
+
+
+def backfill_entry_coordinates(engine):
+    """
+    Fill in lat/lon for entries ingested before they were stored.
+    """
+    locations = [r[0] for r in engine.execute("select distinct location from entries where lat is null and location is not null;")]
+    if not locations:
+        return
+    coords = [location_to_coordinates(l) for l in locations]
+    engine.execute(
+        text("""update entries e set lat = c.lat, lon = c.lon
+        from unnest(cast(:locations as text[]), cast(:lats as float8[]), cast(:lons as float8[])) as c(location, lat, lon)
+        where e.location = c.location and e.lat is null;"""),
+        {"locations": locations, "lats": [c[0] for c in coords], "lons": [c[1] for c in coords]}
+    )
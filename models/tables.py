@@ -1,5 +1,6 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Text, MetaData, Integer, Boolean, ForeignKey, Enum, TIMESTAMP, ARRAY
+from sqlalchemy import Column, Text, MetaData, Integer, Boolean, ForeignKey, Enum, TIMESTAMP, ARRAY, Index, Float, \
+    ForeignKeyConstraint, text
 from sqlalchemy.dialects.postgresql import JSON
 import enum
 import os
@@ -42,6 +43,81 @@ class Entries(Base):
     long_state = Column(Text)
     long_city = Column(Text)
     first_block = Column(Integer)
+    # centroid of `location`, computed once at ingest
+    lat = Column(Float)
+    lon = Column(Float)
+    # review queue: who is reviewing the entry, and until when their claim holds
+    claimed_by = Column(Text)
+    claimed_until = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("entries_issue_number_address_idx", "issue_number", "address"),
+        # bulk lookups by name (lookups by address use the primary key)
+        Index("entries_name_idx", "name"),
+    )
+
+
+class AcceptedEntries(Base):
+    """
+    Entries accepted for the next denylist PR.
+    """
+    __tablename__ = "accepted_entries"
+
+    address = Column(Text, primary_key=True, nullable=False)
+    issue_number = Column(Integer, primary_key=True, nullable=False)
+    issue_type = Column(Enum(issue_type))
+    accepted_by = Column(Text)
+    accepted_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        ForeignKeyConstraint(["address", "issue_number"], ["entries.address", "entries.issue_number"], ondelete="CASCADE"),
+    )
+
+
+class Clusters(Base):
+    """
+    Fleets of pending entries (see clusters.py), recomputed by the clusters stage of run.py.
+    """
+    __tablename__ = "clusters"
+
+    cluster_id = Column(Text, primary_key=True, nullable=False)
+    # owner, payer or connected
+    method = Column(Text, nullable=False)
+    label = Column(Text)
+    n_entries = Column(Integer)
+    n_hotspots = Column(Integer)
+    n_issues = Column(Integer)
+    n_owners = Column(Integer)
+    n_payers = Column(Integer)
+    n_locations = Column(Integer)
+    issues = Column(ARRAY(Integer))
+    # value -> number of hotspots, most common first
+    makers = Column(JSON)
+    countries = Column(JSON)
+    top_maker_share = Column(Float)
+    hotspots_per_location = Column(Float)
+    first_block_span = Column(Integer)
+    location_spread_km = Column(Float)
+    # witness edges between the cluster's hotspots (connected clusters only)
+    witness_edges = Column(Integer)
+    computed_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        Index("clusters_method_idx", "method", "n_hotspots"),
+    )
+
+
+class ClusterEntries(Base):
+    __tablename__ = "cluster_entries"
+
+    cluster_id = Column(Text, ForeignKey("clusters.cluster_id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    address = Column(Text, primary_key=True, nullable=False)
+    issue_number = Column(Integer, primary_key=True, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint(["address", "issue_number"], ["entries.address", "entries.issue_number"], ondelete="CASCADE"),
+        Index("cluster_entries_entry_idx", "issue_number", "address"),
+    )
 
 
 class Issues(Base):
@@ -61,6 +137,13 @@ class Issues(Base):
     reactions = Column(JSON)
     reports_generated = Column(Boolean, nullable=True)
 
+    __table_args__ = (
+        # server-side sorting/keyset paging of the issues table: the same expressions as queries.ISSUE_COLUMNS, with
+        # the number tie-breaker
+        Index("issues_created_at_sort_idx", text("coalesce(created_at, '-infinity'::timestamp)"), "number"),
+        Index("issues_user_sort_idx", text("coalesce(\"user\", '')"), "number"),
+    )
+
 
 class Pulls(Base):
     __tablename__ = "pulls"
@@ -80,3 +163,7 @@ class PullIssues(Base):
 
     pull = Column(Integer, ForeignKey("pulls.number"), primary_key=True)
     issue = Column(Integer, ForeignKey("issues.number"), primary_key=True)
+
+    __table_args__ = (
+        Index("pull_issues_issue_idx", "issue"),
+    )
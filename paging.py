@@ -0,0 +1,101 @@
+"""
+Helpers for serving DataTables with page_action/sort_action/filter_action="custom" from the database.
+"""
+from dateutil import parser as date_parser
+from typing import List, Tuple, Optional
+import json
+import re
+
+
+# Dash filter operators -> SQL comparison. `contains` and `datestartswith` are handled separately
+OPERATORS = {
+    "=": "=", "eq": "=",
+    "!=": "!=", "ne": "!=",
+    "<": "<", "lt": "<",
+    "<=": "<=", "le": "<=",
+    ">": ">", "gt": ">",
+    ">=": ">=", "ge": ">=",
+    "contains": "contains",
+    "datestartswith": "datestartswith"
+}
+
+_FILTER_RE = re.compile(r"^\{(?P<column>[^}]+)\}\s+(?P<op>\S+)\s+(?P<value>.+)$")
+
+
+def parse_filter_query(filter_query: Optional[str]) -> List[Tuple[str, str, str]]:
+    """
+    Parse a DataTable filter_query (e.g. '{user} contains "abc" && {issue_type} = addition').
+    :param filter_query: The filter_query property of the table.
+    :return: List of (column id, operator, value) triples. Unsupported expressions are skipped.
+    """
+    filters = []
+    if not filter_query:
+        return filters
+    for expression in filter_query.split(" && "):
+        m = _FILTER_RE.match(expression.strip())
+        if not m or m.group("op") not in OPERATORS:
+            continue
+        value = m.group("value").strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1]
+        filters.append((m.group("column"), OPERATORS[m.group("op")], value))
+    return filters
+
+
+def _valid_operand(value: str, sql_type: str) -> bool:
+    try:
+        if sql_type == "integer":
+            int(value)
+        elif sql_type == "timestamp":
+            date_parser.parse(value)
+    except (ValueError, OverflowError):
+        return False
+    return True
+
+
+def filter_clauses(filters: List[Tuple[str, str, str]], columns: dict, prefix: str = "f") -> (List[str], dict):
+    """
+    Turn parsed filters into SQL conditions with bind parameters.
+    :param filters: Output of parse_filter_query.
+    :param columns: Whitelist of filterable column id -> (SQL expression, SQL type to cast the value to).
+    :param prefix: Prefix for the bind parameter names.
+    :return: The conditions (to be AND-ed) and their parameters. Like unsupported expressions, comparisons whose value
+    can't be cast to the column's type (e.g. `{number} = abc`) are skipped.
+    """
+    clauses, params = [], {}
+    for i, (column, op, value) in enumerate(filters):
+        if column not in columns:
+            continue
+        if op not in ("contains", "datestartswith") and not _valid_operand(value, columns[column][1]):
+            continue
+        expr, sql_type = columns[column]
+        name = f"{prefix}{i}"
+        if op == "contains":
+            clauses.append(f"{expr}::text ilike :{name}")
+            params[name] = f"%{value}%"
+        elif op == "datestartswith":
+            clauses.append(f"{expr}::text like :{name}")
+            params[name] = f"{value}%"
+        else:
+            clauses.append(f"{expr} {op} cast(:{name} as {sql_type})")
+            params[name] = value
+    return clauses, params
+
+
+def keyset_clause(sort_expr: str, sort_type: str, tiebreak_expr: str, descending: bool, after: Optional[list],
+                  prefix: str = "k") -> (str, dict):
+    """
+    Build the WHERE condition that continues a (sort key, tie-breaker) keyset after the last row of the previous page.
+    """
+    if not after:
+        return "", {}
+    op = "<" if descending else ">"
+    return (f"({sort_expr}, {tiebreak_expr}) {op} (cast(:{prefix}0 as {sort_type}), :{prefix}1)",
+            {f"{prefix}0": after[0], f"{prefix}1": after[1]})
+
+
+def signature(*args) -> str:
+    """
+    Identify a sort/filter combination, so stored page cursors can be discarded when it changes.
+    """
+    return json.dumps(args, sort_keys=True, default=str)
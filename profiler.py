@@ -0,0 +1,214 @@
+"""
+Opt-in slow-query profiler for the ETL report queries.
+
+Wrap a query function with `SlowQueryProfiler.wrap`, and attach the profiler to the engines it uses. When a call takes
+longer than the threshold, its statements are explained (EXPLAIN (ANALYZE, BUFFERS) re-runs them, "plan" mode only
+captures the estimated plan) and the plan, the call's arguments and its timing are appended to a JSONL file.
+
+Enable with PROFILE_SLOW_QUERIES_MS, then rank the worst offenders with
+
+    python profiler.py report [--top 20] [--by function|address]
+"""
+from contextvars import ContextVar
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Optional
+from dotenv import load_dotenv
+import threading
+import datetime
+import argparse
+import logging
+import json
+import time
+import os
+
+
+load_dotenv()
+
+EXPLAIN_MODES = {
+    "analyze": "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ",
+    "plan": "EXPLAIN (FORMAT JSON) "
+}
+
+_statements: ContextVar[Optional[list]] = ContextVar("profiler_statements", default=None)
+_explaining: ContextVar[bool] = ContextVar("profiler_explaining", default=False)
+
+
+def _exclusive_times(node: dict, out: list):
+    # actual time is per loop and includes the children
+    total = node.get("Actual Total Time", 0) * node.get("Actual Loops", 1)
+    children = node.get("Plans", [])
+    child_total = sum(c.get("Actual Total Time", 0) * c.get("Actual Loops", 1) for c in children)
+    out.append((total - child_total, node.get("Node Type"), node.get("Relation Name") or node.get("Index Name")))
+    for c in children:
+        _exclusive_times(c, out)
+
+
+def summarize_plan(plan: list) -> dict:
+    """
+    Headline numbers of an EXPLAIN (FORMAT JSON) result: execution/planning time, buffers and the slowest nodes.
+    """
+    top = plan[0] if plan else {}
+    root = top.get("Plan", {})
+    nodes = []
+    _exclusive_times(root, nodes)
+    slowest = sorted(nodes, key=lambda n: n[0], reverse=True)[:3]
+    return {
+        "execution_ms": top.get("Execution Time"),
+        "planning_ms": top.get("Planning Time"),
+        "total_cost": root.get("Total Cost"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+        "temp_written_blocks": root.get("Temp Written Blocks"),
+        "slowest_nodes": [{"ms": round(ms, 3), "node": node, "relation": rel} for ms, node, rel in slowest if ms]
+    }
+
+
+class SlowQueryProfiler:
+    def __init__(self, threshold_ms: Optional[float], path: str = "profiles/slow_queries.jsonl", explain: str = "analyze"):
+        if explain not in EXPLAIN_MODES:
+            raise ValueError(f"Unknown explain mode {explain}, expected one of {list(EXPLAIN_MODES)}")
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.explain = explain
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SlowQueryProfiler":
+        threshold = os.getenv("PROFILE_SLOW_QUERIES_MS")
+        return cls(
+            threshold_ms=float(threshold) if threshold else None,
+            path=os.getenv("PROFILE_PATH", "profiles/slow_queries.jsonl"),
+            explain=os.getenv("PROFILE_EXPLAIN", "analyze")
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms is not None
+
+    def attach(self, engine: Engine):
+        """
+        Capture the statements run on `engine` by wrapped functions.
+        """
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            statements = _statements.get()
+            if statements is None or _explaining.get() or executemany or statement.lstrip().upper().startswith("SET "):
+                return
+            statements.append((conn.engine, statement, parameters))
+
+    def wrap(self, fn, name: Optional[str] = None):
+        """
+        Profile calls to a query function. Returns `fn` itself when the profiler is disabled.
+        """
+        if not self.enabled:
+            return fn
+        name = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            statements = []
+            token = _statements.set(statements)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                _statements.reset(token)
+                if elapsed_ms >= self.threshold_ms:
+                    self._record(name, args, kwargs, elapsed_ms, statements)
+        return wrapper
+
+    def _explain(self, engine: Engine, statement: str, parameters) -> (Optional[list], Optional[str]):
+        token = _explaining.set(True)
+        try:
+            with engine.connect() as conn:
+                result = conn.exec_driver_sql(EXPLAIN_MODES[self.explain] + statement, parameters or None).scalar()
+            return (json.loads(result) if isinstance(result, str) else result), None
+        except Exception as e:
+            return None, str(e).splitlines()[0]
+        finally:
+            _explaining.reset(token)
+
+    def _record(self, name: str, args: tuple, kwargs: dict, elapsed_ms: float, statements: list):
+        records = []
+        for engine, statement, parameters in statements:
+            plan, error = self._explain(engine, statement, parameters)
+            records.append({
+                "statement": statement,
+                "parameters": parameters if isinstance(parameters, (dict, list, tuple)) else None,
+                "plan": plan,
+                "summary": summarize_plan(plan) if plan else None,
+                "error": error
+            })
+        record = {
+            "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "function": name,
+            # engines/sessions aren't useful in the log, the address and block range are
+            "args": [a for a in args if isinstance(a, (str, int, float))],
+            "kwargs": {k: v for k, v in kwargs.items() if isinstance(v, (str, int, float, type(None)))},
+            "elapsed_ms": round(elapsed_ms, 3),
+            "explain": self.explain,
+            "statements": records
+        }
+        logging.warning(f"Slow query {name}{tuple(record['args'])} took {elapsed_ms:.0f}ms, plan saved to {self.path}")
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def load_records(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(path: str, top: int = 20, by: Optional[str] = None) -> str:
+    """
+    Rank the slowest recorded calls, or aggregate them per function or per address.
+    """
+    records = load_records(path)
+    if not records:
+        return "No slow queries recorded."
+    lines = []
+    if by:
+        groups = {}
+        for r in records:
+            key = r["function"] if by == "function" else (r["args"][0] if r["args"] else "?")
+            groups.setdefault(key, []).append(r["elapsed_ms"])
+        ranked = sorted(groups.items(), key=lambda g: sum(g[1]), reverse=True)[:top]
+        lines.append(f"{by:<52} {'calls':>6} {'total_s':>9} {'max_ms':>10} {'median_ms':>10}")
+        for key, times in ranked:
+            times = sorted(times)
+            lines.append(f"{str(key):<52} {len(times):>6} {sum(times) / 1000:>9.1f} {times[-1]:>10.0f} "
+                         f"{times[len(times) // 2]:>10.0f}")
+        return "\n".join(lines)
+
+    for r in sorted(records, key=lambda r: r["elapsed_ms"], reverse=True)[:top]:
+        lines.append(f"{r['elapsed_ms']:>10.0f}ms  {r['function']}{tuple(r['args'])} {r['kwargs'] or ''}  ({r['at']})")
+        for s in r["statements"]:
+            summary = s.get("summary") or {}
+            if s.get("error"):
+                lines.append(f"{'':>14}explain failed: {s['error']}")
+                continue
+            lines.append(f"{'':>14}execution {summary.get('execution_ms')}ms, cost {summary.get('total_cost')}, "
+                         f"buffers hit {summary.get('shared_hit_blocks')} read {summary.get('shared_read_blocks')} "
+                         f"temp {summary.get('temp_written_blocks')}")
+            for node in summary.get("slowest_nodes", []):
+                lines.append(f"{'':>16}{node['ms']:>10.1f}ms  {node['node']} {node['relation'] or ''}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank the slow queries recorded by the profiler.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report")
+    report_parser.add_argument("--path", default=os.getenv("PROFILE_PATH", "profiles/slow_queries.jsonl"))
+    report_parser.add_argument("--top", type=int, default=20)
+    report_parser.add_argument("--by", choices=["function", "address"], default=None)
+    parsed = parser.parse_args()
+    print(report(parsed.path, parsed.top, parsed.by))
@@ -5,17 +5,63 @@ from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import os
+import numpy as np
 import pandas as pd
 from models.tables import *
+from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import insert
 from typing import Optional, List, Literal
+import paging
 
 
 load_dotenv(".env")
 
 
-def get_gateway_inventory(etl_engine: Engine) -> pd.DataFrame:
-    sql = """select
+# rows per round trip when streaming from a server-side cursor
+ITERSIZE = int(os.getenv("ETL_ITERSIZE", 5000))
+
+
+def fetch_columns(engine: Engine, sql: str, dtypes: dict, itersize: int = ITERSIZE, params: Optional[dict] = None) -> dict:
+    """
+    Stream a query through a server-side (named) cursor straight into one NumPy array per column.
+    :param engine: The engine to query.
+    :param sql: The query. Columns must be selected in the same order as `dtypes`.
+    :param dtypes: Mapping of output column name to NumPy dtype. Use float64 for nullable numeric columns (NULL -> NaN).
+    :param itersize: Number of rows fetched per round trip.
+    :param params: Bind parameters for the query.
+    :return: Dict of column name -> array, trimmed to the number of rows returned.
+    """
+    names = list(dtypes)
+    capacity = itersize
+    arrays = {k: np.empty(capacity, dtype=dtypes[k]) for k in names}
+    n = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=itersize).execute(text(sql), params or {})
+        for chunk in result.partitions(itersize):
+            m = len(chunk)
+            if n + m > capacity:
+                capacity = max(capacity * 2, n + m)
+                for k in names:
+                    grown = np.empty(capacity, dtype=dtypes[k])
+                    grown[:n] = arrays[k][:n]
+                    arrays[k] = grown
+            # transpose the chunk once, then let NumPy copy each column in
+            for k, column in zip(names, zip(*chunk)):
+                arrays[k][n:n + m] = column
+            n += m
+
+    return {k: v[:n] for k, v in arrays.items()}
+
+
+def get_gateway_inventory(etl_engine: Engine, chunksize: int = 50000, addresses: Optional[List[str]] = None,
+                          names: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load the gateway inventory, indexed by address.
+    :param addresses: Only load these hotspots (plus the ones matching `names`) instead of the whole inventory.
+    :param names: Only load the hotspots with these names (plus the ones matching `addresses`).
+    """
+    filtered = addresses is not None or names is not None
+    sql = f"""select
     g.address,
     g.name,
     g.location,
@@ -29,9 +75,15 @@ def get_gateway_inventory(etl_engine: Engine) -> pd.DataFrame:
     
     from gateway_inventory g 
     left join makers m on m.address = g.payer
-    left join locations l on l.location = g.location;    
+    left join locations l on l.location = g.location
+    {"where g.address = any(:addresses) or g.name = any(:names)" if filtered else ""};
     """
-    return pd.read_sql(sql, con=etl_engine, index_col="address")
+    params = {"addresses": list(addresses or []), "names": list(names or [])} if filtered else {}
+    # stream in chunks so we never hold the full driver-side result set alongside the DataFrame
+    with etl_engine.connect() as conn:
+        chunks = pd.read_sql(text(sql), con=conn.execution_options(stream_results=True, max_row_buffer=chunksize),
+                             index_col="address", chunksize=chunksize, params=params)
+        return pd.concat(chunks)
 
 
 def insert_records(denylist_engine: Engine, issues: list, entries: list):
@@ -131,6 +183,196 @@ def get_entries_table(denylist_engine: Engine, issue_number: Optional[int] = Non
     return result_dict
 
 
+# columns of the entries table that can be sorted/filtered server-side: id -> (SQL expression, type)
+ENTRY_COLUMNS = {
+    "address": ("e.address", "text"),
+    "name": ("coalesce(e.name, '')", "text"),
+    "owner": ("coalesce(e.owner, '')", "text"),
+    "maker": ("coalesce(e.maker, '')", "text"),
+    "long_country": ("coalesce(e.long_country, '')", "text"),
+    "long_state": ("coalesce(e.long_state, '')", "text"),
+    "long_city": ("coalesce(e.long_city, '')", "text"),
+    "review_status": ("coalesce(e.review_status::text, '')", "text"),
+    "first_block": ("coalesce(e.first_block, 0)", "integer")
+}
+
+
+def get_entries_page(denylist_engine: Engine,
+                     issue_number: int,
+                     page_size: int = 10,
+                     page: int = 0,
+                     sort_column: str = "address",
+                     descending: bool = False,
+                     filters: Optional[List[tuple]] = None,
+                     after: Optional[list] = None) -> (List[dict], Optional[list]):
+    """
+    Get one page of the entries for an issue, sorted and filtered in the database. Same conventions as get_issues_page.
+    """
+    sort_expr, sort_type = ENTRY_COLUMNS.get(sort_column, ENTRY_COLUMNS["address"])
+    clauses, params = paging.filter_clauses(filters or [], ENTRY_COLUMNS)
+    keyset, keyset_params = paging.keyset_clause(sort_expr, sort_type, "e.address", descending, after)
+    if keyset:
+        clauses.append(keyset)
+        params.update(keyset_params)
+    direction = "desc" if descending else "asc"
+    params.update({"issue_number": issue_number, "limit": page_size, "offset": 0 if after else page * page_size})
+
+    sql = f"""with page as (
+    select
+    e.*,
+    {sort_expr}::text as sort_key,
+    row_number() over (order by {sort_expr} {direction}, e.address {direction}) as rn
+    from entries e
+    where e.reports_generated = true and e.issue_number = :issue_number {''.join(' and ' + c for c in clauses)}
+    order by {sort_expr} {direction}, e.address {direction}
+    limit :limit offset :offset
+    )
+    
+    select
+    e.address,
+    e.issue_number,
+    e.reports_generated,
+    e.review_status,
+    e.name,
+    e.location,
+    e.owner,
+    e.payer,
+    e.maker,
+    e.long_country,
+    e.long_state,
+    e.long_city,
+    e.first_block,
+    (select array_agg(e2.issue_number) from entries e2 where e2.issue_number != e.issue_number and e2.address = e.address) as other_mentioned_issues,
+    (select array_agg(p.number) from pulls p join pull_issues pi on pi.pull = p.number join entries e2 on e2.issue_number = pi.issue where e2.address = e.address and p.state = 'closed') as closed_pulls,
+    (select array_agg(p.number) from pulls p join pull_issues pi on pi.pull = p.number join entries e2 on e2.issue_number = pi.issue where e2.address = e.address and p.state = 'open') as open_pulls,
+    e.sort_key,
+    e.lat,
+    e.lon
+    
+    from page e order by e.rn;"""
+
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), params).fetchall()
+
+    result_dict = [
+        {
+            "address": r[0],
+            "issue_number": r[1],
+            "reports_generated": r[2],
+            "review_status": r[3],
+            "name": r[4],
+            "location": r[5],
+            "owner": r[6],
+            "payer": r[7],
+            "maker": r[8],
+            "long_country": r[9],
+            "long_state": r[10],
+            "long_city": r[11],
+            "first_block": r[12],
+            "other_mentioned_issues": str(r[13]),
+            "closed_pulls": str(r[14]),
+            "open_pulls": str(r[15]),
+            "lat": r[17],
+            "lon": r[18]
+        } for r in res
+    ]
+    next_cursor = [res[-1][16], res[-1][0]] if len(res) == page_size else None
+    return result_dict, next_cursor
+
+
+def count_entries(denylist_engine: Engine, issue_number: int, filters: Optional[List[tuple]] = None) -> int:
+    clauses, params = paging.filter_clauses(filters or [], ENTRY_COLUMNS)
+    params["issue_number"] = issue_number
+    sql = f"""select count(*) from entries e 
+    where e.reports_generated = true and e.issue_number = :issue_number {''.join(' and ' + c for c in clauses)};"""
+    with Session(denylist_engine) as session:
+        return session.execute(text(sql), params).scalar()
+
+
+def lookup_entries(denylist_engine: Engine, keys: List[str]) -> List[dict]:
+    """
+    Resolve hotspot addresses or names to the issues that mention them and the pulls linked to those issues, in one
+    query.
+    :param denylist_engine: The denylist engine.
+    :param keys: Addresses, or names in the entries' format (e.g. angry-purple-tiger).
+    :return: One row per (key, matching address), in the order of `keys`, with "ord" (the key's index), "query",
+    "address", "name", "issues" and "pulls". Keys without a match are omitted.
+    """
+    sql = """with input as (
+    select t.k, t.ord - 1 as ord from unnest(cast(:keys as text[])) with ordinality as t(k, ord)
+    ),
+
+    hits as (
+    select i.ord, i.k, e.address, e.name, e.issue_number, e.review_status from input i join entries e on e.address = i.k
+    union
+    select i.ord, i.k, e.address, e.name, e.issue_number, e.review_status from input i join entries e on e.name = i.k
+    ),
+
+    grouped as (
+    select
+        h.ord,
+        h.k,
+        h.address,
+        max(h.name) as name,
+        array_agg(h.issue_number) as issue_numbers,
+        json_agg(json_build_object(
+            'number', h.issue_number,
+            'issue_type', iss.issue_type,
+            'state', iss.state,
+            'review_status', h.review_status
+        ) order by h.issue_number) as issues
+    from hits h join issues iss on iss.number = h.issue_number
+    group by h.ord, h.k, h.address
+    )
+
+    select
+    g.ord,
+    g.k,
+    g.address,
+    g.name,
+    g.issues,
+    (select coalesce(json_agg(json_build_object('number', p.number, 'state', p.state) order by p.number), '[]'::json)
+     from pulls p where p.number in (select pi.pull from pull_issues pi where pi.issue = any(g.issue_numbers))) as pulls
+    from grouped g order by g.ord, g.address;"""
+
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"keys": list(keys)}).fetchall()
+
+    return [
+        {
+            "ord": r[0],
+            "query": r[1],
+            "address": r[2],
+            "name": r[3],
+            "issues": r[4],
+            "pulls": r[5]
+        } for r in res
+    ]
+
+
+def get_entry_locations(denylist_engine: Engine, issue_number: Optional[int] = None, pending_only: bool = False) -> dict:
+    """
+    Entry counts per (location, owner, maker), for the aggregated map.
+    :param denylist_engine: The denylist engine.
+    :param issue_number: Restrict to one issue.
+    :param pending_only: Restrict to unreviewed entries of open issues.
+    :return: Columns location, owner, maker, n.
+    """
+    clauses, params = [], {}
+    if issue_number is not None:
+        clauses.append("e.issue_number = :issue_number")
+        params["issue_number"] = issue_number
+    if pending_only:
+        clauses.append("coalesce(e.review_status, 'not_reviewed') = 'not_reviewed' and i.state = 'open'")
+
+    sql = f"""select e.location, e.owner, e.maker, count(*) as n
+    from entries e join issues i on i.number = e.issue_number
+    where e.location is not null {''.join(' and ' + c for c in clauses)}
+    group by e.location, e.owner, e.maker;"""
+    return fetch_columns(denylist_engine, sql, {"location": object, "owner": object, "maker": object, "n": np.int64},
+                         params=params)
+
+
 def get_issue_details(denylist_engine: Engine, issue_number: int, with_body: bool = True, serializable: bool = True):
     sql = f"""select
      i.number,
@@ -181,11 +423,327 @@ def get_issues_without_reports(denylist_engine: Engine, since: Optional[str] = N
     return [r[0] for r in res]
 
 
-def update_entry_status(denylist_engine: Engine, issue_number: int, address: str, new_status: Literal["not_reviewed", "valid", "invalid", "unknown"]):
-    sql = f"""update entries set review_status = '{new_status}' where address = '{address}' and issue_number = {issue_number};"""
+ReviewStatus = Literal["not_reviewed", "valid", "invalid", "unknown"]
+
+# how long a reviewer's claim on queued entries holds before others can pick them up
+CLAIM_SECONDS = int(os.getenv("REVIEW_CLAIM_SECONDS", 900))
+
+
+def update_entry_status(denylist_engine: Engine, issue_number: int, address: str, new_status: ReviewStatus):
+    set_review_status(denylist_engine, [(issue_number, address)], new_status)
+
+
+def _key_arrays(keys: List[tuple]) -> dict:
+    return {"issue_numbers": [int(k[0]) for k in keys], "addresses": [k[1] for k in keys]}
+
+
+def set_review_status(denylist_engine: Engine, keys: List[tuple], new_status: ReviewStatus, reviewer: Optional[str] = None) -> int:
+    """
+    Set the review status of many entries in one statement, releasing any claims on them.
+    :param denylist_engine: The denylist engine.
+    :param keys: (issue_number, address) of each entry.
+    :param new_status: The new review status.
+    :param reviewer: If set, entries claimed by another reviewer are left alone.
+    :return: Number of entries updated.
+    """
+    if new_status not in entry_status_type.__members__:
+        raise ValueError(f"Unknown review status {new_status}")
+    sql = """update entries e set review_status = cast(:status as entry_status_type), claimed_by = null, claimed_until = null
+    from unnest(cast(:issue_numbers as integer[]), cast(:addresses as text[])) as k(issue_number, address)
+    where e.issue_number = k.issue_number and e.address = k.address
+    and (cast(:reviewer as text) is null or e.claimed_by is null or e.claimed_by = :reviewer or e.claimed_until < now());"""
     with Session(denylist_engine) as session:
-        session.execute(sql)
+        res = session.execute(text(sql), {"status": new_status, "reviewer": reviewer, **_key_arrays(keys)})
+        session.commit()
+    return res.rowcount
+
+
+def claim_review_queue(denylist_engine: Engine,
+                       reviewer: str,
+                       limit: int = 50,
+                       issue_number: Optional[int] = None,
+                       after: Optional[list] = None,
+                       claim_seconds: int = CLAIM_SECONDS) -> (List[dict], Optional[list]):
+    """
+    Claim the next unreviewed entries for `reviewer`, in (issue_number, address) order. Entries claimed by someone else
+    are skipped until their claim expires, and rows locked by a concurrent claim are skipped rather than waited on, so
+    reviewers working through the same issue never get the same entries.
+    :param denylist_engine: The denylist engine.
+    :param reviewer: Who is claiming.
+    :param limit: Max number of entries.
+    :param issue_number: Restrict to one issue.
+    :param after: Keyset cursor ([issue_number, address]) returned with the previous batch.
+    :param claim_seconds: How long the claim holds.
+    :return: The claimed entries, and the cursor for the next batch (None when the queue is exhausted).
+    """
+    clauses, params = [], {"reviewer": reviewer, "limit": limit, "claim_seconds": claim_seconds}
+    if issue_number is not None:
+        clauses.append("e.issue_number = :issue_number")
+        params["issue_number"] = issue_number
+    if after:
+        clauses.append("(e.issue_number, e.address) > (:after_issue, :after_address)")
+        params.update({"after_issue": int(after[0]), "after_address": after[1]})
+
+    sql = f"""with next as (
+    select e.issue_number, e.address from entries e
+    where e.reports_generated = true and coalesce(e.review_status::text, 'not_reviewed') = 'not_reviewed'
+    and (e.claimed_by is null or e.claimed_by = :reviewer or e.claimed_until < now())
+    {''.join(' and ' + c for c in clauses)}
+    order by e.issue_number, e.address
+    limit :limit
+    for update skip locked
+    )
+    
+    update entries e set claimed_by = :reviewer, claimed_until = now() + make_interval(secs => :claim_seconds)
+    from next where e.issue_number = next.issue_number and e.address = next.address
+    returning e.issue_number, e.address, e.name, e.owner, e.maker, e.location, e.long_city, e.long_country, e.claimed_until;"""
+
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), params).fetchall()
+        session.commit()
+
+    res = sorted(res, key=lambda r: (r[0], r[1]))
+    result_dict = [
+        {
+            "issue_number": r[0],
+            "address": r[1],
+            "name": r[2],
+            "owner": r[3],
+            "maker": r[4],
+            "location": r[5],
+            "long_city": r[6],
+            "long_country": r[7],
+            "claimed_until": r[8].isoformat()
+        } for r in res
+    ]
+    next_cursor = [res[-1][0], res[-1][1]] if len(res) == limit else None
+    return result_dict, next_cursor
+
+
+def release_claims(denylist_engine: Engine, reviewer: str, keys: Optional[List[tuple]] = None) -> int:
+    """
+    Give up `reviewer`'s claims, on the given (issue_number, address) entries or on all of them.
+    """
+    sql = """update entries e set claimed_by = null, claimed_until = null where e.claimed_by = :reviewer"""
+    params = {"reviewer": reviewer}
+    if keys is not None:
+        sql += """ and (e.issue_number, e.address) in
+        (select * from unnest(cast(:issue_numbers as integer[]), cast(:addresses as text[])))"""
+        params.update(_key_arrays(keys))
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), params)
         session.commit()
+    return res.rowcount
+
+
+def accept_entries(denylist_engine: Engine, keys: List[tuple], accepted_by: Optional[str] = None) -> int:
+    """
+    Add entries to the set accepted for the next PR. Their issue type is taken from the issue.
+    :return: Number of newly accepted entries.
+    """
+    sql = """insert into accepted_entries (address, issue_number, issue_type, accepted_by, accepted_at)
+    select e.address, e.issue_number, i.issue_type, :accepted_by, now()
+    from unnest(cast(:issue_numbers as integer[]), cast(:addresses as text[])) as k(issue_number, address)
+    join entries e on e.issue_number = k.issue_number and e.address = k.address
+    join issues i on i.number = e.issue_number
+    on conflict do nothing;"""
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"accepted_by": accepted_by, **_key_arrays(keys)})
+        session.commit()
+    return res.rowcount
+
+
+def remove_accepted_entries(denylist_engine: Engine, keys: Optional[List[tuple]] = None) -> int:
+    """
+    Remove entries from the accepted set, or clear it if `keys` is None.
+    """
+    sql = "delete from accepted_entries a"
+    params = {}
+    if keys is not None:
+        sql += """ using unnest(cast(:issue_numbers as integer[]), cast(:addresses as text[])) as k(issue_number, address)
+        where a.issue_number = k.issue_number and a.address = k.address"""
+        params = _key_arrays(keys)
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), params)
+        session.commit()
+    return res.rowcount
+
+
+def get_accepted_entries(denylist_engine: Engine) -> List[dict]:
+    sql = """select a.address, a.issue_number, a.issue_type from accepted_entries a order by a.accepted_at, a.issue_number, a.address;"""
+    with Session(denylist_engine) as session:
+        res = session.execute(sql).fetchall()
+
+    return [
+        {
+            "address": r[0],
+            "issue": r[1],
+            "issue_type": r[2].capitalize() if r[2] else None
+        } for r in res
+    ]
+
+
+def get_pending_entries(denylist_engine: Engine) -> dict:
+    """
+    The unreviewed entries of open issues, across issues, for clusters.py.
+    :return: Columns address, issue_number, owner, payer, maker, long_country, location, first_block, lat, lon.
+    """
+    sql = """select e.address, e.issue_number, e.owner, e.payer, e.maker, e.long_country, e.location, e.first_block,
+    e.lat, e.lon
+    from entries e join issues i on i.number = e.issue_number
+    where coalesce(e.review_status::text, 'not_reviewed') = 'not_reviewed' and i.state = 'open';"""
+    return fetch_columns(denylist_engine, sql, {
+        "address": object,
+        "issue_number": np.int64,
+        "owner": object,
+        "payer": object,
+        "maker": object,
+        "long_country": object,
+        "location": object,
+        "first_block": np.float64,
+        "lat": np.float64,
+        "lon": np.float64
+    })
+
+
+def replace_clusters(denylist_engine: Engine, method: str, clusters: List[dict], members: dict):
+    """
+    Replace the clusters computed with `method`, in one transaction so the dashboard never sees a partial set.
+    :param clusters: Rows of the clusters table.
+    :param members: Columns cluster_id, address and issue_number of the cluster_entries rows.
+    """
+    with Session(denylist_engine) as session:
+        session.execute(text("delete from clusters where method = :method;"), {"method": method})
+        if clusters:
+            session.execute(insert(Clusters).values(clusters))
+            session.execute(text("""insert into cluster_entries (cluster_id, address, issue_number)
+            select * from unnest(cast(:cluster_ids as text[]), cast(:addresses as text[]), cast(:issue_numbers as integer[]))
+            on conflict do nothing;"""), {
+                "cluster_ids": list(members["cluster_id"]),
+                "addresses": list(members["address"]),
+                "issue_numbers": [int(n) for n in members["issue_number"]]
+            })
+        session.commit()
+
+
+# columns of the clusters table that can be sorted server-side: id -> SQL expression
+CLUSTER_COLUMNS = {
+    "label": "coalesce(c.label, '')",
+    "n_hotspots": "c.n_hotspots",
+    "n_pending": "n_pending",
+    "n_issues": "c.n_issues",
+    "n_owners": "c.n_owners",
+    "n_locations": "c.n_locations",
+    "top_maker_share": "coalesce(c.top_maker_share, 0)",
+    "hotspots_per_location": "coalesce(c.hotspots_per_location, 0)",
+    "first_block_span": "coalesce(c.first_block_span, 0)",
+    "location_spread_km": "coalesce(c.location_spread_km, 0)",
+    "witness_edges": "coalesce(c.witness_edges, 0)"
+}
+
+
+def get_clusters_page(denylist_engine: Engine,
+                      method: str,
+                      page_size: int = 10,
+                      page: int = 0,
+                      sort_column: str = "n_hotspots",
+                      descending: bool = True) -> List[dict]:
+    """
+    Get one page of the clusters computed with `method`, with the number of their entries still pending review.
+    :param sort_column: One of CLUSTER_COLUMNS.
+    """
+    sort_expr = CLUSTER_COLUMNS.get(sort_column, CLUSTER_COLUMNS["n_hotspots"])
+    direction = "desc" if descending else "asc"
+    sql = f"""select
+    c.cluster_id,
+    c.label,
+    c.n_hotspots,
+    c.n_issues,
+    c.n_owners,
+    c.n_payers,
+    c.n_locations,
+    c.issues,
+    c.makers,
+    c.countries,
+    c.top_maker_share,
+    c.hotspots_per_location,
+    c.first_block_span,
+    c.location_spread_km,
+    c.witness_edges,
+    (select count(*) from cluster_entries ce join entries e on e.issue_number = ce.issue_number and e.address = ce.address
+     where ce.cluster_id = c.cluster_id and coalesce(e.review_status::text, 'not_reviewed') = 'not_reviewed') as n_pending
+    from clusters c where c.method = :method
+    order by {sort_expr} {direction}, c.cluster_id
+    limit :limit offset :offset;"""
+
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"method": method, "limit": page_size, "offset": page * page_size}).fetchall()
+
+    return [
+        {
+            "id": r[0],
+            "cluster_id": r[0],
+            "label": r[1],
+            "n_hotspots": r[2],
+            "n_issues": r[3],
+            "n_owners": r[4],
+            "n_payers": r[5],
+            "n_locations": r[6],
+            "issues": ", ".join(str(i) for i in (r[7] or [])),
+            "makers": ", ".join(f"{k} ({v})" for k, v in (r[8] or {}).items()),
+            "countries": ", ".join(f"{k} ({v})" for k, v in (r[9] or {}).items()),
+            "top_maker_share": r[10],
+            "hotspots_per_location": r[11],
+            "first_block_span": r[12],
+            "location_spread_km": r[13],
+            "witness_edges": r[14],
+            "n_pending": r[15]
+        } for r in res
+    ]
+
+
+def count_clusters(denylist_engine: Engine, method: str) -> int:
+    with Session(denylist_engine) as session:
+        return session.execute(text("select count(*) from clusters c where c.method = :method;"), {"method": method}).scalar()
+
+
+def get_cluster_entries(denylist_engine: Engine, cluster_id: str) -> List[dict]:
+    sql = """select e.issue_number, e.address, e.name, e.owner, e.payer, e.maker, e.long_city, e.long_country,
+    e.first_block, e.review_status
+    from cluster_entries ce join entries e on e.issue_number = ce.issue_number and e.address = ce.address
+    where ce.cluster_id = :cluster_id
+    order by e.owner, e.address, e.issue_number;"""
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"cluster_id": cluster_id}).fetchall()
+
+    return [
+        {
+            "issue_number": r[0],
+            "address": r[1],
+            "name": r[2],
+            "owner": r[3],
+            "payer": r[4],
+            "maker": r[5],
+            "long_city": r[6],
+            "long_country": r[7],
+            "first_block": r[8],
+            "review_status": r[9]
+        } for r in res
+    ]
+
+
+def get_cluster_keys(denylist_engine: Engine, cluster_id: str, review_statuses: Optional[List[ReviewStatus]] = None) -> List[tuple]:
+    """
+    The (issue_number, address) of a cluster's entries, e.g. to review or accept the whole fleet at once.
+    :param review_statuses: Only the entries with one of these review statuses.
+    """
+    sql = """select e.issue_number, e.address
+    from cluster_entries ce join entries e on e.issue_number = ce.issue_number and e.address = ce.address
+    where ce.cluster_id = :cluster_id
+    and (cast(:statuses as text[]) is null or coalesce(e.review_status::text, 'not_reviewed') = any(cast(:statuses as text[])));"""
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"cluster_id": cluster_id, "statuses": review_statuses}).fetchall()
+    return [(r[0], r[1]) for r in res]
 
 
 def get_user(denylist_engine: Engine, user_id: str) -> dict:
@@ -255,6 +813,98 @@ def get_issues_summary(denylist_engine: Engine, limit: Optional[int] = 100) -> L
     return result_dict
 
 
+# columns of the issues table that can be sorted/filtered server-side: id -> (SQL expression, type)
+ISSUE_COLUMNS = {
+    "number": ("i.number", "integer"),
+    "title": ("coalesce(i.title, '')", "text"),
+    "user": ("coalesce(i.user, '')", "text"),
+    "created_at": ("coalesce(i.created_at, '-infinity'::timestamp)", "timestamp"),
+    "issue_type": ("coalesce(i.issue_type::text, '')", "text"),
+    "state": ("coalesce(i.state::text, '')", "text")
+}
+
+
+def get_issues_page(denylist_engine: Engine,
+                    page_size: int = 10,
+                    page: int = 0,
+                    sort_column: str = "number",
+                    descending: bool = True,
+                    filters: Optional[List[tuple]] = None,
+                    after: Optional[list] = None) -> (List[dict], Optional[list]):
+    """
+    Get one page of the issues summary, sorted and filtered in the database.
+    :param denylist_engine: The denylist engine.
+    :param page_size: Rows per page.
+    :param page: Page number, only used (as an offset) when there's no keyset cursor.
+    :param sort_column: One of ISSUE_COLUMNS.
+    :param descending: Sort direction.
+    :param filters: (column, operator, value) triples from paging.parse_filter_query.
+    :param after: The keyset cursor returned with the previous page.
+    :return: The rows and the cursor for the next page.
+    """
+    sort_expr, sort_type = ISSUE_COLUMNS.get(sort_column, ISSUE_COLUMNS["number"])
+    clauses, params = paging.filter_clauses(filters or [], ISSUE_COLUMNS)
+    keyset, keyset_params = paging.keyset_clause(sort_expr, sort_type, "i.number", descending, after)
+    if keyset:
+        clauses.append(keyset)
+        params.update(keyset_params)
+    direction = "desc" if descending else "asc"
+    params.update({"limit": page_size, "offset": 0 if after else page * page_size})
+
+    # page first, then only compute the counts/pulls for the rows on that page
+    sql = f"""with page as (
+    select
+    i.number, i.title, i.user, i.created_at, i.issue_type, i.state,
+    {sort_expr}::text as sort_key,
+    row_number() over (order by {sort_expr} {direction}, i.number {direction}) as rn
+    from issues i
+    where i.reports_generated = true {''.join(' and ' + c for c in clauses)}
+    order by {sort_expr} {direction}, i.number {direction}
+    limit :limit offset :offset
+    )
+    
+    select
+    p.number,
+    p.title,
+    p.user,
+    p.created_at::text,
+    p.issue_type,
+    p.state,
+    (select count(*) from entries e where e.issue_number = p.number) as n_entries,
+    (select array_agg(pi.pull) from pull_issues pi join pulls pu on pu.number = pi.pull where pu.state = 'open' and pi.issue = p.number) as open_pulls,
+    (select array_agg(pi.pull) from pull_issues pi join pulls pu on pu.number = pi.pull where pu.state = 'closed' and pi.issue = p.number) as closed_pulls,
+    p.sort_key
+    
+    from page p order by p.rn;"""
+
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), params).fetchall()
+
+    result_dict = [
+        {
+            "id": r[0],
+            "number": r[0],
+            "title": r[1],
+            "user": r[2],
+            "created_at": r[3],
+            "issue_type": r[4],
+            "state": r[5],
+            "n_entries": r[6],
+            "open_pulls": str(r[7]),
+            "closed_pulls": str(r[8])
+        } for r in res
+    ]
+    next_cursor = [res[-1][9], res[-1][0]] if len(res) == page_size else None
+    return result_dict, next_cursor
+
+
+def count_issues(denylist_engine: Engine, filters: Optional[List[tuple]] = None) -> int:
+    clauses, params = paging.filter_clauses(filters or [], ISSUE_COLUMNS)
+    sql = f"""select count(*) from issues i where i.reports_generated = true {''.join(' and ' + c for c in clauses)};"""
+    with Session(denylist_engine) as session:
+        return session.execute(text(sql), params).scalar()
+
+
 def get_max_issue_timestamp(denylist_engine: Engine) -> datetime.datetime:
     sql = """select max(created_at) from issues;"""
 
@@ -263,18 +913,19 @@ def get_max_issue_timestamp(denylist_engine: Engine) -> datetime.datetime:
     return res[0]
 
 
-def get_unparsed_issues(denylist_engine: Engine):
-    sql = """with entries_per_issue as (
+def get_unparsed_issues(denylist_engine: Engine, since: Optional[str] = None):
+    sql = f"""with entries_per_issue as (
     select 
         i.number as issue,
         count(e.address) as n_entries
     from issues i left join entries e on i.number = e.issue_number 
     group by issue)
     
-    select epi.issue, i2.body from entries_per_issue epi join issues i2 on i2.number = epi.issue where n_entries = 0;"""
+    select epi.issue, i2.body from entries_per_issue epi join issues i2 on i2.number = epi.issue where n_entries = 0
+    {"and i2.created_at > :since" if since else ""} order by epi.issue;"""
 
     with Session(denylist_engine) as session:
-        res = session.execute(sql).fetchall()
+        res = session.execute(text(sql), {"since": since}).fetchall()
 
     result_dict = [
         {
@@ -285,6 +936,16 @@ def get_unparsed_issues(denylist_engine: Engine):
     return result_dict
 
 
+def get_issue_bodies(denylist_engine: Engine, issue_numbers: List[int]) -> List[dict]:
+    """
+    Same as get_unparsed_issues, but for the given issues, whether or not they were parsed already.
+    """
+    sql = """select number, body from issues where number = any(:issue_numbers) order by number;"""
+    with Session(denylist_engine) as session:
+        res = session.execute(text(sql), {"issue_numbers": list(issue_numbers)}).fetchall()
+    return [{"number": r[0], "body": r[1]} for r in res]
+
+
 def upsert_pulls(denylist_engine: Engine, pulls: List[dict], issue_joins: List[dict]):
     with Session(denylist_engine) as session:
         for pull in pulls:
@@ -365,14 +1026,7 @@ def get_distance_vs_rssi(etl_engine: Engine, address: str, n_blocks: int = 43200
     
     select distance_m, rssi from results where distance_m < 100e3;"""
 
-    with Session(etl_engine) as session:
-        res = session.execute(sql).fetchall()
-
-    result_dict = {
-        "distance_m": [r[0] for r in res],
-        "rssi": [r[1] for r in res]
-    }
-    return result_dict
+    return fetch_columns(etl_engine, sql, {"distance_m": np.float64, "rssi": np.float64})
 
 
 def get_witnessed_makers(etl_engine: Engine, address: str, n_blocks: int = 43200, max_block: Optional[int] = None) -> dict:
@@ -401,14 +1055,8 @@ def get_witnessed_makers(etl_engine: Engine, address: str, n_blocks: int = 43200
     
     from metadata mt join gateway_inventory g on g.address = mt.transmitter join makers m on m.address = g.payer group by maker;"""
 
-    with Session(etl_engine) as session:
-        res = session.execute(sql).fetchall()
-
-    result_dict = {
-        "maker": [r[0] for r in res],
-        "n_witnessed": [r[1] for r in res],
-        "as_of_block": max_block
-    }
+    result_dict = fetch_columns(etl_engine, sql, {"maker": object, "n_witnessed": np.int64})
+    result_dict["as_of_block"] = max_block
     return result_dict
 
 
@@ -490,19 +1138,29 @@ def get_witness_graph(etl_engine: Engine, address: str, n_blocks: int = 43200, m
     join gateway_inventory g on c.witness_address = g.address 
     join makers m on m.address = g.payer;"""
 
-    with Session(etl_engine) as session:
-        res = session.execute(sql).fetchall()
+    return fetch_columns(etl_engine, sql, {
+        "transmitter_address": object,
+        "witness_address": object,
+        "hop": np.int64,
+        "maker": object,
+        "owner": object,
+        "location": object,
+        # nullable in gateway_inventory
+        "first_block": np.float64
+    })
 
-    result_dict = {
-        "transmitter_address": [r[0] for r in res],
-        "witness_address": [r[1] for r in res],
-        "hop": [r[2] for r in res],
-        "maker": [r[3] for r in res],
-        "owner": [r[4] for r in res],
-        "location": [r[5] for r in res],
-        "first_block": [r[6] for r in res]
-    }
-    return result_dict
+
+def get_witness_edges(etl_engine: Engine, addresses: List[str], n_blocks: int = 43200) -> dict:
+    """
+    Distinct transmitter -> witness pairs of the last `n_blocks` blocks where both hotspots are in `addresses`.
+    :return: Columns transmitter_address, witness_address.
+    """
+    sql = """select distinct c.transmitter_address, c.witness_address
+    from challenge_receipts_parsed c
+    where c.block > (select max(height) - :n_blocks from blocks)
+    and c.transmitter_address = any(cast(:addresses as text[])) and c.witness_address = any(cast(:addresses as text[]));"""
+    return fetch_columns(etl_engine, sql, {"transmitter_address": object, "witness_address": object},
+                         params={"addresses": list(addresses), "n_blocks": n_blocks})
 
 
 def get_rssi_vs_snr(etl_engine: Engine, address: str, n_blocks: int = 43200, max_block: Optional[int] = None) -> dict:
@@ -535,11 +1193,4 @@ def get_rssi_vs_snr(etl_engine: Engine, address: str, n_blocks: int = 43200, max
     
     from metadata;"""
 
-    with Session(etl_engine) as session:
-        res = session.execute(sql).fetchall()
-
-    result_dict = {
-        "rssi": [r[0] for r in res],
-        "snr": [r[1] for r in res]
-    }
-    return result_dict
\ No newline at end of file
+    return fetch_columns(etl_engine, sql, {"rssi": np.float64, "snr": np.float64})
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""
+Compact binary encoding for the report datasets we cache in the report store, and helpers to read/write them.
+
+A report is a dict of columns (equal-length arrays/lists) and scalars. It's stored as
+
+    MAGIC | version (u8) | header length (u32 LE) | JSON header | column buffers
+
+and the whole thing is gzipped. Numeric columns are written as raw little-endian buffers (ints downcast to the
+smallest type that fits), string columns are dictionary-encoded as a category list plus integer codes, and scalars
+(or anything that isn't a flat column) go into the JSON header as-is.
+"""
+import gzip
+import json
+import struct
+import numpy as np
+from store import ReportStore, ObjectNotFound
+from typing import Union, Optional, Iterable
+
+
+MAGIC = b"DLR"
+VERSION = 1
+
+CONTENT_TYPE = "application/vnd.denylist.report"
+CONTENT_ENCODING = "gzip"
+
+# appended to the legacy JSON keys, so old and new objects can live side by side
+KEY_SUFFIX = f".v{VERSION}"
+
+_HEADER = struct.Struct("<3sBI")
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _is_column(value) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.ndim == 1
+    if isinstance(value, (list, tuple)):
+        return all(v is None or isinstance(v, (str, int, float, bool, np.generic)) for v in value)
+    return False
+
+
+def _smallest_int(values: np.ndarray) -> np.ndarray:
+    if len(values) == 0:
+        return values.astype(np.int8)
+    return values.astype(np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max())))
+
+
+def _encode_column(name: str, value) -> (dict, bytes):
+    arr = np.asarray(value)
+    if arr.dtype.kind in "iu":
+        arr = _smallest_int(arr)
+    if arr.dtype.kind in "iufb":
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        return {"name": name, "dtype": arr.dtype.str, "length": len(arr)}, arr.tobytes()
+
+    # anything else (strings, mixed, None) is dictionary-encoded; code -1 is None
+    values = np.asarray(value, dtype=object)
+    categories, codes = {}, np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        if v is None:
+            codes[i] = -1
+        else:
+            v = v.item() if isinstance(v, np.generic) else v
+            codes[i] = categories.setdefault(v, len(categories))
+    codes = _smallest_int(codes)
+    codes = codes.astype(codes.dtype.newbyteorder("<"), copy=False)
+    return {"name": name, "dtype": codes.dtype.str, "length": len(values), "categories": list(categories)}, codes.tobytes()
+
+
+def encode_report(data: dict, compresslevel: int = 6) -> bytes:
+    """
+    Encode a report dict into the versioned binary format.
+    :param data: Dict of columns (1-D arrays or flat lists) and JSON-serializable scalars.
+    :param compresslevel: gzip compression level.
+    :return: The gzipped report.
+    """
+    columns, scalars, buffers = [], {}, []
+    for k, v in data.items():
+        if _is_column(v):
+            spec, buf = _encode_column(k, v)
+            columns.append(spec)
+            buffers.append(buf)
+        else:
+            scalars[k] = v.item() if isinstance(v, np.generic) else v
+
+    header = json.dumps({"columns": columns, "scalars": scalars}).encode("utf-8")
+    raw = _HEADER.pack(MAGIC, VERSION, len(header)) + header + b"".join(buffers)
+    return gzip.compress(raw, compresslevel=compresslevel)
+
+
+def decode_report(body: Union[bytes, bytearray]) -> dict:
+    """
+    Decode a report, accepting either the binary format or the legacy JSON documents.
+    :param body: The raw (possibly gzipped) object body.
+    :return: Dict of column name -> ndarray plus the scalars.
+    """
+    if body[:2] == _GZIP_MAGIC:
+        body = gzip.decompress(body)
+    if body[:3] != MAGIC:
+        return json.loads(body.decode("utf-8"))
+
+    _, version, header_len = _HEADER.unpack_from(body)
+    if version != VERSION:
+        raise ValueError(f"Unsupported report version {version}")
+    header = json.loads(body[_HEADER.size:_HEADER.size + header_len].decode("utf-8"))
+
+    result = {}
+    offset = _HEADER.size + header_len
+    for spec in header["columns"]:
+        dtype = np.dtype(spec["dtype"])
+        arr = np.frombuffer(body, dtype=dtype, count=spec["length"], offset=offset)
+        offset += dtype.itemsize * spec["length"]
+        if "categories" in spec:
+            # trailing None so that code -1 maps to it
+            lookup = np.array(spec["categories"] + [None], dtype=object)
+            arr = lookup[arr]
+        else:
+            arr = arr.astype(dtype.newbyteorder("="))
+        result[spec["name"]] = arr
+    result.update(header["scalars"])
+    return result
+
+
+# -- bundles --------------------------------------------------------------------------------------------------------
+#
+# All the datasets for an entry are stored in a single object:
+#
+#     BUNDLE_MAGIC | version (u8) | index length (u32 LE) | JSON index | section, section, ...
+#
+# where the index maps section name -> [offset, length] relative to the end of the index, and every section is an
+# independently gzipped report (see encode_report). The bundle itself isn't compressed, so a reader can fetch the
+# index with one small range read and then any single section with another.
+
+BUNDLE_MAGIC = b"DLB"
+BUNDLE_CONTENT_TYPE = "application/vnd.denylist.report-bundle"
+
+ENTRY_SECTIONS = ("distance_vs_rssi", "witnessed_makers", "hotspot_details", "witness_graph", "rssi_vs_snr")
+
+# enough for the index of a bundle with a handful of sections, so it can usually be read in a single range request
+INDEX_PREFETCH_BYTES = 4096
+
+
+def entry_key(issue_number: int, address: str) -> str:
+    return f"issues/{issue_number}/entries/{address}/report{KEY_SUFFIX}"
+
+
+def encode_bundle(sections: dict) -> bytes:
+    """
+    Bundle several reports into a single object with a byte-range index.
+    :param sections: Dict of section name -> report dict.
+    :return: The encoded bundle.
+    """
+    index, blobs, offset = {}, [], 0
+    for name, data in sections.items():
+        blob = encode_report(data)
+        index[name] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+    header = json.dumps(index).encode("utf-8")
+    return _HEADER.pack(BUNDLE_MAGIC, VERSION, len(header)) + header + b"".join(blobs)
+
+
+def parse_bundle_index(prefix: Union[bytes, bytearray]) -> (dict, int):
+    """
+    Read the index from the start of a bundle.
+    :param prefix: The first bytes of the bundle.
+    :return: The index (section name -> [absolute offset, length]) and the size of the header. If `prefix` is too short
+    to contain the whole index, the index is None and the size is the number of bytes needed.
+    """
+    if len(prefix) < _HEADER.size:
+        return None, _HEADER.size
+    magic, version, header_len = _HEADER.unpack_from(prefix)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("Not a report bundle")
+    if version != VERSION:
+        raise ValueError(f"Unsupported bundle version {version}")
+    data_start = _HEADER.size + header_len
+    if len(prefix) < data_start:
+        return None, data_start
+
+    index = json.loads(prefix[_HEADER.size:data_start].decode("utf-8"))
+    return {k: [data_start + offset, length] for k, (offset, length) in index.items()}, data_start
+
+
+def decode_bundle(body: Union[bytes, bytearray], sections: Optional[Iterable[str]] = None) -> dict:
+    """
+    Decode a whole bundle (or a subset of its sections).
+    :param body: The bundle.
+    :param sections: Section names to decode, defaults to all of them.
+    :return: Dict of section name -> report dict.
+    """
+    index, _ = parse_bundle_index(body)
+    if index is None:
+        raise ValueError("Truncated report bundle")
+    names = index.keys() if sections is None else sections
+    return {k: decode_report(body[index[k][0]:index[k][0] + index[k][1]]) for k in names if k in index}
+
+
+# -- reading/writing ------------------------------------------------------------------------------------------------
+
+def put_report(store: ReportStore, key: str, data: dict) -> str:
+    return store.put(key + KEY_SUFFIX, encode_report(data), content_type=CONTENT_TYPE, content_encoding=CONTENT_ENCODING)
+
+
+def get_report(store: ReportStore, key: str) -> dict:
+    """
+    Get a report, preferring the binary encoding and falling back to the legacy JSON object at `key`.
+    """
+    try:
+        body = store.get(key + KEY_SUFFIX).body
+    except ObjectNotFound:
+        body = store.get(key).body
+    return decode_report(body)
+
+
+def put_bundle(store: ReportStore, key: str, sections: dict) -> str:
+    return store.put(key, encode_bundle(sections), content_type=BUNDLE_CONTENT_TYPE)
+
+
+def get_bundle(store: ReportStore, key: str) -> dict:
+    return decode_bundle(store.get(key).body)
+
+
+def get_bundle_section(store: ReportStore, key: str, section: str) -> dict:
+    """
+    Fetch a single section of a bundle with range reads: one for the index and (unless the section happens to fall
+    inside that first read) one for the section itself.
+    """
+    prefix = store.get(key, byte_range=(0, INDEX_PREFETCH_BYTES)).body
+    index, needed = parse_bundle_index(prefix)
+    if index is None:
+        prefix += store.get(key, byte_range=(len(prefix), needed)).body
+        index, _ = parse_bundle_index(prefix)
+
+    if section not in index:
+        raise KeyError(section)
+    start, length = index[section]
+    if start + length <= len(prefix):
+        blob = prefix[start:start + length]
+    else:
+        blob = store.get(key, byte_range=(start, start + length)).body
+    return decode_report(blob)
+
+
+def get_entry_report(store: ReportStore, issue_number: int, address: str) -> dict:
+    """
+    Get all of the datasets for an entry, from the bundle if there is one, otherwise from the per-dataset objects
+    written by older report runs.
+    """
+    try:
+        return get_bundle(store, entry_key(issue_number, address))
+    except ObjectNotFound:
+        pass
+
+    result = {}
+    for section in ENTRY_SECTIONS:
+        try:
+            result[section] = get_report(store, f"issues/{issue_number}/entries/{address}/{section}")
+        except ObjectNotFound:
+            continue
+    return result
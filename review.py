@@ -0,0 +1,112 @@
+"""
+Review API on the dashboard's Flask server, so several reviewers can work through large issues at once.
+
+    GET  /api/review/queue?reviewer=...&limit=50[&issue=...][&after=<issue>,<address>]
+         claim the next unreviewed entries (see queries.claim_review_queue)
+    POST /api/review/release     {"reviewer": ..., ["entries": [...]]}
+    POST /api/review/status      {"status": "valid", "entries": [...], ["reviewer": ...]}
+    GET/POST/DELETE /api/accepted   the entries accepted for the next PR ({"entries": [...]}; DELETE {"all": true}
+                                    clears it)
+
+Entries are given as {"issue_number": ..., "address": ...} objects or [issue_number, address] pairs.
+"""
+from flask import Flask, Blueprint, request, jsonify
+from typing import Callable, List
+import queries
+
+
+MAX_BATCH = 100000
+
+
+def _body() -> dict:
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object body")
+    return body
+
+
+def _required(body: dict, field: str):
+    if body.get(field) in (None, ""):
+        raise ValueError(f"{field} is required")
+    return body[field]
+
+
+def _keys(body: dict) -> List[tuple]:
+    entries = _required(body, "entries")
+    if not isinstance(entries, list):
+        raise ValueError("entries must be a list")
+    keys = []
+    for e in entries:
+        try:
+            if isinstance(e, dict):
+                issue_number, address = e.get("issue_number", e.get("issue")), e.get("address")
+            else:
+                issue_number, address = e[0], e[1]
+            issue_number = int(issue_number)
+        except (TypeError, ValueError, IndexError, KeyError):
+            raise ValueError(f"Invalid entry {e!r}, expected {{\"issue_number\": ..., \"address\": ...}}")
+        if not isinstance(address, str) or not address:
+            raise ValueError(f"Invalid entry {e!r}, address is required")
+        keys.append((issue_number, address))
+    if len(keys) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH} entries per request, got {len(keys)}")
+    return keys
+
+
+def register(server: Flask, get_engine: Callable):
+    """
+    Add the review endpoints to the dashboard's Flask server.
+    """
+    blueprint = Blueprint("review", __name__, url_prefix="/api")
+
+    @blueprint.errorhandler(ValueError)
+    def bad_request(e):
+        return jsonify({"error": str(e)}), 400
+
+    @blueprint.route("/review/queue", methods=["GET"])
+    def review_queue():
+        reviewer = request.args.get("reviewer")
+        if not reviewer:
+            raise ValueError("reviewer is required")
+        limit = int(request.args.get("limit", 50))
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        after = request.args.get("after")
+        entries, next_cursor = queries.claim_review_queue(
+            get_engine(),
+            reviewer,
+            limit=min(limit, 1000),
+            issue_number=request.args.get("issue", type=int),
+            after=after.split(",", 1) if after else None
+        )
+        return jsonify({"entries": entries, "next": ",".join(map(str, next_cursor)) if next_cursor else None})
+
+    @blueprint.route("/review/release", methods=["POST"])
+    def release_claims():
+        body = _body()
+        keys = _keys(body) if "entries" in body else None
+        return jsonify({"released": queries.release_claims(get_engine(), _required(body, "reviewer"), keys)})
+
+    @blueprint.route("/review/status", methods=["POST"])
+    def set_review_status():
+        body = _body()
+        updated = queries.set_review_status(get_engine(), _keys(body), _required(body, "status"), body.get("reviewer"))
+        return jsonify({"updated": updated})
+
+    @blueprint.route("/accepted", methods=["GET", "POST", "DELETE"])
+    def accepted_entries():
+        engine = get_engine()
+        if request.method == "POST":
+            body = _body()
+            return jsonify({"accepted": queries.accept_entries(engine, _keys(body), body.get("reviewer"))})
+        if request.method == "DELETE":
+            body = _body()
+            # clearing the set everyone shares has to be asked for explicitly
+            if body.get("all") is True:
+                return jsonify({"removed": queries.remove_accepted_entries(engine, None)})
+            if "entries" not in body:
+                raise ValueError('Give the entries to remove, or {"all": true} to clear the accepted entries')
+            return jsonify({"removed": queries.remove_accepted_entries(engine, _keys(body))})
+        return jsonify({"entries": queries.get_accepted_entries(engine)})
+
+    server.register_blueprint(blueprint)
@@ -1,42 +1,82 @@
+"""
+The batch job that syncs the denylist issues and PR's from GitHub, parses the issues for entries and generates the
+entry reports, then groups the pending entries into fleets for review.
+
+    python run.py [issues] [entries] [pulls] [reports] [clusters] [--since DATE] [--issue N ...] [--limit N]
+        [--workers N] [--cluster-by owner|payer|connected] [--min-cluster-size N] [--dry-run] [--migrate]
+
+Without stages, all of them run in order. Connections (the SSH tunnel and ETL engine, the denylist engine, the report
+store) are only opened by the stages that need them, so targeted re-runs like `python run.py reports --issue 1234`
+start right away.
+"""
 import datetime
 
 import sqlalchemy.exc
 
-from api import get_issues, get_entries, get_pulls
+from api import get_issues, get_issue, get_entries, get_entry_keys, get_pulls
 import connection
-from sqlalchemy.engine import create_engine, Engine
-from models.migrations import migrate
+from sqlalchemy.engine import Engine
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, List
 from queries import *
 from dotenv import load_dotenv
+import argparse
 import os
 import logging
-from aws import upload_dict
-import boto3
+from reports import entry_key, put_report, put_bundle
+from store import ReportStore, get_store
+from figures import build_figure_payloads
+from graph import build_witness_graph
+from metrics import Metrics, CountingStore
+from clusters import cluster_entries, METHODS as CLUSTER_METHODS
+from profiler import SlowQueryProfiler
 
 
 # how far back (in days) should we go when generating reports? on successive passes, only new entries will be processed
 N_DAYS = 90
 
-session = boto3.Session(
-    profile_name="default"
-)
-
-MIGRATE = False
-logging.basicConfig(level=logging.INFO)
+STAGES = ["issues", "entries", "pulls", "reports", "clusters"]
 
 load_dotenv()
 
-etl_engine = connection.connect()
-denylist_engine = create_engine(os.getenv("DENYLIST_DB_CONNECTION_STRING"), pool_recycle=3600)
+metrics = Metrics()
+# opt-in (PROFILE_SLOW_QUERIES_MS): explain the report queries that are slow for a given address
+profiler = SlowQueryProfiler.from_env()
+
+# time the GitHub calls and the query functions; their statements are attributed to them via the cursor events
+get_issues = metrics.timed(get_issues)
+get_issue = metrics.timed(get_issue)
+get_pulls = metrics.timed(get_pulls)
+get_gateway_inventory = metrics.timed(get_gateway_inventory)
+get_distance_vs_rssi = metrics.timed(profiler.wrap(get_distance_vs_rssi))
+get_witnessed_makers = metrics.timed(profiler.wrap(get_witnessed_makers))
+get_hotspot_details = metrics.timed(profiler.wrap(get_hotspot_details))
+get_witness_graph = metrics.timed(profiler.wrap(get_witness_graph))
+get_rssi_vs_snr = metrics.timed(profiler.wrap(get_rssi_vs_snr))
+get_height_for_timestamp = metrics.timed(get_height_for_timestamp)
+get_witness_edges = metrics.timed(get_witness_edges)
+
+
+@lru_cache(maxsize=None)
+def get_etl_engine() -> Engine:
+    # all of the ETL work is read-only, so it can be routed to a replica if one is configured
+    engine = connection.connect(read_only=True)
+    metrics.instrument(engine)
+    profiler.attach(engine)
+    return engine
+
 
-s3 = session.resource("s3")
-bucket = s3.Bucket(os.getenv('S3_BUCKET'))
+@lru_cache(maxsize=None)
+def get_denylist_engine() -> Engine:
+    engine = connection.connect_denylist()
+    metrics.instrument(engine)
+    return engine
 
-# run migrations
-if MIGRATE is True:
-    logging.info("Running migrations...")
-    migrate()
-    logging.info("Migrations complete.")
+
+@lru_cache(maxsize=None)
+def get_report_store() -> ReportStore:
+    return CountingStore(get_store(), metrics)
 
 
 def get_new_issues(etl_engine: Engine, denylist_engine: Engine):
@@ -49,74 +89,242 @@ def get_new_issues(etl_engine: Engine, denylist_engine: Engine):
     logging.info(f"Processing new denylist issues since {since_iso}")
 
     logging.debug("Getting gateway_inventory from ETL")
-    gateway_inventory = get_gateway_inventory(etl_engine)
+    with metrics.stage("gateway_inventory") as s:
+        gateway_inventory = get_gateway_inventory(etl_engine)
+        s.rows = len(gateway_inventory)
     logging.debug("Getting issues from Github API")
-    issues = get_issues(since=since_iso)
+    with metrics.stage("github_issues") as s:
+        issues = get_issues(since=since_iso)
+        s.rows = len(issues)
     logging.debug("Parsing issues for individual hotspot entries")
-    entries = get_entries(issues, gateway_inventory)
+    with metrics.stage("parse_entries") as s:
+        entries = get_entries(issues, gateway_inventory)
+        s.rows = len(entries)
 
-    insert_records(denylist_engine, issues, entries)
+    with metrics.stage("insert_records") as s:
+        insert_records(denylist_engine, issues, entries)
+        s.rows = len(issues) + len(entries)
 
 
-def update_issues(denylist_engine: Engine):
+def update_issues(since: Optional[str] = None, issue_numbers: Optional[List[int]] = None, dry_run: bool = False):
+    """
+    Sync issues from GitHub: all of them (to pick up closures and edits), the ones updated since `since`, or just
+    `issue_numbers`.
+    """
     logging.info(f"Checking for updates in denylist issues")
     logging.info("Getting issues from Github API")
-    issues = get_issues(since=None)
+    with metrics.stage("github_issues") as s:
+        issues = [get_issue(n) for n in issue_numbers] if issue_numbers else get_issues(since=since)
+        s.rows = len(issues)
 
-    upsert_issues(denylist_engine, issues)
+    if dry_run:
+        logging.info(f"Dry run: would upsert {len(issues)} issues")
+        return
+    with metrics.stage("upsert_issues") as s:
+        upsert_issues(get_denylist_engine(), issues)
+        s.rows = len(issues)
 
 
-def update_entries(etl_engine: Engine, denylist_engine: Engine):
-    logging.info("Getting gateway_inventory from ETL")
-    gateway_inventory = get_gateway_inventory(etl_engine)
+def update_entries(since: Optional[str] = None, issue_numbers: Optional[List[int]] = None, limit: Optional[int] = None,
+                   dry_run: bool = False):
+    """
+    Parse issues for entries: the issues without any entries yet (created after `since`), or re-parse
+    `issue_numbers`.
+    """
+    denylist_engine = get_denylist_engine()
     logging.info("Looking for unparsed issues to process for entries")
-    unparsed_issues = get_unparsed_issues(denylist_engine)
+    with metrics.stage("unparsed_issues") as s:
+        if issue_numbers:
+            unparsed_issues = get_issue_bodies(denylist_engine, issue_numbers)
+        else:
+            unparsed_issues = get_unparsed_issues(denylist_engine, since=since)
+        unparsed_issues = unparsed_issues[:limit] if limit else unparsed_issues
+        s.rows = len(unparsed_issues)
+    if not unparsed_issues:
+        logging.info("No issues to parse")
+        return
+
+    logging.info("Getting gateway_inventory from ETL")
+    with metrics.stage("gateway_inventory") as s:
+        if issue_numbers or limit:
+            # a handful of issues: only load the hotspots they list
+            addresses, names = get_entry_keys(unparsed_issues)
+            gateway_inventory = get_gateway_inventory(get_etl_engine(), addresses=addresses, names=names)
+        else:
+            gateway_inventory = get_gateway_inventory(get_etl_engine())
+        s.rows = len(gateway_inventory)
     logging.info("Parsing issues for individual hotspot entries")
-    entries = get_entries(unparsed_issues, gateway_inventory)
+    with metrics.stage("parse_entries") as s:
+        entries = get_entries(unparsed_issues, gateway_inventory)
+        s.rows = len(entries)
 
-    upsert_entries(denylist_engine, entries)
+    if dry_run:
+        logging.info(f"Dry run: would upsert {len(entries)} entries from {len(unparsed_issues)} issues")
+        return
+    with metrics.stage("upsert_entries") as s:
+        upsert_entries(denylist_engine, entries)
+        s.rows = len(entries)
 
 
-def update_pulls(denylist_engine: Engine):
+def update_pulls(dry_run: bool = False):
     logging.info("Checking for new or updated PR's")
-    pulls, issue_joins = get_pulls()
-    upsert_pulls(denylist_engine, pulls, issue_joins)
-
-
-def generate_reports(etl_engine: Engine, denylist_engine: Engine):
-    since = datetime.datetime.now() - datetime.timedelta(days=N_DAYS)
-    pending_issues = get_issues_without_reports(denylist_engine, since.date().isoformat())
-
-    for issue in pending_issues:
-        logging.info(f"Processing issue {issue}")
-        issue_details = get_issue_details(denylist_engine, issue, with_body=False)
-        addresses = get_entries_for_issue(denylist_engine, issue)
-        max_block = get_height_for_timestamp(etl_engine, issue_details["created_at"])
-        upload_dict(bucket, issue_details, f"issues/{issue}/issue_details")
-        for address in addresses:
-            try:
-                logging.info(f"Processing address {address} in issue {issue}")
-                # get json datasets
-                distance_vs_rssi = get_distance_vs_rssi(etl_engine, address, max_block=max_block)
-                witnessed_makers = get_witnessed_makers(etl_engine, address, max_block=max_block)
-                hotspot_details = get_hotspot_details(etl_engine, address)
-                witness_graph = get_witness_graph(etl_engine, address, max_block=max_block)
-                rssi_vs_snr = get_rssi_vs_snr(etl_engine, address, max_block=max_block)
-
-                # upload to S3
-                upload_dict(bucket, distance_vs_rssi, f"issues/{issue}/entries/{address}/distance_vs_rssi")
-                upload_dict(bucket, witnessed_makers, f"issues/{issue}/entries/{address}/witnessed_makers")
-                upload_dict(bucket, hotspot_details, f"issues/{issue}/entries/{address}/hotspot_details")
-                upload_dict(bucket, witness_graph, f"issues/{issue}/entries/{address}/witness_graph")
-                upload_dict(bucket, rssi_vs_snr, f"issues/{issue}/entries/{address}/rssi_vs_snr")
-
-                mark_entry_report_as_complete(denylist_engine, address, issue)
-            except sqlalchemy.exc.NoResultFound:
-                continue
-        mark_issue_report_as_complete(denylist_engine, issue)
-
-
-update_issues(denylist_engine)
-update_entries(etl_engine, denylist_engine)
-update_pulls(denylist_engine)
-generate_reports(etl_engine, denylist_engine)
\ No newline at end of file
+    with metrics.stage("github_pulls") as s:
+        pulls, issue_joins = get_pulls()
+        s.rows = len(pulls)
+    if dry_run:
+        logging.info(f"Dry run: would upsert {len(pulls)} PR's and {len(issue_joins)} issue links")
+        return
+    with metrics.stage("upsert_pulls") as s:
+        upsert_pulls(get_denylist_engine(), pulls, issue_joins)
+        s.rows = len(pulls) + len(issue_joins)
+
+
+def generate_entry_report(etl_engine: Engine, denylist_engine: Engine, store: ReportStore, issue: int, address: str,
+                          max_block: int):
+    try:
+        logging.info(f"Processing address {address} in issue {issue}")
+        # get json datasets
+        with metrics.stage("report_queries") as s:
+            distance_vs_rssi = get_distance_vs_rssi(etl_engine, address, max_block=max_block)
+            witnessed_makers = get_witnessed_makers(etl_engine, address, max_block=max_block)
+            hotspot_details = get_hotspot_details(etl_engine, address)
+            witness_graph = get_witness_graph(etl_engine, address, max_block=max_block)
+            rssi_vs_snr = get_rssi_vs_snr(etl_engine, address, max_block=max_block)
+            s.rows = len(distance_vs_rssi.get("rssi", [])) + len(witness_graph.get("witness_address", [])) + \
+                len(rssi_vs_snr.get("rssi", []))
+        with metrics.stage("report_payloads"):
+            figures = build_figure_payloads(distance_vs_rssi, rssi_vs_snr)
+            graph = build_witness_graph(witness_graph)
+
+        # upload as a single bundle
+        with metrics.stage("report_upload") as s:
+            put_bundle(store, entry_key(issue, address), {
+                "distance_vs_rssi": distance_vs_rssi,
+                "witnessed_makers": witnessed_makers,
+                "hotspot_details": hotspot_details,
+                "witness_graph": witness_graph,
+                "rssi_vs_snr": rssi_vs_snr,
+                "figures": figures,
+                "graph": graph
+            })
+            s.rows = 1
+
+        mark_entry_report_as_complete(denylist_engine, address, issue)
+    except sqlalchemy.exc.NoResultFound:
+        metrics.count_error("report_queries")
+
+
+def generate_reports(since: Optional[str] = None, issue_numbers: Optional[List[int]] = None, limit: Optional[int] = None,
+                     workers: int = 1, dry_run: bool = False):
+    """
+    Generate the entry reports of the issues created after `since` (default N_DAYS ago) that don't have them yet, or
+    regenerate them for `issue_numbers`.
+    :param workers: Number of entries to process concurrently.
+    """
+    denylist_engine = get_denylist_engine()
+    if issue_numbers:
+        pending_issues = list(issue_numbers)
+    else:
+        since = since or (datetime.datetime.now() - datetime.timedelta(days=N_DAYS)).date().isoformat()
+        pending_issues = get_issues_without_reports(denylist_engine, since)
+    pending_issues = pending_issues[:limit] if limit else pending_issues
+    if dry_run:
+        for issue in pending_issues:
+            logging.info(f"Dry run: would generate {len(get_entries_for_issue(denylist_engine, issue))} reports for issue {issue}")
+        return
+
+    etl_engine = get_etl_engine()
+    store = get_report_store()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for issue in pending_issues:
+            logging.info(f"Processing issue {issue}")
+            with metrics.stage("issue_reports"):
+                issue_details = get_issue_details(denylist_engine, issue, with_body=False)
+                addresses = get_entries_for_issue(denylist_engine, issue)
+                max_block = get_height_for_timestamp(etl_engine, issue_details["created_at"])
+                put_report(store, f"issues/{issue}/issue_details", issue_details)
+            if workers > 1:
+                # list() re-raises the first exception of a worker
+                list(pool.map(lambda a: generate_entry_report(etl_engine, denylist_engine, store, issue, a, max_block),
+                              addresses))
+            else:
+                for address in addresses:
+                    generate_entry_report(etl_engine, denylist_engine, store, issue, address, max_block)
+            mark_issue_report_as_complete(denylist_engine, issue)
+
+
+def update_clusters(method: str = "owner", min_size: int = 2, dry_run: bool = False):
+    """
+    Recompute the fleets of pending entries (see clusters.py).
+    :param method: "owner", "payer" or "connected".
+    :param min_size: Min number of distinct hotspots in a fleet.
+    """
+    denylist_engine = get_denylist_engine()
+    with metrics.stage("pending_entries") as s:
+        entries = get_pending_entries(denylist_engine)
+        s.rows = len(entries["address"])
+    edges = None
+    if method == "connected":
+        with metrics.stage("witness_edges") as s:
+            edges = get_witness_edges(get_etl_engine(), list(set(entries["address"])))
+            s.rows = len(edges["transmitter_address"])
+    with metrics.stage("cluster_entries") as s:
+        clusters, members = cluster_entries(entries, method, edges=edges, min_size=min_size)
+        s.rows = len(clusters)
+    logging.info(f"Grouped {len(members['address'])} pending entries into {len(clusters)} fleets by {method}")
+
+    if dry_run:
+        logging.info(f"Dry run: would replace the {method} clusters")
+        return
+    with metrics.stage("replace_clusters") as s:
+        replace_clusters(denylist_engine, method, clusters, members)
+        s.rows = len(clusters) + len(members["address"])
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Sync the denylist issues and PR's and generate the entry reports.")
+    # not choices=STAGES: before Python 3.12, argparse checks the empty default of nargs="*" against the choices
+    parser.add_argument("stages", nargs="*", metavar="stage",
+                        help=f"stages to run, in pipeline order: {', '.join(STAGES)} (default all)")
+    parser.add_argument("--since", default=None,
+                        help="issues: only issues updated since (ISO date/time); entries and reports: only issues "
+                             f"created since (reports default {N_DAYS} days ago)")
+    parser.add_argument("--issue", type=int, action="append", default=None, dest="issues",
+                        help="only this issue (repeatable); entries and reports are redone even if they exist")
+    parser.add_argument("--limit", type=int, default=None, help="max issues for the entries and reports stages")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("REPORT_WORKERS", 1)),
+                        help="entries to generate reports for concurrently")
+    parser.add_argument("--cluster-by", choices=CLUSTER_METHODS, default=os.getenv("CLUSTER_BY", "owner"),
+                        help="how the clusters stage groups pending entries into fleets")
+    parser.add_argument("--min-cluster-size", type=int, default=2, help="min hotspots in a fleet")
+    parser.add_argument("--dry-run", action="store_true", help="fetch and parse, but don't write anything")
+    parser.add_argument("--migrate", action="store_true", help="run the denylist database migrations first")
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"invalid stage: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    stages = [s for s in STAGES if s in (args.stages or STAGES)]
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if args.migrate:
+            from models.migrations import migrate
+            logging.info("Running migrations...")
+            migrate()
+            logging.info("Migrations complete.")
+        if "issues" in stages:
+            update_issues(args.since, args.issues, args.dry_run)
+        if "entries" in stages:
+            update_entries(args.since, args.issues, args.limit, args.dry_run)
+        if "pulls" in stages:
+            update_pulls(args.dry_run)
+        if "reports" in stages:
+            generate_reports(args.since, args.issues, args.limit, args.workers, args.dry_run)
+        if "clusters" in stages:
+            update_clusters(args.cluster_by, args.min_cluster_size, args.dry_run)
+    finally:
+        metrics.write(os.getenv("METRICS_DIR", "metrics"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Storage backends for the cached reports.
+
+Everything that reads or writes report objects goes through a ReportStore, so the pipeline and dashboard can run
+against S3 (see aws.S3ReportStore), a local directory, or memory, optionally with a local disk cache in front.
+"""
+from collections import OrderedDict, namedtuple
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from typing import Optional, Tuple, Iterator
+import hashlib
+import tempfile
+import threading
+import logging
+import time
+import os
+
+
+load_dotenv()
+
+
+StoredObject = namedtuple("StoredObject", ["body", "etag"])
+
+
+class ObjectNotFound(KeyError):
+    pass
+
+
+class ReportStore(ABC):
+    """
+    Minimal key/value interface for report objects. `byte_range` is a half-open (start, end) tuple.
+    """
+    @abstractmethod
+    def put(self, key: str, body: bytes, content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> str:
+        """
+        Write an object.
+        :return: The new ETag.
+        """
+
+    @abstractmethod
+    def get(self, key: str, byte_range: Optional[Tuple[int, int]] = None) -> StoredObject:
+        """
+        Read an object, or part of one.
+        :raises ObjectNotFound: If there is no object at `key`.
+        """
+
+    @abstractmethod
+    def head(self, key: str) -> Optional[str]:
+        """
+        :return: The ETag of the object at `key`, or None if it doesn't exist.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        ...
+
+
+def _md5(body: bytes) -> str:
+    return hashlib.md5(body).hexdigest()
+
+
+def _slice(body: bytes, byte_range: Optional[Tuple[int, int]]) -> bytes:
+    return body if byte_range is None else body[byte_range[0]:byte_range[1]]
+
+
+class MemoryReportStore(ReportStore):
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, body, content_type=None, content_encoding=None):
+        etag = _md5(body)
+        with self._lock:
+            self._objects[key] = StoredObject(bytes(body), etag)
+        return etag
+
+    def get(self, key, byte_range=None):
+        with self._lock:
+            obj = self._objects.get(key)
+        if obj is None:
+            raise ObjectNotFound(key)
+        return StoredObject(_slice(obj.body, byte_range), obj.etag)
+
+    def head(self, key):
+        with self._lock:
+            obj = self._objects.get(key)
+        return obj.etag if obj else None
+
+    def delete(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+    def keys(self, prefix=""):
+        with self._lock:
+            keys = sorted(self._objects)
+        return (k for k in keys if k.startswith(prefix))
+
+
+def _write_atomic(path: str, body: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_file(path: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
+    with open(path, "rb") as f:
+        if byte_range is None:
+            return f.read()
+        f.seek(byte_range[0])
+        return f.read(byte_range[1] - byte_range[0])
+
+
+def _file_etag(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+class LocalReportStore(ReportStore):
+    """
+    Objects stored as files under `root`, with the key as the relative path.
+    """
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid key {key}")
+        return path
+
+    def put(self, key, body, content_type=None, content_encoding=None):
+        path = self._path(key)
+        _write_atomic(path, body)
+        return _file_etag(path)
+
+    def get(self, key, byte_range=None):
+        path = self._path(key)
+        try:
+            etag = _file_etag(path)
+            return StoredObject(_read_file(path, byte_range), etag)
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+
+    def head(self, key):
+        try:
+            return _file_etag(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, prefix=""):
+        for dirpath, _, filenames in os.walk(self.root):
+            for f in sorted(filenames):
+                if f.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, f), self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    yield key
+
+
+class CachedReportStore(ReportStore):
+    """
+    A size-bounded local disk cache in front of another (usually remote) store.
+
+    Cached objects are served from disk, evicting the least recently used ones once `max_bytes` is exceeded. After
+    `validate_after` seconds a cached copy is revalidated against the remote ETag (a HEAD rather than a full GET) and
+    re-fetched if it changed. Writes go through to the remote store and populate the cache.
+
+    The index and size bound are kept in the process, so `cache_dir` must not be shared with other processes (see
+    claim_cache_dir); `max_bytes` is per process.
+    """
+    _ETAG_SUFFIX = ".etag"
+
+    def __init__(self, remote: ReportStore, cache_dir: str, max_bytes: int = 1 << 30, validate_after: float = 300):
+        self.remote = remote
+        self.root = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.validate_after = validate_after
+        self.hits, self.misses = 0, 0
+        self._lock = threading.Lock()
+        # key -> [size, remote etag, last validated (monotonic)], least recently used first
+        self._index = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid key {key}")
+        return path
+
+    def _load_index(self):
+        # rebuild LRU order from access times, so a restart doesn't throw the cache away
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for f in filenames:
+                if f.endswith(self._ETAG_SUFFIX) or f.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, f)
+                try:
+                    with open(path + self._ETAG_SUFFIX) as fe:
+                        etag = fe.read()
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                found.append((st.st_atime, key, st.st_size, etag))
+        for _, key, size, etag in sorted(found):
+            # never validated in this process, so the first read checks the ETag
+            self._index[key] = [size, etag, float("-inf")]
+            self._size += size
+
+    def _store_local(self, key: str, body: bytes, etag: str):
+        if len(body) > self.max_bytes:
+            return
+        path = self._path(key)
+        # body before etag, and no etag in between: a crash mustn't leave an ETag next to a body it doesn't belong to
+        try:
+            os.remove(path + self._ETAG_SUFFIX)
+        except FileNotFoundError:
+            pass
+        _write_atomic(path, body)
+        _write_atomic(path + self._ETAG_SUFFIX, etag.encode("utf-8"))
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old:
+                self._size -= old[0]
+            self._index[key] = [len(body), etag, time.monotonic()]
+            self._size += len(body)
+            evicted = []
+            while self._size > self.max_bytes and self._index:
+                k, (size, _, _) = self._index.popitem(last=False)
+                self._size -= size
+                evicted.append(k)
+        for k in evicted:
+            self._remove_local(k)
+
+    def _remove_local(self, key: str):
+        path = self._path(key)
+        for p in (path, path + self._ETAG_SUFFIX):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key: str):
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old:
+                self._size -= old[0]
+        self._remove_local(key)
+
+    def _cached(self, key: str) -> Optional[str]:
+        """
+        :return: The ETag of a valid cached copy of `key`, or None.
+        """
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                return None
+            self._index.move_to_end(key)
+            _, etag, validated = meta
+        if time.monotonic() - validated < self.validate_after:
+            return etag
+
+        remote_etag = self.remote.head(key)
+        if remote_etag != etag:
+            self._forget(key)
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index[key][2] = time.monotonic()
+        return etag
+
+    def put(self, key, body, content_type=None, content_encoding=None):
+        etag = self.remote.put(key, body, content_type=content_type, content_encoding=content_encoding)
+        self._store_local(key, body, etag)
+        return etag
+
+    def get(self, key, byte_range=None):
+        etag = self._cached(key)
+        if etag is not None:
+            try:
+                body = _read_file(self._path(key), byte_range)
+                with self._lock:
+                    self.hits += 1
+                return StoredObject(body, etag)
+            except FileNotFoundError:
+                self._forget(key)
+
+        with self._lock:
+            self.misses += 1
+        if byte_range is not None:
+            # don't cache partial objects
+            return self.remote.get(key, byte_range)
+        obj = self.remote.get(key)
+        try:
+            self._store_local(key, obj.body, obj.etag)
+        except OSError as e:
+            logging.warning(f"Could not cache {key}: {e}")
+        return obj
+
+    def head(self, key):
+        etag = self._cached(key)
+        return etag if etag is not None else self.remote.head(key)
+
+    def delete(self, key):
+        self.remote.delete(key)
+        self._forget(key)
+
+    def keys(self, prefix=""):
+        return self.remote.keys(prefix)
+
+
+# root -> (pid, directory, lock file) of the cache directory this process claimed
+_claimed_cache_dirs = {}
+
+
+def claim_cache_dir(root: str) -> str:
+    """
+    A subdirectory of `root` that no other running process is using, for a CachedReportStore (e.g. one per gunicorn
+    worker). Subdirectories are locked for the life of the process that claimed them and reused once it has exited, so
+    a restarted worker starts with a warm cache.
+    """
+    claimed = _claimed_cache_dirs.get(root)
+    if claimed is not None and claimed[0] == os.getpid():
+        return claimed[1]
+    os.makedirs(root, exist_ok=True)
+    if os.name == "nt":
+        # no flock: a directory per process, not reused
+        directory = os.path.join(root, f"pid-{os.getpid()}")
+        _claimed_cache_dirs[root] = (os.getpid(), directory, None)
+        return directory
+    import fcntl
+    slot = 0
+    while True:
+        lock = open(os.path.join(root, f"slot-{slot}.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            slot += 1
+            continue
+        directory = os.path.join(root, f"slot-{slot}")
+        _claimed_cache_dirs[root] = (os.getpid(), directory, lock)
+        return directory
+
+
+def get_store() -> ReportStore:
+    """
+    Build the report store configured in .env:
+        REPORT_STORE: s3 (default), local or memory
+        REPORT_STORE_PATH: root directory for the local store
+        REPORT_CACHE_DIR: if set, put a local disk cache in front of the store, in a subdirectory of its own per
+        process (see claim_cache_dir)
+        REPORT_CACHE_MAX_BYTES, REPORT_CACHE_VALIDATE_SECONDS: cache size (per process) and revalidation interval
+    """
+    backend = os.getenv("REPORT_STORE", "s3").lower()
+    if backend == "s3":
+        from aws import S3ReportStore
+        store = S3ReportStore(os.getenv("S3_BUCKET"), profile_name=os.getenv("AWS_PROFILE"))
+    elif backend == "local":
+        store = LocalReportStore(os.getenv("REPORT_STORE_PATH", "reports"))
+    elif backend == "memory":
+        store = MemoryReportStore()
+    else:
+        raise ValueError(f"Unknown REPORT_STORE {backend}")
+
+    if os.getenv("REPORT_CACHE_DIR"):
+        store = CachedReportStore(
+            store,
+            claim_cache_dir(os.path.abspath(os.getenv("REPORT_CACHE_DIR"))),
+            max_bytes=int(os.getenv("REPORT_CACHE_MAX_BYTES", 1 << 30)),
+            validate_after=float(os.getenv("REPORT_CACHE_VALIDATE_SECONDS", 300))
+        )
+    return store
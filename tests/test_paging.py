@@ -0,0 +1,63 @@
+"""
+paging.py: DataTable filter parsing and the SQL conditions built from it.
+"""
+import paging
+
+
+COLUMNS = {
+    "number": ("i.number", "integer"),
+    "user": ("coalesce(i.user, '')", "text"),
+    "created_at": ("coalesce(i.created_at, '-infinity'::timestamp)", "timestamp"),
+}
+
+
+def test_parse_filter_query():
+    assert paging.parse_filter_query(None) == []
+    assert paging.parse_filter_query("") == []
+    assert paging.parse_filter_query('{user} contains "abc" && {number} >= 10 && {created_at} datestartswith 2022-10') == [
+        ("user", "contains", "abc"), ("number", ">=", "10"), ("created_at", "datestartswith", "2022-10")
+    ]
+    # word operators, quoted values keep their inner spaces
+    assert paging.parse_filter_query("{number} eq 5 && {user} ne 'a b'") == [("number", "=", "5"), ("user", "!=", "a b")]
+
+
+def test_parse_filter_query_skips_unsupported_expressions():
+    assert paging.parse_filter_query("{number} is blank && garbage && {user} ~ x && {number} < 3") == [("number", "<", "3")]
+
+
+def test_filter_clauses():
+    clauses, params = paging.filter_clauses(
+        [("user", "contains", "abc"), ("number", ">", "10"), ("created_at", "datestartswith", "2022-10")], COLUMNS)
+    assert clauses == ["coalesce(i.user, '')::text ilike :f0", "i.number > cast(:f1 as integer)",
+                       "coalesce(i.created_at, '-infinity'::timestamp)::text like :f2"]
+    assert params == {"f0": "%abc%", "f1": "10", "f2": "2022-10%"}
+
+
+def test_filter_clauses_skip_unknown_columns_and_bad_operands():
+    filters = [("secret", "=", "1"), ("number", "=", "abc"), ("created_at", ">", "not a date"),
+               ("number", "contains", "abc"), ("created_at", "<", "2022-10-01")]
+    clauses, params = paging.filter_clauses(filters, COLUMNS, prefix="x")
+    assert clauses == ["i.number::text ilike :x3", "coalesce(i.created_at, '-infinity'::timestamp) < cast(:x4 as timestamp)"]
+    assert params == {"x3": "%abc%", "x4": "2022-10-01"}
+
+
+def test_values_are_bound_not_interpolated():
+    clauses, params = paging.filter_clauses([("user", "=", "x'; drop table issues; --")], COLUMNS)
+    assert clauses == ["coalesce(i.user, '') = cast(:f0 as text)"]
+    assert params == {"f0": "x'; drop table issues; --"}
+
+
+def test_keyset_clause():
+    assert paging.keyset_clause("i.number", "integer", "i.number", False, None) == ("", {})
+    assert paging.keyset_clause("coalesce(i.user, '')", "text", "i.number", False, ["bob", 12]) == (
+        "(coalesce(i.user, ''), i.number) > (cast(:k0 as text), :k1)", {"k0": "bob", "k1": 12})
+    clause, params = paging.keyset_clause("e.address", "text", "e.issue_number", True, ["a", 3], prefix="c")
+    assert clause == "(e.address, e.issue_number) < (cast(:c0 as text), :c1)"
+    assert params == {"c0": "a", "c1": 3}
+
+
+def test_signature_changes_with_the_query():
+    a = paging.signature(1, 25, "address", False, [("user", "contains", "x")])
+    assert a == paging.signature(1, 25, "address", False, [("user", "contains", "x")])
+    assert a != paging.signature(1, 25, "address", True, [("user", "contains", "x")])
+    assert a != paging.signature(1, 25, "address", False, [])
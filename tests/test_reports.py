@@ -0,0 +1,117 @@
+"""
+Round trips of the DLR report and DLB bundle formats (reports.py), as written to the report store.
+"""
+from store import MemoryReportStore
+import numpy as np
+import reports
+import pytest
+import gzip
+import json
+
+
+def _report(n: int = 100) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "distance_m": rng.exponential(5000, n),
+        "rssi": rng.integers(-130, -60, n),
+        "hop": np.ones(n, dtype=np.int64),
+        "first_block": np.where(np.arange(n) % 7 == 0, np.nan, np.arange(n, dtype=np.float64)),
+        "maker": [None if i % 5 == 0 else f"maker-{i % 3}" for i in range(n)],
+        "as_of_block": 1234567,
+        "name": "some-hotspot-name",
+        "nested": {"a": [1, 2]},
+    }
+
+
+def test_report_round_trip():
+    data = _report()
+    decoded = reports.decode_report(reports.encode_report(data))
+    assert set(decoded) == set(data)
+    np.testing.assert_array_equal(decoded["distance_m"], data["distance_m"])
+    np.testing.assert_array_equal(decoded["rssi"], data["rssi"])
+    np.testing.assert_array_equal(decoded["first_block"], data["first_block"])
+    assert list(decoded["maker"]) == data["maker"]
+    assert decoded["as_of_block"] == 1234567
+    assert decoded["name"] == "some-hotspot-name"
+    assert decoded["nested"] == {"a": [1, 2]}
+
+
+def test_report_ints_are_downcast_and_read_back_in_native_order():
+    decoded = reports.decode_report(reports.encode_report({"small": np.array([1, 2, 3]), "big": np.array([0, 2 ** 40])}))
+    assert decoded["small"].dtype == np.uint8
+    assert decoded["big"].tolist() == [0, 2 ** 40]
+    assert decoded["big"].dtype.isnative
+
+
+def test_empty_columns():
+    decoded = reports.decode_report(reports.encode_report({"a": np.array([], dtype=np.float64), "b": []}))
+    assert len(decoded["a"]) == 0 and len(decoded["b"]) == 0
+
+
+def test_report_header_layout():
+    raw = gzip.decompress(reports.encode_report({"x": [1.5]}))
+    magic, version, header_len = reports._HEADER.unpack_from(raw)
+    assert (magic, version) == (reports.MAGIC, reports.VERSION)
+    header = json.loads(raw[reports._HEADER.size:reports._HEADER.size + header_len])
+    assert header["columns"] == [{"name": "x", "dtype": "<f8", "length": 1}]
+
+
+def test_legacy_json_reports_still_decode():
+    legacy = {"rssi": [-100, -90], "as_of_block": 5}
+    assert reports.decode_report(json.dumps(legacy).encode()) == legacy
+    assert reports.decode_report(gzip.compress(json.dumps(legacy).encode())) == legacy
+
+
+def test_unknown_version_is_refused():
+    raw = bytearray(gzip.decompress(reports.encode_report({"x": [1]})))
+    raw[3] = reports.VERSION + 1
+    with pytest.raises(ValueError):
+        reports.decode_report(bytes(raw))
+
+
+def test_bundle_round_trip_and_index():
+    sections = {s: _report(10 + i) for i, s in enumerate(reports.ENTRY_SECTIONS)}
+    body = reports.encode_bundle(sections)
+    index, data_start = reports.parse_bundle_index(body)
+    assert list(index) == list(sections)
+    assert all(start >= data_start and start + length <= len(body) for start, length in index.values())
+
+    decoded = reports.decode_bundle(body)
+    for name, data in sections.items():
+        np.testing.assert_array_equal(decoded[name]["rssi"], data["rssi"])
+    assert list(reports.decode_bundle(body, sections=["witness_graph"])) == ["witness_graph"]
+
+
+def test_bundle_index_needs_more_bytes():
+    body = reports.encode_bundle({"a": {"x": [1]}})
+    assert reports.parse_bundle_index(body[:4]) == (None, reports._HEADER.size)
+    index, data_start = reports.parse_bundle_index(body)
+    assert reports.parse_bundle_index(body[:data_start - 1]) == (None, data_start)
+    with pytest.raises(ValueError):
+        reports.decode_bundle(body[:data_start - 1])
+    with pytest.raises(ValueError):
+        reports.parse_bundle_index(b"XXX" + body[3:])
+
+
+@pytest.mark.parametrize("n_sections", [2, 400])
+def test_bundle_section_range_reads(n_sections):
+    # 400 sections: an index longer than the first range read
+    store = MemoryReportStore()
+    sections = {f"section-{i:04d}": {"rssi": np.arange(i, i + 1000)} for i in range(n_sections)}
+    reports.put_bundle(store, "bundle", sections)
+    for name in (f"section-{0:04d}", f"section-{n_sections - 1:04d}"):
+        np.testing.assert_array_equal(reports.get_bundle_section(store, "bundle", name)["rssi"], sections[name]["rssi"])
+    with pytest.raises(KeyError):
+        reports.get_bundle_section(store, "bundle", "missing")
+
+
+def test_entry_report_from_bundle_or_legacy_objects():
+    store = MemoryReportStore()
+    reports.put_bundle(store, reports.entry_key(1, "addr"), {"hotspot_details": {"name": "a"}})
+    assert reports.get_entry_report(store, 1, "addr") == {"hotspot_details": {"name": "a"}}
+
+    reports.put_report(store, "issues/2/entries/addr/witnessed_makers", {"maker": ["m"]})
+    store.put("issues/2/entries/addr/rssi_vs_snr", json.dumps({"rssi": [1]}).encode())
+    legacy = reports.get_entry_report(store, 2, "addr")
+    assert list(legacy["witnessed_makers"]["maker"]) == ["m"]
+    assert legacy["rssi_vs_snr"] == {"rssi": [1]}
@@ -0,0 +1,143 @@
+"""
+The report stores: MemoryReportStore and LocalReportStore semantics, and CachedReportStore's revalidation, eviction
+and on-disk state.
+"""
+from store import MemoryReportStore, LocalReportStore, CachedReportStore, ObjectNotFound
+import pytest
+import os
+
+
+class CountingStore(MemoryReportStore):
+    def __init__(self):
+        super().__init__()
+        self.gets, self.heads = 0, 0
+
+    def get(self, key, byte_range=None):
+        self.gets += 1
+        return super().get(key, byte_range)
+
+    def head(self, key):
+        self.heads += 1
+        return super().head(key)
+
+
+@pytest.fixture(params=["memory", "local"])
+def store(request, tmp_path):
+    return MemoryReportStore() if request.param == "memory" else LocalReportStore(str(tmp_path / "reports"))
+
+
+def test_store_semantics(store):
+    etag = store.put("issues/1/a", b"0123456789")
+    assert store.head("issues/1/a") == etag
+    assert store.get("issues/1/a") == (b"0123456789", etag)
+    assert store.get("issues/1/a", byte_range=(2, 5)).body == b"234"
+    assert store.put("issues/1/a", b"changed") != etag
+    store.put("issues/2/b", b"x")
+    assert list(store.keys("issues/1/")) == ["issues/1/a"]
+
+    store.delete("issues/1/a")
+    store.delete("issues/1/a")
+    assert store.head("issues/1/a") is None
+    with pytest.raises(ObjectNotFound):
+        store.get("issues/1/a")
+
+
+def test_cache_serves_hits_without_the_remote(tmp_path):
+    remote = CountingStore()
+    remote.put("k", b"body")
+    cache = CachedReportStore(remote, str(tmp_path), validate_after=300)
+    assert cache.get("k").body == b"body"
+    assert cache.get("k").body == b"body"
+    assert (remote.gets, remote.heads, cache.hits, cache.misses) == (1, 0, 1, 1)
+    # range reads of a cached object are served locally too
+    assert cache.get("k", byte_range=(1, 3)).body == b"od"
+    assert remote.gets == 1
+
+
+def test_cache_revalidates_with_head(tmp_path):
+    remote = CountingStore()
+    remote.put("k", b"v1")
+    cache = CachedReportStore(remote, str(tmp_path), validate_after=0)
+    cache.get("k")
+
+    # unchanged: a HEAD, no new GET
+    assert cache.get("k").body == b"v1"
+    assert (remote.gets, remote.heads) == (1, 1)
+
+    # changed behind the cache's back: re-fetched
+    etag = remote.put("k", b"v2")
+    assert cache.get("k") == (b"v2", etag)
+    assert remote.gets == 2
+
+    # deleted: gone from the cache as well
+    remote.delete("k")
+    with pytest.raises(ObjectNotFound):
+        cache.get("k")
+
+
+def test_cache_serves_stale_copies_until_validate_after(tmp_path):
+    remote = CountingStore()
+    remote.put("k", b"v1")
+    cache = CachedReportStore(remote, str(tmp_path), validate_after=300)
+    cache.get("k")
+    remote.put("k", b"v2")
+    assert cache.get("k").body == b"v1"
+
+
+def test_cache_writes_through(tmp_path):
+    remote = CountingStore()
+    cache = CachedReportStore(remote, str(tmp_path))
+    etag = cache.put("a/b", b"body")
+    assert remote.get("a/b") == (b"body", etag)
+    assert cache.get("a/b").body == b"body"
+    assert cache.hits == 1
+    cache.delete("a/b")
+    assert remote.head("a/b") is None and not os.path.exists(tmp_path / "a" / "b")
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    remote = MemoryReportStore()
+    for k in "abc":
+        remote.put(k, b"x" * 40)
+    cache = CachedReportStore(remote, str(tmp_path), max_bytes=100)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert sorted(f for f in os.listdir(tmp_path) if not f.endswith(".etag")) == ["a", "c"]
+    assert not os.path.exists(tmp_path / "b.etag")
+
+    # too big to cache at all
+    remote.put("big", b"x" * 101)
+    assert cache.get("big").body == b"x" * 101
+    assert not os.path.exists(tmp_path / "big")
+
+
+def test_cache_index_survives_a_restart(tmp_path):
+    remote = CountingStore()
+    remote.put("k", b"v1")
+    CachedReportStore(remote, str(tmp_path)).get("k")
+
+    restarted = CachedReportStore(remote, str(tmp_path), validate_after=300)
+    # never validated in this process: checked with a HEAD first, then served from disk
+    assert restarted.get("k").body == b"v1"
+    assert (remote.gets, remote.heads, restarted.hits) == (1, 1, 1)
+
+
+def test_cache_ignores_bodies_without_an_etag(tmp_path):
+    # what a crash between writing the body and its .etag leaves behind
+    remote = CountingStore()
+    remote.put("k", b"v2")
+    (tmp_path / "k").write_bytes(b"v1")
+    cache = CachedReportStore(remote, str(tmp_path))
+    assert cache.get("k").body == b"v2"
+    assert remote.gets == 1
+
+
+def test_cache_rejects_keys_outside_its_directory(tmp_path):
+    remote = MemoryReportStore()
+    remote.put("../outside", b"x")
+    cache = CachedReportStore(remote, str(tmp_path / "cache"))
+    with pytest.raises(ValueError):
+        cache.get("../outside")
+    assert not os.path.exists(tmp_path / "outside")
@@ -0,0 +1,109 @@
+"""
+xorf.py: hashing of addresses into filter keys, filter building/membership, and the serialized layouts validators read.
+"""
+from benchmarks import generators
+import numpy as np
+import hashlib
+import pytest
+import struct
+import xorf
+
+
+_B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def _b58decode(address: str) -> bytes:
+    n = 0
+    for c in address:
+        n = n * 58 + _B58.index(c)
+    body = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(address) - len(address.lstrip("1"))) + body
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"", 0xEF46DB3751D8E999),
+    (b"abc", 0x44BC2CF5AD770999),
+    (b"Nobody inspects the spammish repetition", 0xFBCEA83C8A378BF1),
+    (bytes(range(33)), 0x0C535D1ACAFB8EAD),
+    (bytes(range(100)), 0x6AC1E58032166597),
+])
+def test_xxh64_reference_values(data, expected):
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(1, len(data))
+    assert int(xorf.xxh64(rows)[0]) == expected
+
+
+def test_address_hashes_match_a_scalar_decode():
+    addresses = generators.addresses(50, seed=1)
+    hashes, valid = xorf.address_hashes(addresses)
+    assert valid.all()
+    for address, h in zip(addresses, hashes):
+        decoded = _b58decode(address)
+        payload, checksum = decoded[:-4], decoded[-4:]
+        assert hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] == checksum
+        key = np.frombuffer(decoded[xorf.PUBKEY_BIN], dtype=np.uint8).reshape(1, -1)
+        assert h == xorf.xxh64(key)[0]
+
+
+def test_invalid_addresses_are_flagged():
+    good = generators.addresses(3, seed=2)
+    # a changed character (bad checksum), a character outside the alphabet, too short, too long
+    swapped = good[0][:-1] + ("2" if good[0][-1] != "2" else "3")
+    bad = [swapped, good[1][:10] + "0" + good[1][11:], good[2][:20], good[2] + "zz", ""]
+    hashes, valid = xorf.address_hashes(good + bad)
+    assert valid.tolist() == [True] * 3 + [False] * 5
+    assert (hashes[3:] == 0).all()
+
+
+def test_build_contains_every_key():
+    keys = np.random.default_rng(0).integers(0, 2 ** 63, 20_000, dtype=np.uint64)
+    f = xorf.build(np.concatenate([keys, keys[:100]]))
+    assert f.block_length * 3 == len(f.fingerprints)
+    assert xorf.contains(f, keys).all()
+    others = np.random.default_rng(1).integers(0, 2 ** 63, 100_000, dtype=np.uint64)
+    # ~1 in 4 billion false positives
+    assert xorf.contains(f, others).sum() <= 1
+
+
+def test_empty_filter():
+    f = xorf.build(np.array([], dtype=np.uint64))
+    assert not xorf.contains(f, np.arange(1000, dtype=np.uint64)).any()
+
+
+def test_addresses_and_verify():
+    denylist = generators.addresses(1000, seed=3)
+    others = generators.addresses(1000, seed=4)
+    f = xorf.from_addresses(denylist + ["not-an-address"])
+    assert xorf.contains_addresses(f, denylist).all()
+    assert not xorf.contains_addresses(f, others + ["not-an-address"]).any()
+    assert xorf.verify(f, denylist) == []
+    assert xorf.verify(f, denylist[:10] + others[:2]) == others[:2]
+
+    loaded = xorf.load_addresses(others + denylist)
+    assert xorf.contains_addresses(f, loaded).tolist() == [False] * 1000 + [True] * 1000
+    assert xorf.verify(f, loaded) == others
+
+
+def test_serialization_round_trip_and_layout():
+    f = xorf.build(np.arange(1, 5000, dtype=np.uint64))
+    data = xorf.to_bytes(f)
+    assert struct.unpack_from("<QQQ", data) == (f.seed, f.block_length, len(f.fingerprints))
+    assert len(data) == 24 + 4 * len(f.fingerprints)
+
+    g = xorf.from_bytes(data)
+    assert (g.seed, g.block_length) == (f.seed, f.block_length)
+    np.testing.assert_array_equal(g.fingerprints, f.fingerprints)
+    assert xorf.contains(g, np.arange(1, 5000, dtype=np.uint64)).all()
+
+    with pytest.raises(ValueError):
+        xorf.from_bytes(data[:-4])
+    with pytest.raises(ValueError):
+        xorf.from_bytes(struct.pack("<QQQ", 1, 10, 31) + data[24:])
+
+
+def test_read_signed():
+    f = xorf.build(np.arange(100, dtype=np.uint64))
+    signature = b"\x01" * 70
+    data = struct.pack("<BH", 1, len(signature)) + signature + struct.pack("<I", 42) + xorf.to_bytes(f)
+    version, sig, serial, g = xorf.read_signed(data)
+    assert (version, sig, serial) == (1, signature, 42)
+    np.testing.assert_array_equal(g.fingerprints, f.fingerprints)